@@ -2,162 +2,254 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
-import json
+import sys
+from columnar_store import default_processed_path, load_processed_data
+from data_quality import QualityIndex
+from signal_strategies import DEFAULT_SIGNAL, SIGNALS, generate_signals
+from trade_log import BACKTEST_RESULTS, TradeLog, trades_to_records
+DIRECTIONS = ['BAIXA', 'ALTA']
+RESULTS = ['LOSS', 'WIN']
+
+
+def _labels(flags, categories):
+    """Coluna categórica a partir de um array booleano (evita milhões de strings)"""
+    return pd.Categorical.from_codes(flags.astype(np.int8), categories)
+
+
+def prediction_arrays(predictions):
+    """Converte as predições (lista de dicts ou tupla direções/confianças) em arrays NumPy
+
+    Retorna (previu ALTA?, confiança) por vela.
+    """
+    if isinstance(predictions, tuple):
+        directions, confidences = predictions
+    else:
+        directions = [p['direction'] for p in predictions]
+        confidences = [p['confidence'] for p in predictions]
+    return np.asarray(directions) == 'ALTA', np.asarray(confidences, dtype=np.float64)
+
+
+def select_trades(close, confidences, min_confidence, bad_windows=None):
+    """Velas operadas (entrada em i, saída em i+1) e a direção real de cada uma
+
+    Uma vela é operada se a confiança atinge o mínimo, os dois fechamentos existem e a janela
+    não foi marcada como ruim. Retorna (posições, subiu?).
+    """
+    n = max(len(close) - 1, 0)
+    # "not <" em vez de ">=": uma confiança NaN não é descartada, como no laço original
+    take = ~(confidences[:n] < min_confidence) & ~np.isnan(close[:n]) & ~np.isnan(close[1:n + 1])
+    if bad_windows is not None:
+        take &= ~np.asarray(bad_windows[:n], dtype=bool)
+    positions = np.flatnonzero(take)
+    return positions, close[positions + 1] > close[positions]
+
+
+class RunningMetrics:
+    """Métricas do backtest atualizadas a cada trade registrado, com leitura O(1) a qualquer momento
+
+    Pico e drawdown corrente, média/variância dos retornos (Welford) para o Sharpe e contadores de
+    acertos: o relatório não depende da lista de trades.
+    """
+
+    def __init__(self, initial_balance=1000, trade_amount=50):
+        self.initial_balance = initial_balance
+        self.trade_amount = trade_amount
+        self.balance = initial_balance
+        self.peak = initial_balance
+        self.max_drawdown = 0.0
+        self.trades = 0
+        self.wins = 0
+        self.total_profit = 0.0
+        self.mean_return = 0.0
+        self.m2_return = 0.0  # soma dos quadrados dos desvios em relação à média
+
+    def push(self, profit, won):
+        """Registra um trade e retorna o novo saldo"""
+        self.trades += 1
+        self.wins += int(bool(won))
+        self.total_profit += profit
+        self.balance += profit
+        if self.balance > self.peak:
+            self.peak = self.balance
+        self.max_drawdown = max(self.max_drawdown, self.drawdown)
+        
+        value = profit / self.trade_amount
+        delta = value - self.mean_return
+        self.mean_return += delta / self.trades
+        self.m2_return += delta * (value - self.mean_return)
+        return self.balance
+
+    def push_batch(self, profits, won):
+        """Registra vários trades em ordem (vetorizado) e retorna o saldo após cada um"""
+        profits = np.asarray(profits, dtype=np.float64)
+        if len(profits) == 0:
+            return profits
+        balances = self.balance + np.cumsum(profits)
+        peaks = np.maximum.accumulate(np.maximum(balances, self.peak))
+        self.max_drawdown = max(self.max_drawdown, float(((peaks - balances) / peaks * 100).max()))
+        self.peak = float(peaks[-1])
+        self.balance = float(balances[-1])
+        self.wins += int(np.count_nonzero(won))
+        self.total_profit += float(profits.sum())
+        
+        # Combinação de Welford em lote (Chan et al.): média e M2 do lote fundidos aos acumulados
+        values = profits / self.trade_amount
+        count = len(values)
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        total = self.trades + count
+        delta = batch_mean - self.mean_return
+        self.mean_return += delta * count / total
+        self.m2_return += batch_m2 + delta ** 2 * self.trades * count / total
+        self.trades = total
+        return balances
+
+    @property
+    def drawdown(self):
+        """Drawdown corrente em % do pico"""
+        return (self.peak - self.balance) / self.peak * 100
+
+    @property
+    def sharpe_ratio(self):
+        """Sharpe simplificado: média / desvio padrão dos retornos por trade"""
+        if self.trades < 2:
+            return 0
+        std_return = np.sqrt(self.m2_return / self.trades)
+        return self.mean_return / std_return if std_return > 0 else 0
+
+    def summary(self):
+        """Métricas de performance no ponto atual do backtest"""
+        if self.trades == 0:
+            return {}
+        return {
+            'total_trades': self.trades,
+            'winning_trades': self.wins,
+            'losing_trades': self.trades - self.wins,
+            'win_rate': self.wins / self.trades,
+            'total_profit': self.total_profit,
+            'total_return': (self.balance - self.initial_balance) / self.initial_balance * 100,
+            'avg_profit_per_trade': self.total_profit / self.trades,
+            'max_drawdown': self.max_drawdown,
+            'sharpe_ratio': self.sharpe_ratio,
+            'final_balance': self.balance
+        }
+
 
 class TradingBacktest:
     """Sistema de backtest para validar estratégias de trading"""
     
-    def __init__(self, initial_balance=1000, trade_amount=50):
+    def __init__(self, initial_balance=1000, trade_amount=50, win_payout=0.8, loss_ratio=0.5, keep_trades=True):
         self.initial_balance = initial_balance
         self.trade_amount = trade_amount
-        self.balance = initial_balance
-        self.trades = []
-        self.equity_curve = []
+        self.win_payout = win_payout  # fração do valor ganha no acerto
+        self.loss_ratio = loss_ratio  # fração do valor perdida no erro
+        # Sem keep_trades, só as métricas acumuladas são mantidas (backtests longos)
+        self.keep_trades = keep_trades
+        self.metrics = RunningMetrics(initial_balance, trade_amount)
+        self.trades = pd.DataFrame()
+        self.equity_curve = pd.DataFrame()
+    
+    @property
+    def balance(self):
+        return self.metrics.balance
         
-    def load_data(self, csv_file):
-        """Carrega dados históricos para backtest"""
+    def load_data(self, csv_file, nrows=10000, start=None, end=None):
+        """Carrega dados históricos para backtest (store colunar ou CSV), em float64
+
+        Preços e indicadores vêm dos dados processados, não do feature store (float32, só para
+        treino): entradas, saídas e direções usam os fechamentos exatos.
+        nrows: por padrão só as primeiras 10000 velas, como antes; None carrega o histórico completo.
+        start/end: intervalo [start, end) a testar; nrows conta a partir de start.
+        """
         print(f"Carregando dados de {csv_file}...")
         
-        # Carregar apenas uma amostra para o backtest
-        chunk_size = 10000
-        df = pd.read_csv(csv_file, nrows=chunk_size)
+        df = load_processed_data(csv_file, start=start, end=end, nrows=nrows)
+        if 'timestamp' in df and not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
         
         print(f"Dados carregados: {len(df)} registros")
         return df
     
-    def simulate_predictions(self, df):
-        """Simula predições baseadas em indicadores técnicos"""
-        predictions = []
-        
-        for i in range(len(df)):
-            row = df.iloc[i]
-            
-            # Estratégia simples baseada em médias móveis
-            if pd.notna(row.get('sma_5')) and pd.notna(row.get('sma_20')):
-                if row['sma_5'] > row['sma_20']:
-                    direction = 'ALTA'
-                    confidence = 0.6 + (row.get('rsi', 50) - 50) / 100 * 0.3
-                else:
-                    direction = 'BAIXA'
-                    confidence = 0.6 + (50 - row.get('rsi', 50)) / 100 * 0.3
-            else:
-                direction = 'ALTA' if np.random.random() > 0.5 else 'BAIXA'
-                confidence = 0.5 + np.random.random() * 0.3
-            
-            # Garantir que a confiança está entre 0.5 e 0.9
-            confidence = max(0.5, min(0.9, confidence))
-            
-            predictions.append({
-                'direction': direction,
-                'confidence': confidence
-            })
+    def simulate_predictions(self, df, signal=DEFAULT_SIGNAL, seed=42, **params):
+        """Predições de uma estratégia registrada em signal_strategies: (direções, confianças)
+
+        O padrão é a regra SMA5/SMA20 + RSI; a seed fixa o sorteio das velas de aquecimento.
+        """
+        return generate_signals(df, signal, seed, **params)
+    
+    def compare_signals(self, df, signals=None, min_confidence=0.7, quality=None, seed=42):
+        """Roda o backtest de cada estratégia (a partir do mesmo saldo inicial) e tabela as métricas"""
+        rows = []
+        for name in signals or sorted(SIGNALS):
+            backtest = TradingBacktest(self.initial_balance, self.trade_amount, self.win_payout, self.loss_ratio,
+                                       keep_trades=False)
+            backtest.run_backtest(df, backtest.simulate_predictions(df, name, seed), min_confidence, quality)
+            rows.append(dict(backtest.calculate_metrics(), signal=name))
+        return pd.DataFrame(rows).set_index('signal')
+    
+    def model_predictions(self, df, model_file="lightweight_trading_model.pkl", predictor=None):
+        """Predições do modelo treinado para todas as linhas, em lote: (direções, confianças)"""
+        from trading_predictor import TradingPredictor
         
-        return predictions
+        predictor = predictor or TradingPredictor(model_file)
+        return predictor.predict_batch(df)
     
-    def run_backtest(self, df, predictions, min_confidence=0.7):
-        """Executa o backtest com as predições"""
+    def run_backtest(self, df, predictions, min_confidence=0.7, quality=None):
+        """Executa o backtest com as predições (pulando janelas ruins se houver índice de qualidade)
+
+        Vetorizado: acertos, lucro/prejuízo e saldo de todos os trades são calculados de uma vez
+        com NumPy, com o mesmo resultado do laço vela a vela.
+        """
         print(f"Executando backtest com {len(df)} registros...")
         print(f"Confiança mínima: {min_confidence}")
         
-        for i in range(len(df) - 1):
-            current_row = df.iloc[i]
-            next_row = df.iloc[i + 1]
-            prediction = predictions[i]
-            
-            # Verificar se a predição atende ao critério de confiança
-            if prediction['confidence'] < min_confidence:
-                continue
-            
-            # Verificar se há dados válidos
-            if pd.isna(current_row['close']) or pd.isna(next_row['close']):
-                continue
-            
-            # Determinar o resultado real
-            actual_direction = 'ALTA' if next_row['close'] > current_row['close'] else 'BAIXA'
-            is_correct = prediction['direction'] == actual_direction
-            
-            # Calcular lucro/prejuízo
-            if is_correct:
-                profit = self.trade_amount * 0.8  # 80% de retorno
-            else:
-                profit = -self.trade_amount * 0.5  # 50% de perda
-            
-            # Atualizar saldo
-            self.balance += profit
-            
-            # Registrar trade
-            trade = {
-                'timestamp': current_row.get('timestamp', i),
-                'entry_price': current_row['close'],
-                'exit_price': next_row['close'],
-                'direction': prediction['direction'],
-                'confidence': prediction['confidence'],
-                'actual_direction': actual_direction,
-                'result': 'WIN' if is_correct else 'LOSS',
-                'profit': profit,
-                'balance': self.balance
-            }
-            
-            self.trades.append(trade)
-            self.equity_curve.append({
-                'index': i,
-                'balance': self.balance,
-                'timestamp': current_row.get('timestamp', i)
-            })
-        
-        print(f"Backtest concluído. Total de trades: {len(self.trades)}")
-    
-    def calculate_metrics(self):
-        """Calcula métricas de performance"""
-        if not self.trades:
-            return {}
-        
-        # Métricas básicas
-        total_trades = len(self.trades)
-        winning_trades = sum(1 for trade in self.trades if trade['result'] == 'WIN')
-        losing_trades = total_trades - winning_trades
-        
-        win_rate = winning_trades / total_trades if total_trades > 0 else 0
+        bad_windows = None
+        if quality is not None and 'timestamp' in df:
+            bad_windows = quality.trade_mask(df['timestamp'])
+            print(f"Janelas com lacunas/anomalias ignoradas: {int(bad_windows[:-1].sum())}")
         
-        # Lucros e perdas
-        total_profit = sum(trade['profit'] for trade in self.trades)
-        total_return = (self.balance - self.initial_balance) / self.initial_balance * 100
+        close = df['close'].to_numpy(dtype=np.float64)
+        predicted_up, confidences = prediction_arrays(predictions)
+        positions, actual_up = select_trades(close, confidences, min_confidence, bad_windows)
+        is_correct = predicted_up[positions] == actual_up
         
-        avg_profit_per_trade = total_profit / total_trades if total_trades > 0 else 0
+        # Lucro/prejuízo: por padrão 80% de retorno no acerto, 50% de perda no erro
+        profit = np.where(is_correct, self.trade_amount * self.win_payout, -self.trade_amount * self.loss_ratio)
+        balance = self.metrics.push_batch(profit, is_correct)
         
-        # Drawdown máximo
-        peak = self.initial_balance
-        max_drawdown = 0
-        
-        for point in self.equity_curve:
-            if point['balance'] > peak:
-                peak = point['balance']
-            
-            drawdown = (peak - point['balance']) / peak * 100
-            if drawdown > max_drawdown:
-                max_drawdown = drawdown
+        if not self.keep_trades:
+            print(f"Backtest concluído. Total de trades: {self.metrics.trades}")
+            return
         
-        # Sharpe Ratio simplificado
-        returns = [trade['profit'] / self.trade_amount for trade in self.trades]
-        if len(returns) > 1:
-            avg_return = np.mean(returns)
-            std_return = np.std(returns)
-            sharpe_ratio = avg_return / std_return if std_return > 0 else 0
+        if 'timestamp' in df:
+            timestamps = df['timestamp'].to_numpy()[positions]
         else:
-            sharpe_ratio = 0
+            timestamps = positions
+        trades = pd.DataFrame({
+            'timestamp': timestamps,
+            'entry_price': close[positions],
+            'exit_price': close[positions + 1],
+            'direction': _labels(predicted_up[positions], DIRECTIONS),
+            'confidence': confidences[positions],
+            'actual_direction': _labels(actual_up, DIRECTIONS),
+            'result': _labels(is_correct, RESULTS),
+            'profit': profit,
+            'balance': balance
+        })
+        equity_curve = pd.DataFrame({'index': positions, 'balance': balance, 'timestamp': timestamps})
         
-        return {
-            'total_trades': total_trades,
-            'winning_trades': winning_trades,
-            'losing_trades': losing_trades,
-            'win_rate': win_rate,
-            'total_profit': total_profit,
-            'total_return': total_return,
-            'avg_profit_per_trade': avg_profit_per_trade,
-            'max_drawdown': max_drawdown,
-            'sharpe_ratio': sharpe_ratio,
-            'final_balance': self.balance
-        }
+        # Execuções sucessivas continuam o mesmo histórico
+        if len(self.trades):
+            trades = pd.concat([self.trades, trades], ignore_index=True)
+            equity_curve = pd.concat([self.equity_curve, equity_curve], ignore_index=True)
+        self.trades = trades
+        self.equity_curve = equity_curve
+        
+        print(f"Backtest concluído. Total de trades: {len(self.trades)}")
+    
+    def calculate_metrics(self):
+        """Métricas de performance (lidas dos acumuladores, sem percorrer os trades)"""
+        return self.metrics.summary()
     
     def generate_report(self):
         """Gera relatório detalhado do backtest"""
@@ -185,14 +277,14 @@ class TradingBacktest:
     
     def plot_equity_curve(self, save_path=None):
         """Plota a curva de equity"""
-        if not self.equity_curve:
+        if not len(self.equity_curve):
             print("Nenhum dado de equity para plotar")
             return
         
         plt.figure(figsize=(12, 6))
         
-        indices = [point['index'] for point in self.equity_curve]
-        balances = [point['balance'] for point in self.equity_curve]
+        indices = self.equity_curve['index']
+        balances = self.equity_curve['balance']
         
         plt.plot(indices, balances, 'b-', linewidth=2, label='Saldo')
         plt.axhline(y=self.initial_balance, color='r', linestyle='--', label='Saldo Inicial')
@@ -209,22 +301,28 @@ class TradingBacktest:
         
         plt.show()
     
-    def save_results(self, filename):
-        """Salva os resultados do backtest em JSON"""
-        results = {
-            'metrics': self.calculate_metrics(),
-            'trades': self.trades,
-            'equity_curve': self.equity_curve,
-            'parameters': {
-                'initial_balance': self.initial_balance,
-                'trade_amount': self.trade_amount
-            }
+    def save_results(self, path=BACKTEST_RESULTS, export_json=None):
+        """Salva os resultados como log colunar binário (trades.npy + summary.json)
+
+        export_json: também gera o JSON detalhado nesse arquivo (sob demanda).
+        Com keep_trades=False só as métricas são gravadas, e o summary marca trades_kept=False.
+        """
+        parameters = {
+            'initial_balance': self.initial_balance,
+            'trade_amount': self.trade_amount,
+            'win_payout': self.win_payout,
+            'loss_ratio': self.loss_ratio
         }
+        log = TradeLog.write(path, trades_to_records(self.trades, self.equity_curve), self.calculate_metrics(),
+                             parameters, trades_kept=self.keep_trades)
+        if self.keep_trades:
+            print(f"Resultados salvos em: {path} ({len(log)} trades)")
+        else:
+            print(f"Métricas salvas em: {path} (keep_trades=False: {self.metrics.trades} trades não mantidos)")
         
-        with open(filename, 'w') as f:
-            json.dump(results, f, indent=2, default=str)
-        
-        print(f"Resultados salvos em: {filename}")
+        if export_json:
+            log.to_json(export_json)
+        return log
 
 def main():
     """Função principal para executar o backtest"""
@@ -234,12 +332,17 @@ def main():
     backtest = TradingBacktest(initial_balance=1000, trade_amount=50)
     
     # Carregar dados
+    quality = None
     try:
-        df = backtest.load_data('processed_btc_data.csv')
+        data_path = default_processed_path()
+        start = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--start=')), None)
+        end = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--end=')), None)
+        df = backtest.load_data(data_path, nrows=None if '--full' in sys.argv else 10000, start=start, end=end)
+        quality = QualityIndex.for_data(data_path)
     except FileNotFoundError:
         print("Arquivo de dados não encontrado. Criando dados simulados...")
         # Criar dados simulados para demonstração
-        dates = pd.date_range(start='2024-01-01', periods=1000, freq='1H')
+        dates = pd.date_range(start='2024-01-01', periods=1000, freq='1h')
         df = pd.DataFrame({
             'timestamp': dates,
             'close': 50000 + np.cumsum(np.random.randn(1000) * 100),
@@ -252,11 +355,21 @@ def main():
         df['sma_5'] = df['close'].rolling(window=5).mean()
         df['sma_20'] = df['close'].rolling(window=20).mean()
     
-    # Gerar predições
-    predictions = backtest.simulate_predictions(df)
+    # Comparar todas as estratégias registradas com --compare
+    if '--compare' in sys.argv:
+        comparison = backtest.compare_signals(df, quality=quality)
+        print("\nComparação de estratégias:")
+        print(comparison[['total_trades', 'win_rate', 'total_return', 'max_drawdown', 'sharpe_ratio']].to_string())
+    
+    # Gerar predições (modelo treinado com --model, estratégia --signal=<nome> caso contrário)
+    if '--model' in sys.argv:
+        predictions = backtest.model_predictions(df)
+    else:
+        signal = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--signal=')), DEFAULT_SIGNAL)
+        predictions = backtest.simulate_predictions(df, signal)
     
     # Executar backtest
-    backtest.run_backtest(df, predictions, min_confidence=0.7)
+    backtest.run_backtest(df, predictions, min_confidence=0.7, quality=quality)
     
     # Gerar relatório
     metrics = backtest.generate_report()
@@ -267,8 +380,8 @@ def main():
     except Exception as e:
         print(f"Erro ao plotar gráfico: {e}")
     
-    # Salvar resultados
-    backtest.save_results('backtest_results.json')
+    # Salvar resultados (JSON detalhado só com --json)
+    backtest.save_results(BACKTEST_RESULTS, export_json='backtest_results.json' if '--json' in sys.argv else None)
     
     return metrics
 
@@ -0,0 +1,303 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BASELINE_DIR = "bench_baselines"
+MEMORY_TOLERANCE_MB = 5.0  # ruído de alocação ignorado na comparação de memória
+STAGES = ['load', 'clean', 'indicators', 'prompts', 'store', 'features', 'training', 'prediction', 'backtest']
+
+
+def generate_synthetic_ohlcv(n_bars, seed=42, start='2020-01-01', start_price=30000.0,
+                             volatility=0.0008, gap_rate=0.0, chunk_size=1000000):
+    """Gera velas de 1m sintéticas (passeio aleatório geométrico) em blocos, de forma reprodutível
+
+    gap_rate: fração de velas removidas, para simular lacunas da exchange.
+    """
+    rng = np.random.default_rng(seed)
+    start_ns = pd.Timestamp(start).value
+    minute = 60 * 10**9
+    price = start_price
+    for offset in range(0, n_bars, chunk_size):
+        n = min(chunk_size, n_bars - offset)
+        returns = rng.normal(0.0, volatility, n)
+        close = price * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[price], close[:-1]])
+        wick = np.abs(rng.normal(0.0, volatility / 2, (2, n))) * close
+        high = np.maximum(open_, close) + wick[0]
+        low = np.minimum(open_, close) - wick[1]
+        volume = rng.lognormal(1.0, 1.0, n)
+        timestamps = start_ns + (offset + np.arange(n)) * minute
+        price = close[-1]
+
+        chunk = pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps),
+            'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume
+        })
+        if gap_rate > 0:
+            chunk = chunk[rng.random(n) >= gap_rate]
+        yield chunk
+
+
+def write_synthetic_csvs(data_dir, n_bars, seed=42, rows_per_file=1000000, **kwargs):
+    """Grava o histórico sintético em vários CSVs (como os arquivos mensais da exchange)"""
+    os.makedirs(data_dir, exist_ok=True)
+    files = []
+    for i, chunk in enumerate(generate_synthetic_ohlcv(n_bars, seed, chunk_size=rows_per_file, **kwargs)):
+        path = os.path.join(data_dir, f"synthetic_{i:04d}.csv")
+        chunk.to_csv(path, index=False, date_format='%Y-%m-%d %H:%M:%S')
+        files.append(path)
+    return files
+
+
+def reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux: /proc/self/clear_refs); False se não suportado"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Pico de RSS (VmHWM) desde o último reset, em MB; inclui memória nativa do NumPy/pandas"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sem /proc: pico desde o início do processo
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class BenchmarkRunner:
+    """Cronometra cada etapa do pipeline sobre dados sintéticos e mede linhas/s e pico de memória"""
+
+    def __init__(self, n_bars=100000, seed=42, stages=None, track_memory=True, work_dir=None, verbose=False):
+        self.n_bars = n_bars
+        self.seed = seed
+        self.stages = stages or STAGES
+        self.track_memory = track_memory
+        self.work_dir = work_dir
+        self.verbose = verbose
+        self.results = {}
+        self.context = {}
+
+    def _measure(self, name, fn):
+        """Executa uma etapa, registrando tempo, linhas processadas e pico de RSS do processo"""
+        if self.track_memory:
+            reset_peak_rss()
+        output = io.StringIO()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if self.verbose else output):
+            rows = fn()
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mb() if self.track_memory else None
+        self.results[name] = {
+            'seconds': elapsed,
+            'rows': int(rows),
+            'rows_per_sec': rows / elapsed if elapsed > 0 else float('inf'),
+            'peak_mb': peak,
+        }
+        memory = f"{peak:9.1f} MB" if peak is not None else ''
+        print(f"{name:<11} {elapsed:9.3f}s {rows:>12,} linhas {self.results[name]['rows_per_sec']:>14,.0f} linhas/s {memory}")
+
+    def run(self):
+        from backtest_system import TradingBacktest
+        from columnar_store import ColumnarStore
+        from data_processor import DataProcessor
+        from feature_store import FeatureStore
+        from lightweight_model import LightweightTradingModel
+
+        work_dir = self.work_dir or tempfile.mkdtemp(prefix='bench_')
+        data_dir = os.path.join(work_dir, 'data')
+        store_path = os.path.join(work_dir, 'store')
+        cache_dir = os.path.join(work_dir, 'feature_cache')
+        processor = DataProcessor(data_dir)
+        ctx = self.context
+
+        print(f"Gerando {self.n_bars:,} velas sintéticas (seed {self.seed}) em {work_dir}...")
+        started = time.perf_counter()
+        write_synthetic_csvs(data_dir, self.n_bars, self.seed)
+        print(f"Dados gerados em {time.perf_counter() - started:.1f}s\n")
+
+        def load():
+            ctx['raw'] = processor.load_all_csv_files()
+            return len(ctx['raw'])
+
+        def clean():
+            ctx['clean'] = processor.clean_and_structure_data(ctx['raw'], verbose=False)
+            return len(ctx['clean'])
+
+        def indicators():
+            ctx['enhanced'] = processor.add_technical_indicators(ctx['clean'])
+            return len(ctx['enhanced'])
+
+        def prompts():
+            examples = processor.iter_training_examples(processor.iter_training_prompts(ctx['enhanced']))
+            return sum(1 for _ in examples)
+
+        def store():
+            ColumnarStore(store_path).write(ctx['enhanced'])
+            return len(ctx['enhanced'])
+
+        def features():
+            ctx['features'] = FeatureStore(cache_dir).get(store_path)
+            return len(ctx['features'])
+
+        def training():
+            model = LightweightTradingModel()
+            model.train_incremental(store_path, os.path.join(work_dir, 'model.pkl'), cache_dir=cache_dir, resume=False)
+            ctx['model'] = model
+            return model.training_state['rows_trained']
+
+        def prediction():
+            feature_set = ctx['features']
+            ctx['predictions'] = ctx['model'].predict_batch(feature_set.features)
+            return len(feature_set)
+
+        def backtest():
+            bt = TradingBacktest()
+            df = bt.load_data(store_path, nrows=None)
+            bt.run_backtest(df, bt.simulate_predictions(df))
+            return len(df)
+
+        steps = {'load': load, 'clean': clean, 'indicators': indicators, 'prompts': prompts, 'store': store,
+                 'features': features, 'training': training, 'prediction': prediction, 'backtest': backtest}
+        # Etapas que alimentam as seguintes rodam mesmo quando não foram pedidas (sem cronometrar)
+        needed = {'clean': ['load'], 'indicators': ['clean'], 'prompts': ['indicators'], 'store': ['indicators'],
+                  'features': ['store'], 'training': ['features'], 'prediction': ['training'], 'backtest': ['store']}
+
+        try:
+            done = set()
+
+            def ensure(name, timed):
+                for dependency in needed.get(name, []):
+                    if dependency not in done:
+                        ensure(dependency, dependency in self.stages)
+                if name in done:
+                    return
+                if timed:
+                    self._measure(name, steps[name])
+                else:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        steps[name]()
+                done.add(name)
+
+            for name in STAGES:
+                if name in self.stages:
+                    ensure(name, True)
+        finally:
+            if self.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return self.report()
+
+    def report(self):
+        return {
+            'bars': self.n_bars,
+            'seed': self.seed,
+            'created_at': pd.Timestamp.now(tz='UTC').isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+            },
+            # ru_maxrss em KB no Linux; inclui o processo inteiro, não só as etapas
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'stages': self.results,
+        }
+
+
+def baseline_path(n_bars, baseline_dir=BASELINE_DIR):
+    return os.path.join(baseline_dir, f"baseline_{n_bars}.json")
+
+
+def compare_to_baseline(report, baseline, tolerance=0.2):
+    """Lista as etapas mais lentas (linhas/s) ou com mais memória que o baseline além da tolerância"""
+    regressions = []
+    for name, current in report['stages'].items():
+        previous = baseline['stages'].get(name)
+        if previous is None:
+            continue
+        speed = current['rows_per_sec'] / previous['rows_per_sec'] if previous['rows_per_sec'] else 1.0
+        flag = ''
+        if speed < 1 - tolerance:
+            regressions.append({'stage': name, 'metric': 'rows_per_sec', 'ratio': speed})
+            flag += ' LENTIDÃO'
+        memory_text = ''
+        if current['peak_mb'] is not None and previous['peak_mb']:
+            memory = current['peak_mb'] / previous['peak_mb']
+            memory_text = f"  memória x{memory:5.2f}"
+            if memory > 1 + tolerance and current['peak_mb'] - previous['peak_mb'] > MEMORY_TOLERANCE_MB:
+                regressions.append({'stage': name, 'metric': 'peak_mb', 'ratio': memory})
+                flag += ' MEMÓRIA'
+        print(f"{name:<11} velocidade x{speed:5.2f}{memory_text}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados OHLCV sintéticos")
+    parser.add_argument('--bars', type=int, default=100000, help="número de velas de 1m (10k a 50M)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stages', default=','.join(STAGES), help="etapas separadas por vírgula")
+    parser.add_argument('--output', default=None, help="arquivo JSON com os resultados")
+    parser.add_argument('--baseline', default=None, help="baseline para comparação (padrão: bench_baselines/baseline_<bars>.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="grava os resultados como novo baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="variação aceita antes de acusar regressão")
+    parser.add_argument('--no-memory', action='store_true', help="não medir o pico de memória por etapa")
+    parser.add_argument('--work-dir', default=None, help="diretório de trabalho (mantido ao final)")
+    parser.add_argument('--verbose', action='store_true', help="mostrar a saída de cada etapa")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"etapas desconhecidas: {', '.join(sorted(unknown))}")
+
+    print("=== Benchmark do Pipeline ===\n")
+    report = BenchmarkRunner(args.bars, args.seed, stages, not args.no_memory, args.work_dir, args.verbose).run()
+    print(f"\nPico de RSS do processo: {report['max_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados salvos em {args.output}")
+
+    path = args.baseline or baseline_path(args.bars)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline salvo em {path}")
+        return 0
+
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            baseline = json.load(f)
+        print(f"\nComparação com {path}:")
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressão(ões) acima de {args.tolerance:.0%}")
+            return 1
+        print("\n✅ Sem regressões")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+
+PROCESSED_STORE = "processed_btc_data"
+INDEX_COLUMN = "timestamp"
+META_FILE = "meta.json"
+
+
+class ColumnarStore:
+    """Armazenamento colunar binário (uma coluna por arquivo) lido via memory-map"""
+
+    def __init__(self, path=PROCESSED_STORE):
+        self.path = path
+        self.meta = None
+
+    @staticmethod
+    def exists(path):
+        """Verifica se o caminho contém um store colunar"""
+        return os.path.isfile(os.path.join(path, META_FILE))
+
+    def _column_file(self, column):
+        return os.path.join(self.path, f"{column}.bin")
+
+    def _read_meta(self):
+        with open(os.path.join(self.path, META_FILE), 'r') as f:
+            self.meta = json.load(f)
+        return self.meta
+
+    def _write_meta(self, meta):
+        # Escrever em arquivo temporário e trocar, para leitores nunca verem metadados parciais
+        tmp_file = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_file, os.path.join(self.path, META_FILE))
+        self.meta = meta
+
+    def _to_arrays(self, df):
+        """Converte o DataFrame em arrays tipados (timestamps como int64 em ns UTC)"""
+        arrays = {}
+        for column in df.columns:
+            values = df[column]
+            if column == INDEX_COLUMN or pd.api.types.is_datetime64_any_dtype(values):
+                values = pd.to_datetime(values)
+                if values.dt.tz is not None:
+                    values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+                arrays[column] = values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            else:
+                arrays[column] = values.to_numpy(dtype=np.float64)
+        return arrays
+
+    def write(self, df):
+        """Grava o DataFrame completo, substituindo o conteúdo do store"""
+        os.makedirs(self.path, exist_ok=True)
+        for file in os.listdir(self.path):
+            if file.endswith(".bin") or file == META_FILE:
+                os.remove(os.path.join(self.path, file))
+        self.meta = None
+        self.append(df)
+
+    def append(self, df):
+        """Acrescenta linhas ao final do store (devem ser posteriores às já gravadas)"""
+        os.makedirs(self.path, exist_ok=True)
+        arrays = self._to_arrays(df)
+        meta = self.meta
+        if meta is None and self.exists(self.path):
+            meta = self._read_meta()
+
+        if meta is None:
+            meta = {
+                'index': INDEX_COLUMN,
+                'columns': {c: str(a.dtype) for c, a in arrays.items()},
+                'datetime_columns': [c for c in df.columns
+                                     if c == INDEX_COLUMN or pd.api.types.is_datetime64_any_dtype(df[c])],
+                'rows': 0,
+                'start': None,
+                'end': None
+            }
+        elif list(arrays) != list(meta['columns']):
+            raise ValueError(f"Colunas incompatíveis com o store: {list(arrays)}")
+
+        rows = meta['rows']
+        for column, values in arrays.items():
+            with open(self._column_file(column), 'r+b' if rows else 'wb') as f:
+                # Truncar possíveis restos de uma gravação interrompida
+                f.truncate(rows * values.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(values).tobytes())
+
+        if len(df) > 0:
+            index = arrays[meta['index']]
+            meta['start'] = meta['start'] if meta['start'] is not None else int(index[0])
+            meta['end'] = int(index[-1])
+        meta['rows'] = rows + len(df)
+        self._write_meta(meta)
+
+    def __len__(self):
+        return (self.meta or self._read_meta())['rows']
+
+    @property
+    def columns(self):
+        return list((self.meta or self._read_meta())['columns'])
+
+    def column(self, name):
+        """Retorna a coluna inteira como memmap somente leitura"""
+        meta = self.meta or self._read_meta()
+        if name not in meta['columns']:
+            raise KeyError(f"Coluna {name} não existe no store")
+        if meta['rows'] == 0:
+            return np.empty(0, dtype=meta['columns'][name])
+        return np.memmap(self._column_file(name), dtype=meta['columns'][name],
+                         mode='r', shape=(meta['rows'],))
+
+    def row_range(self, start=None, end=None):
+        """Converte um intervalo de tempo [start, end) em posições via busca binária no índice"""
+        index = self.column((self.meta or self._read_meta())['index'])
+        first = 0 if start is None else int(np.searchsorted(index, pd.Timestamp(start).value, side='left'))
+        last = len(index) if end is None else int(np.searchsorted(index, pd.Timestamp(end).value, side='left'))
+        return first, last
+
+    def arrays(self, columns=None, start=None, end=None, nrows=None):
+        """Retorna fatias memmap (sem cópia) das colunas pedidas no intervalo de tempo"""
+        meta = self.meta or self._read_meta()
+        columns = columns or list(meta['columns'])
+        first, last = self.row_range(start, end)
+        if nrows is not None:
+            last = min(last, first + nrows)
+        return {column: self.column(column)[first:last] for column in columns}
+
+    def load(self, columns=None, start=None, end=None, nrows=None):
+        """Carrega um DataFrame com projeção de colunas e filtro por intervalo de tempo"""
+        meta = self.meta or self._read_meta()
+        data = {}
+        for column, values in self.arrays(columns, start, end, nrows).items():
+            if column in meta['datetime_columns']:
+                data[column] = pd.to_datetime(np.asarray(values).view('datetime64[ns]'))
+            else:
+                data[column] = np.asarray(values)
+        return pd.DataFrame(data)
+
+
+def load_processed_data(path, columns=None, start=None, end=None, nrows=None):
+    """Carrega os dados processados do store colunar, ou do CSV se o caminho for um arquivo
+
+    start/end selecionam o intervalo [start, end): no store por busca binária no índice,
+    no CSV filtrando os blocos lidos (ordenados por timestamp) até passar de end.
+    """
+    if ColumnarStore.exists(path):
+        return ColumnarStore(path).load(columns=columns, start=start, end=end, nrows=nrows)
+    if start is None and end is None:
+        return pd.read_csv(path, usecols=columns, nrows=nrows)
+
+    usecols = None if columns is None else list(dict.fromkeys([INDEX_COLUMN] + list(columns)))
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    selected = []
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=500000):
+        timestamps = pd.to_datetime(chunk[INDEX_COLUMN], format='mixed')
+        mask = np.ones(len(chunk), dtype=bool)
+        if start is not None:
+            mask &= (timestamps >= start).to_numpy()
+        if end is not None:
+            mask &= (timestamps < end).to_numpy()
+        selected.append(chunk[mask])
+        rows += int(mask.sum())
+        if (nrows is not None and rows >= nrows) or (end is not None and timestamps.iloc[-1] >= end):
+            break
+
+    df = pd.concat(selected, ignore_index=True) if selected else pd.read_csv(path, usecols=usecols, nrows=0)
+    if nrows is not None:
+        df = df.iloc[:nrows]
+    return df[columns] if columns is not None else df
+
+
+def default_processed_path():
+    """Caminho padrão dos dados processados: o store colunar, se existir, senão o CSV legado"""
+    if ColumnarStore.exists(PROCESSED_STORE):
+        return PROCESSED_STORE
+    return 'processed_btc_data.csv'
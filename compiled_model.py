@@ -0,0 +1,204 @@
+import numpy as np
+import json
+import os
+
+# Artefato de inferência só com NumPy: nada de scikit-learn/joblib para carregar ou predizer
+DIRECTIONS = np.array(['BAIXA', 'ALTA'])
+COMPILED_LIGHTWEIGHT = "lightweight_trading_model.npz"
+COMPILED_SIMPLE = "trading_model.npz"
+
+
+def _up_column(estimator):
+    classes = list(estimator.classes_)
+    if sorted(classes) != [0, 1]:
+        raise ValueError(f"Esperadas as classes [0, 1], encontradas {classes}")
+    return classes.index(1)
+
+
+class CompiledModel:
+    """Pipeline compilado (linear ou floresta) com a mesma interface de predição dos modelos"""
+
+    def __init__(self, kind, arrays, feature_columns):
+        self.kind = kind
+        self.arrays = arrays
+        self.feature_columns = list(feature_columns)
+        self.fill = arrays.get('fill')
+
+    # --- compilação a partir dos objetos treinados (não importa o sklearn) ---
+
+    @classmethod
+    def from_linear(cls, estimator, feature_columns, imputer=None, scaler=None):
+        """Dobra mediana do imputer e média/escala do scaler nos coeficientes: z = x·w + b"""
+        up = _up_column(estimator)
+        weights = np.asarray(estimator.coef_, dtype=np.float64).ravel()
+        bias = float(np.asarray(estimator.intercept_, dtype=np.float64).ravel()[0])
+        if up == 0:
+            weights, bias = -weights, -bias
+        if scaler is not None:
+            mean = scaler.mean_ if getattr(scaler, 'with_mean', True) and scaler.mean_ is not None else 0.0
+            scale = scaler.scale_ if getattr(scaler, 'with_std', True) and scaler.scale_ is not None else 1.0
+            weights = weights / scale
+            bias = bias - float(np.sum(weights * mean))
+        arrays = {'weights': weights, 'bias': np.array([bias])}
+        if imputer is not None:
+            arrays['fill'] = np.asarray(imputer.statistics_, dtype=np.float64)
+        return cls('linear', arrays, feature_columns)
+
+    @classmethod
+    def from_forest(cls, forest, feature_columns, imputer=None):
+        """Achata todas as árvores em arrays contíguos (filhos, feature, threshold, P(ALTA) por nó)"""
+        up = _up_column(forest)
+        left, right, feature, threshold, value, missing_left, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in forest.estimators_:
+            t = tree.tree_
+            n = t.node_count
+            leaf = t.children_left == -1
+            roots.append(offset)
+            # Folhas apontam para si mesmas: a travessia pode rodar um número fixo de passos
+            own = np.arange(offset, offset + n)
+            left.append(np.where(leaf, own, t.children_left + offset))
+            right.append(np.where(leaf, own, t.children_right + offset))
+            feature.append(np.where(leaf, 0, t.feature))
+            threshold.append(t.threshold)
+            counts = t.value[:, 0, :]
+            value.append(counts[:, up] / counts.sum(axis=1))
+            missing = getattr(t, 'missing_go_to_left', None)
+            missing_left.append(np.ones(n, dtype=bool) if missing is None else np.asarray(missing, dtype=bool))
+            max_depth = max(max_depth, t.max_depth)
+            offset += n
+        arrays = {
+            'left': np.concatenate(left).astype(np.int32),
+            'right': np.concatenate(right).astype(np.int32),
+            'feature': np.concatenate(feature).astype(np.int32),
+            'threshold': np.concatenate(threshold).astype(np.float64),
+            'value': np.concatenate(value).astype(np.float64),
+            'missing_left': np.concatenate(missing_left),
+            'roots': np.array(roots, dtype=np.int32),
+            'max_depth': np.array([max_depth]),
+        }
+        if imputer is not None:
+            arrays['fill'] = np.asarray(imputer.statistics_, dtype=np.float64)
+        return cls('forest', arrays, feature_columns)
+
+    # --- inferência ---
+
+    def predict_proba_batch(self, features, batch_size=100000):
+        """Probabilidade de ALTA para cada linha"""
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        probabilities = np.empty(len(features))
+        for start in range(0, len(features), batch_size):
+            block = features[start:start + batch_size]
+            if self.fill is not None:
+                block = np.where(np.isnan(block), self.fill, block)
+            if self.kind == 'linear':
+                probabilities[start:start + batch_size] = self._linear(block)
+            else:
+                probabilities[start:start + batch_size] = self._forest(block)
+        return probabilities
+
+    def _linear(self, block):
+        z = block @ self.arrays['weights'] + self.arrays['bias'][0]
+        # Função logística (expit do sklearn) na forma 1 / (1 + e^-z) = e^-log(1 + e^-z),
+        # sem overflow de np.exp para z muito negativo
+        return np.exp(-np.logaddexp(0.0, -z))
+
+    def _forest(self, block, max_cells=2000000):
+        a = self.arrays
+        roots = a['roots']
+        # O sklearn compara as features em float32 com thresholds em float64
+        block = block.astype(np.float32).astype(np.float64)
+        # Travessia vetorizada de (linhas x árvores) em sub-blocos para limitar a memória
+        step = max(1, max_cells // len(roots))
+        probabilities = np.empty(len(block))
+        for start in range(0, len(block), step):
+            sub = block[start:start + step]
+            rows = np.arange(len(sub))[:, None]
+            nodes = np.broadcast_to(roots, (len(sub), len(roots))).copy()
+            for _ in range(int(a['max_depth'][0])):
+                x = sub[rows, a['feature'][nodes]]
+                go_left = np.where(np.isnan(x), a['missing_left'][nodes], x <= a['threshold'][nodes])
+                nodes = np.where(go_left, a['left'][nodes], a['right'][nodes])
+            probabilities[start:start + step] = a['value'][nodes].mean(axis=1)
+        return probabilities
+
+    def predict_batch(self, features, batch_size=100000):
+        """Direções ('ALTA'/'BAIXA') e confianças, como LightweightTradingModel.predict_batch"""
+        up = self.predict_proba_batch(features, batch_size)
+        return DIRECTIONS[(up > 0.5).astype(np.int64)], np.maximum(up, 1 - up)
+
+    def predict(self, features):
+        directions, confidences = self.predict_batch(features)
+        return directions[0], confidences[0]
+
+    # --- persistência (npz sem pickle) ---
+
+    def save(self, path):
+        meta = json.dumps({'kind': self.kind, 'feature_columns': self.feature_columns})
+        np.savez(path, meta=np.array(meta), **self.arrays)
+        print(f"Modelo compilado salvo em {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            arrays = {name: data[name] for name in data.files if name != 'meta'}
+        return cls(meta['kind'], arrays, meta['feature_columns'])
+
+    def save_directory(self, directory):
+        """Grava um .npy por array (permite carregar com memory-map)"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+        with open(os.path.join(directory, 'model.json'), 'w') as f:
+            json.dump({'kind': self.kind, 'feature_columns': self.feature_columns, 'arrays': sorted(self.arrays)}, f)
+
+    @classmethod
+    def load_directory(cls, directory, mmap=True):
+        with open(os.path.join(directory, 'model.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None,
+                                allow_pickle=False)
+                  for name in meta['arrays']}
+        return cls(meta['kind'], arrays, meta['feature_columns'])
+
+    @classmethod
+    def from_model_file(cls, model_file):
+        """Compila um .pkl de qualquer um dos trainers (linear ou RandomForest)"""
+        import joblib
+
+        data = joblib.load(model_file)
+        if hasattr(data['model'], 'coef_'):
+            return cls.from_linear(data['model'], data['feature_columns'], data.get('imputer'), data.get('scaler'))
+        return cls.from_forest(data['model'], data['feature_columns'], data.get('imputer'))
+
+
+def compile_lightweight_model(model_file="lightweight_trading_model.pkl", output_file=COMPILED_LIGHTWEIGHT):
+    """Compila o modelo do LightweightTradingModel (imputer + scaler + modelo linear)"""
+    compiled = CompiledModel.from_model_file(model_file)
+    compiled.save(output_file)
+    return compiled
+
+
+def compile_simple_model(model_file="trading_model.pkl", output_file=COMPILED_SIMPLE):
+    """Compila o RandomForest do SimpleTradingModel"""
+    compiled = CompiledModel.from_model_file(model_file)
+    compiled.save(output_file)
+    return compiled
+
+
+def main():
+    print("=== Compilação dos Modelos ===\n")
+    for model_file, compile_fn in (("lightweight_trading_model.pkl", compile_lightweight_model),
+                                   ("trading_model.pkl", compile_simple_model)):
+        if os.path.exists(model_file):
+            compile_fn(model_file)
+        else:
+            print(f"Modelo {model_file} não encontrado, pulando")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,27 +2,159 @@ import pandas as pd
 import numpy as np
 import os
 import glob
+import contextlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import json
+from numpy.lib.stride_tricks import sliding_window_view
+from columnar_store import ColumnarStore, PROCESSED_STORE
+from indicator_engine import ExponentialMean, IncrementalIndicators, INDICATOR_COLUMNS
+from training_data_writer import TrainingDataWriter
+from data_quality import QualityIndex, DUPLICATE, OUTLIER, build_quality_flags, quality_index_path, return_outliers
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+PROMPT_INDICATORS = [
+    'sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
+    'bb_upper', 'bb_middle', 'bb_lower'
+]
+PROMPT_CANDLES = 10  # Velas históricas incluídas em cada prompt
+TEXT_PROMPT_INDICATORS = [
+    ('sma_5', 'SMA 5', '.2f'),
+    ('sma_10', 'SMA 10', '.2f'),
+    ('sma_20', 'SMA 20', '.2f'),
+    ('rsi', 'RSI', '.2f'),
+    ('macd', 'MACD', '.4f'),
+    ('macd_signal', 'MACD Signal', '.4f'),
+]
+INDICATOR_WARMUP = 20  # Maior janela móvel usada pelos indicadores
+INDICATOR_OUTPUT_COLUMNS = ['timestamp'] + OHLCV_COLUMNS + INDICATOR_COLUMNS
+
+OHLCV_DTYPES = {'timestamp': str, 'open': 'float64', 'high': 'float64',
+                'low': 'float64', 'close': 'float64', 'volume': 'float64'}
+TIMESTAMP_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%d %H:%M:%S%z',
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+]
+
+
+def detect_timestamp_format(samples):
+    """Detecta o formato dos timestamps a partir de uma amostra ('ms'/'s' para epoch numérico)"""
+    samples = pd.Series(samples).dropna().astype(str)
+    if len(samples) == 0:
+        return None
+    
+    if samples.str.fullmatch(r'\d+').all():
+        return 'ms' if samples.astype('int64').max() > 10**11 else 's'
+    
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            pd.to_datetime(samples, format=fmt)
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def parse_timestamps(values, fmt):
+    """Converte timestamps com um formato fixo, normalizando fusos para UTC sem tz"""
+    if fmt in ('ms', 's'):
+        return pd.to_datetime(pd.to_numeric(values), unit=fmt)
+    try:
+        parsed = pd.to_datetime(values, format=fmt if fmt is not None else 'mixed')
+    except ValueError:
+        # Formato mudou no meio do arquivo: usar o parser flexível
+        parsed = pd.to_datetime(values, format='mixed')
+    if getattr(parsed.dt, 'tz', None) is not None:
+        parsed = parsed.dt.tz_convert('UTC').dt.tz_localize(None)
+    return parsed
+
+
+def read_ohlcv_csv(file, chunksize=None, timestamp_format=None):
+    """Lê um CSV OHLCV com o schema declarado e timestamps em formato fixo"""
+    if timestamp_format is None:
+        head = pd.read_csv(file, nrows=100, usecols=['timestamp'], dtype=str)
+        timestamp_format = detect_timestamp_format(head['timestamp'])
+    
+    if chunksize is None:
+        try:
+            df = pd.read_csv(file, dtype=OHLCV_DTYPES)
+        except (ValueError, TypeError):
+            # Valores não numéricos: deixar a conversão (com coerção) para a limpeza
+            df = pd.read_csv(file, dtype={'timestamp': str})
+        df['timestamp'] = parse_timestamps(df['timestamp'], timestamp_format)
+        return df
+    return _iter_ohlcv_chunks(file, chunksize, timestamp_format)
+
+
+def _iter_ohlcv_chunks(file, chunksize, timestamp_format):
+    """Versão em blocos de read_ohlcv_csv, com o mesmo fallback sem schema"""
+    emitted = 0
+    try:
+        for chunk in pd.read_csv(file, dtype=OHLCV_DTYPES, chunksize=chunksize):
+            chunk['timestamp'] = parse_timestamps(chunk['timestamp'], timestamp_format)
+            emitted += len(chunk)
+            yield chunk
+    except (ValueError, TypeError):
+        # Retomar o arquivo a partir da primeira linha ainda não emitida, sem schema
+        for chunk in pd.read_csv(file, dtype={'timestamp': str}, chunksize=chunksize,
+                                 skiprows=range(1, emitted + 1)):
+            chunk['timestamp'] = parse_timestamps(chunk['timestamp'], timestamp_format)
+            yield chunk
+
+
+def _load_csv_worker(file):
+    """Carrega um arquivo no processo worker e mede o tempo de leitura"""
+    started = time.perf_counter()
+    try:
+        df = read_ohlcv_csv(file)
+    except Exception as e:
+        return file, None, 0.0, e
+    return file, df, time.perf_counter() - started, None
+
 
 class DataProcessor:
     def __init__(self, data_dir="/home/ubuntu/data/btc_data"):
         self.data_dir = data_dir
         self.processed_data = None
         
-    def load_all_csv_files(self):
-        """Carrega todos os arquivos CSV do diretório de dados"""
-        csv_files = glob.glob(os.path.join(self.data_dir, "*.csv"))
+    def load_all_csv_files(self, max_workers=None):
+        """Carrega todos os arquivos CSV do diretório de dados em paralelo (um processo por arquivo)"""
+        csv_files = sorted(glob.glob(os.path.join(self.data_dir, "*.csv")))
         print(f"Encontrados {len(csv_files)} arquivos CSV")
         
+        started = time.perf_counter()
+        if len(csv_files) > 1 and max_workers != 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_load_csv_worker, csv_files))
+        else:
+            results = [_load_csv_worker(file) for file in csv_files]
+        
         all_data = []
-        for file in sorted(csv_files):
-            try:
-                df = pd.read_csv(file)
-                all_data.append(df)
-                print(f"Carregado: {os.path.basename(file)} - {len(df)} registros")
-            except Exception as e:
-                print(f"Erro ao carregar {file}: {e}")
+        total_bytes = 0
+        for file, df, elapsed, error in results:
+            if error is not None:
+                print(f"Erro ao carregar {file}: {error}")
+                continue
+            all_data.append(df)
+            size_mb = os.path.getsize(file) / 1e6
+            total_bytes += os.path.getsize(file)
+            rate = len(df) / elapsed if elapsed > 0 else float('inf')
+            print(f"Carregado: {os.path.basename(file)} - {len(df)} registros "
+                  f"({rate:,.0f} linhas/s, {size_mb / max(elapsed, 1e-9):.1f} MB/s)")
+        
+        elapsed = time.perf_counter() - started
+        if all_data:
+            print(f"Leitura concluída em {elapsed:.2f}s ({total_bytes / 1e6 / max(elapsed, 1e-9):.1f} MB/s no total)")
         
         if all_data:
             combined_data = pd.concat(all_data, ignore_index=True)
@@ -32,28 +164,30 @@ class DataProcessor:
             print("Nenhum dado foi carregado")
             return None
     
-    def clean_and_structure_data(self, df):
+    def clean_and_structure_data(self, df, verbose=True):
         """Limpa e estrutura os dados OHLCV"""
         if df is None:
             return None
             
         # Verificar se as colunas existem
         available_columns = df.columns.tolist()
-        print(f"Colunas disponíveis: {available_columns}")
+        if verbose:
+            print(f"Colunas disponíveis: {available_columns}")
         
         # Selecionar apenas as colunas OHLCV necessárias
         required_columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
         df_clean = df[required_columns].copy()
         
-        # Converter timestamp para datetime com formato flexível
-        try:
-            df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'], format='mixed')
-        except:
+        # Converter timestamp para datetime com formato flexível (já vem tipado da leitura)
+        if not pd.api.types.is_datetime64_any_dtype(df_clean['timestamp']):
             try:
-                df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'])
+                df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'], format='mixed')
             except:
-                print("Erro ao converter timestamp, tentando formato ISO8601")
-                df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'], format='ISO8601')
+                try:
+                    df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'])
+                except:
+                    print("Erro ao converter timestamp, tentando formato ISO8601")
+                    df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'], format='ISO8601')
         
         # Remover duplicatas
         df_clean = df_clean.drop_duplicates(subset=['timestamp'])
@@ -72,7 +206,8 @@ class DataProcessor:
         # Remover linhas com valores inválidos após conversão
         df_clean = df_clean.dropna()
         
-        print(f"Dados limpos: {len(df_clean)} registros")
+        if verbose:
+            print(f"Dados limpos: {len(df_clean)} registros")
         return df_clean
     
     def add_technical_indicators(self, df):
@@ -112,120 +247,187 @@ class DataProcessor:
         print("Indicadores técnicos adicionados")
         return df
     
+    def add_technical_indicators_chunk(self, df, state=None):
+        """Adiciona indicadores a um bloco, continuando o estado (janelas e EWM) do bloco anterior"""
+        state = state or {'tail': None, 'ewm': {}}
+        tail = state['tail']
+        
+        # Prefixar as últimas velas do bloco anterior para as janelas móveis
+        if tail is not None and len(tail) > 0:
+            df = pd.concat([tail, df], ignore_index=True)
+        df = df.reset_index(drop=True)
+        n_tail = 0 if tail is None else len(tail)
+        
+        df['sma_5'] = df['close'].rolling(window=5).mean()
+        df['sma_10'] = df['close'].rolling(window=10).mean()
+        df['sma_20'] = df['close'].rolling(window=20).mean()
+        
+        delta = df['close'].diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        rs = gain / loss
+        df['rsi'] = 100 - (100 / (1 + rs))
+        
+        df['bb_middle'] = df['close'].rolling(window=20).mean()
+        bb_std = df['close'].rolling(window=20).std()
+        df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
+        df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
+        
+        df['volume_sma'] = df['volume'].rolling(window=20).mean()
+        
+        # As EWMs carregam o próprio estado, então são calculadas apenas sobre as linhas novas
+        new_tail = df[['timestamp'] + OHLCV_COLUMNS].tail(INDICATOR_WARMUP).reset_index(drop=True)
+        df = df.iloc[n_tail:].reset_index(drop=True)
+        ewm = {name: ExponentialMean(span, *(state['ewm'].get(name) or ()))
+               for name, span in (('exp1', 12), ('exp2', 26), ('signal', 9))}
+        df['macd'] = ewm['exp1'].push_many(df['close'].to_numpy()) - ewm['exp2'].push_many(df['close'].to_numpy())
+        df['macd_signal'] = ewm['signal'].push_many(df['macd'].to_numpy())
+        # Estado serializável (numerador, peso) de cada média
+        ewm_state = {name: (mean.numerator, mean.weight) for name, mean in ewm.items()}
+        
+        # Reordenar as colunas como no caminho em memória
+        df = df[INDICATOR_OUTPUT_COLUMNS]
+        
+        new_state = {'tail': new_tail, 'ewm': ewm_state}
+        return df, new_state
+    
+    def add_technical_indicators_live(self, df, engine=None):
+        """Adiciona indicadores a novas velas continuando um IncrementalIndicators (O(1) por vela)"""
+        engine = engine or IncrementalIndicators()
+        df = df.copy()
+        df[INDICATOR_COLUMNS] = engine.update_many(df)
+        return df[INDICATOR_OUTPUT_COLUMNS], engine
+    
+    def build_timeframe_pyramid(self, df=None, cache_dir="processed_btc_data_pyramid"):
+        """Carrega (ou constrói e salva) a pirâmide multi-timeframe, atualizando-a com velas novas"""
+        from timeframe_pyramid import BarPyramid
+        
+        df = df if df is not None else self.processed_data
+        pyramid = BarPyramid.load(cache_dir)
+        if pyramid is None or df is None or pyramid.source_rows > len(df):
+            if df is None:
+                return pyramid
+            pyramid = BarPyramid().build(df)
+        elif df['timestamp'].iloc[-1] > pyramid.source_end:
+            # Cache válido: agregar apenas as velas posteriores ao que já foi processado
+            pyramid.update(df[df['timestamp'] > pyramid.source_end])
+        else:
+            return pyramid
+        
+        pyramid.save(cache_dir)
+        return pyramid
+    
     def create_training_prompts(self, df, lookback_window=60):
         """Cria prompts estruturados para treinamento da LLM"""
         if df is None:
             return None
-            
-        prompts = []
         
-        for i in range(lookback_window, len(df)):
-            # Dados históricos (janela de lookback)
-            historical_data = df.iloc[i-lookback_window:i]
-            
-            # Próxima vela (target)
-            next_candle = df.iloc[i]
-            
-            # Determinar direção (alta/baixa)
-            current_close = historical_data.iloc[-1]['close']
-            next_close = next_candle['close']
-            direction = "ALTA" if next_close > current_close else "BAIXA"
-            
-            # Criar prompt estruturado
-            prompt_data = {
-                "timestamp": next_candle['timestamp'].isoformat(),
-                "historical_candles": [],
-                "indicators": {},
-                "target_direction": direction,
-                "price_change": float(next_close - current_close),
-                "price_change_percent": float((next_close - current_close) / current_close * 100)
-            }
-            
-            # Adicionar dados históricos das últimas 10 velas
-            for j in range(-10, 0):
-                candle = historical_data.iloc[j]
-                prompt_data["historical_candles"].append({
-                    "timestamp": candle['timestamp'].isoformat(),
-                    "open": float(candle['open']),
-                    "high": float(candle['high']),
-                    "low": float(candle['low']),
-                    "close": float(candle['close']),
-                    "volume": float(candle['volume'])
-                })
-            
-            # Adicionar indicadores técnicos atuais
-            last_candle = historical_data.iloc[-1]
-            prompt_data["indicators"] = {
-                "sma_5": float(last_candle['sma_5']) if not pd.isna(last_candle['sma_5']) else None,
-                "sma_10": float(last_candle['sma_10']) if not pd.isna(last_candle['sma_10']) else None,
-                "sma_20": float(last_candle['sma_20']) if not pd.isna(last_candle['sma_20']) else None,
-                "rsi": float(last_candle['rsi']) if not pd.isna(last_candle['rsi']) else None,
-                "macd": float(last_candle['macd']) if not pd.isna(last_candle['macd']) else None,
-                "macd_signal": float(last_candle['macd_signal']) if not pd.isna(last_candle['macd_signal']) else None,
-                "bb_upper": float(last_candle['bb_upper']) if not pd.isna(last_candle['bb_upper']) else None,
-                "bb_middle": float(last_candle['bb_middle']) if not pd.isna(last_candle['bb_middle']) else None,
-                "bb_lower": float(last_candle['bb_lower']) if not pd.isna(last_candle['bb_lower']) else None
-            }
-            
-            prompts.append(prompt_data)
+        prompts = list(self.iter_training_prompts(df, lookback_window))
         
         print(f"Criados {len(prompts)} prompts de treinamento")
         return prompts
     
-    def save_training_data(self, prompts, output_file="training_data.jsonl"):
-        """Salva os dados de treinamento em formato JSONL"""
-        if not prompts:
+    def iter_training_prompts(self, df, lookback_window=60, batch_size=50000):
+        """Gera os prompts em lotes a partir de janelas deslizantes NumPy (sem iloc por linha)"""
+        if df is None or len(df) <= lookback_window:
             return
+        if lookback_window < PROMPT_CANDLES:
+            raise ValueError(f"lookback_window deve ser >= {PROMPT_CANDLES}")
+        
+        # Converter as colunas uma única vez para arrays
+        timestamps = [ts.isoformat() for ts in df['timestamp']]
+        ohlcv = df[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+        indicators = df[PROMPT_INDICATORS].to_numpy(dtype=np.float64)
+        close = ohlcv[:, 3]
+        
+        # windows[k] contém as velas k .. k+PROMPT_CANDLES-1, shape (n, 5, PROMPT_CANDLES)
+        windows = sliding_window_view(ohlcv, PROMPT_CANDLES, axis=0)
+        
+        for start in range(lookback_window, len(df), batch_size):
+            stop = min(start + batch_size, len(df))
             
-        with open(output_file, 'w') as f:
-            for prompt in prompts:
-                # Criar prompt textual para a LLM
-                text_prompt = self.create_text_prompt(prompt)
-                
-                training_example = {
-                    "prompt": text_prompt,
-                    "completion": prompt["target_direction"],
-                    "metadata": {
-                        "timestamp": prompt["timestamp"],
-                        "price_change": prompt["price_change"],
-                        "price_change_percent": prompt["price_change_percent"]
-                    }
+            # Vela atual (última da janela) e próxima vela (target)
+            current_close = close[start - 1:stop - 1]
+            next_close = close[start:stop]
+            price_change = next_close - current_close
+            price_change_percent = price_change / current_close * 100
+            directions = np.where(next_close > current_close, "ALTA", "BAIXA").tolist()
+            
+            candles = windows[start - PROMPT_CANDLES:stop - PROMPT_CANDLES].transpose(0, 2, 1).tolist()
+            indicator_block = indicators[start - 1:stop - 1]
+            indicator_values = np.where(np.isnan(indicator_block), None, indicator_block).tolist()
+            
+            for k, i in enumerate(range(start, stop)):
+                yield {
+                    "timestamp": timestamps[i],
+                    "historical_candles": [
+                        {
+                            "timestamp": ts,
+                            "open": o,
+                            "high": h,
+                            "low": l,
+                            "close": c,
+                            "volume": v
+                        }
+                        for ts, (o, h, l, c, v) in zip(timestamps[i - PROMPT_CANDLES:i], candles[k])
+                    ],
+                    "indicators": dict(zip(PROMPT_INDICATORS, indicator_values[k])),
+                    "target_direction": directions[k],
+                    "price_change": float(price_change[k]),
+                    "price_change_percent": float(price_change_percent[k])
                 }
-                
-                f.write(json.dumps(training_example) + '\n')
+    
+    def save_training_data(self, prompts, output_file="training_data.jsonl",
+                           compress=False, max_shard_bytes=None):
+        """Salva os dados de treinamento em formato JSONL (aceita lista ou gerador de prompts)"""
+        # A gravação roda em outra thread, sobrepondo-se à geração dos prompts
+        with TrainingDataWriter(output_file, compress=compress, max_shard_bytes=max_shard_bytes) as writer:
+            writer.write_many(self.iter_training_examples(prompts))
+        
+        # Geradores não podem ser testados antes de consumidos: conferir o que foi gravado
+        if writer.records == 0:
+            print(f"Nenhum prompt para salvar: {writer.shards[0]['path']} ficou vazio")
+            return writer.shards
         
-        print(f"Dados de treinamento salvos em {output_file}")
+        print(f"{writer.records} exemplos de treinamento salvos em {len(writer.shards)} arquivo(s): "
+              f"{', '.join(shard['path'] for shard in writer.shards[:3])}{' ...' if len(writer.shards) > 3 else ''}")
+        return writer.shards
+    
+    def iter_training_examples(self, prompts):
+        """Converte prompts estruturados em exemplos prompt/completion, um por vez"""
+        for prompt in prompts:
+            yield {
+                "prompt": self.create_text_prompt(prompt),
+                "completion": prompt["target_direction"],
+                "metadata": {
+                    "timestamp": prompt["timestamp"],
+                    "price_change": prompt["price_change"],
+                    "price_change_percent": prompt["price_change_percent"]
+                }
+            }
     
     def create_text_prompt(self, prompt_data):
         """Cria um prompt textual estruturado para a LLM"""
-        text = "Análise de mercado BTC/USDT:\n\n"
+        parts = ["Análise de mercado BTC/USDT:\n\n"]
         
         # Adicionar dados das últimas velas
-        text += "Últimas 5 velas (OHLCV):\n"
+        parts.append("Últimas 5 velas (OHLCV):\n")
         for i, candle in enumerate(prompt_data["historical_candles"][-5:]):
-            text += f"Vela {i+1}: O={candle['open']:.2f}, H={candle['high']:.2f}, L={candle['low']:.2f}, C={candle['close']:.2f}, V={candle['volume']:.2f}\n"
+            parts.append(f"Vela {i+1}: O={candle['open']:.2f}, H={candle['high']:.2f}, L={candle['low']:.2f}, C={candle['close']:.2f}, V={candle['volume']:.2f}\n")
         
         # Adicionar indicadores técnicos
-        text += "\nIndicadores técnicos atuais:\n"
+        parts.append("\nIndicadores técnicos atuais:\n")
         indicators = prompt_data["indicators"]
-        if indicators["sma_5"]:
-            text += f"SMA 5: {indicators['sma_5']:.2f}\n"
-        if indicators["sma_10"]:
-            text += f"SMA 10: {indicators['sma_10']:.2f}\n"
-        if indicators["sma_20"]:
-            text += f"SMA 20: {indicators['sma_20']:.2f}\n"
-        if indicators["rsi"]:
-            text += f"RSI: {indicators['rsi']:.2f}\n"
-        if indicators["macd"]:
-            text += f"MACD: {indicators['macd']:.4f}\n"
-        if indicators["macd_signal"]:
-            text += f"MACD Signal: {indicators['macd_signal']:.4f}\n"
-        
-        text += "\nCom base na análise price action e indicadores técnicos, qual será a direção da próxima vela?"
-        
-        return text
+        for key, label, fmt in TEXT_PROMPT_INDICATORS:
+            value = indicators[key]
+            if value:
+                parts.append(f"{label}: {value:{fmt}}\n")
+        
+        parts.append("\nCom base na análise price action e indicadores técnicos, qual será a direção da próxima vela?")
+        
+        return "".join(parts)
     
-    def process_all_data(self):
+    def process_all_data(self, save_csv=False):
         """Executa todo o pipeline de processamento de dados"""
         print("Iniciando processamento de dados...")
         
@@ -235,6 +437,7 @@ class DataProcessor:
             return None
         
         # 2. Limpar e estruturar
+        duplicate_timestamps = self._duplicate_timestamps(raw_data)
         clean_data = self.clean_and_structure_data(raw_data)
         if clean_data is None:
             return None
@@ -242,23 +445,170 @@ class DataProcessor:
         # 3. Adicionar indicadores técnicos
         enhanced_data = self.add_technical_indicators(clean_data)
         
-        # 4. Criar prompts de treinamento (usando apenas uma amostra para economizar tempo)
-        sample_size = min(100000, len(enhanced_data))  # Usar no máximo 100k registros para prompts
-        sample_data = enhanced_data.tail(sample_size)
-        training_prompts = self.create_training_prompts(sample_data)
+        # 4-5. Criar prompts sobre todo o histórico e gravá-los em streaming
+        self.save_training_data(self.iter_training_prompts(enhanced_data))
         
-        # 5. Salvar dados de treinamento
-        self.save_training_data(training_prompts)
+        # 6. Salvar dados processados no store colunar (CSV apenas sob demanda)
+        ColumnarStore(PROCESSED_STORE).write(enhanced_data)
+        print(f"Dados processados salvos em {PROCESSED_STORE}/")
+        if save_csv:
+            enhanced_data.to_csv('processed_btc_data.csv', index=False)
+            print("Dados processados salvos em processed_btc_data.csv")
         
-        # 6. Salvar dados processados
-        enhanced_data.to_csv('processed_btc_data.csv', index=False)
-        print("Dados processados salvos em processed_btc_data.csv")
+        # 7. Índice de lacunas e anomalias, salvo ao lado de cada saída (store e CSV)
+        quality = QualityIndex.build(enhanced_data, duplicate_timestamps)
+        quality.save(quality_index_path(PROCESSED_STORE))
+        if save_csv:
+            quality.save(quality_index_path('processed_btc_data.csv'))
         
         self.processed_data = enhanced_data
         return enhanced_data
 
+    def _duplicate_timestamps(self, raw_data):
+        """Timestamps repetidos nos dados brutos (antes da remoção de duplicatas)"""
+        timestamps = raw_data['timestamp']
+        if not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps, format='mixed', errors='coerce')
+        return timestamps[timestamps.duplicated()].unique()
+    
+    def iter_csv_chunks(self, chunk_size=500000):
+        """Lê os arquivos CSV em ordem de timestamp, em blocos de no máximo chunk_size linhas"""
+        csv_files = glob.glob(os.path.join(self.data_dir, "*.csv"))
+        print(f"Encontrados {len(csv_files)} arquivos CSV")
+        
+        # Detectar o formato de cada arquivo e ordená-los pelo primeiro timestamp
+        first_timestamps = []
+        for file in sorted(csv_files):
+            try:
+                head = pd.read_csv(file, nrows=100, usecols=['timestamp'], dtype=str)
+                fmt = detect_timestamp_format(head['timestamp'])
+                first = parse_timestamps(head['timestamp'].iloc[:1], fmt).iloc[0]
+                first_timestamps.append((first, file, fmt))
+            except Exception as e:
+                print(f"Erro ao carregar {file}: {e}")
+        
+        for _, file, fmt in sorted(first_timestamps, key=lambda item: item[0]):
+            print(f"Processando: {os.path.basename(file)}")
+            for chunk in read_ohlcv_csv(file, chunksize=chunk_size, timestamp_format=fmt):
+                yield chunk
+    
+    def process_all_data_streaming(self, chunk_size=500000, lookback_window=60,
+                                   output_store=PROCESSED_STORE,
+                                   output_jsonl='training_data.jsonl',
+                                   output_csv=None, compress=False, max_shard_bytes=None):
+        """Executa o pipeline em blocos, com memória constante independente do tamanho do histórico
+
+        Os arquivos são lidos em ordem do primeiro timestamp, e cada bloco é ordenado e deduplicado
+        internamente. Velas com timestamp igual ou anterior à última já emitida (arquivos sobrepostos
+        ou fora de ordem) são descartadas e contadas em 'dropped_rows'; para histórico desordenado
+        entre arquivos, use process_all_data, que ordena tudo em memória.
+        """
+        print("Iniciando processamento de dados (modo streaming)...")
+        
+        state = None
+        prompt_tail = None
+        last_timestamp = None
+        total_rows = 0
+        total_prompts = 0
+        dropped_rows = 0
+        first_timestamp = None
+        
+        store = ColumnarStore(output_store)
+        
+        quality_flags = []
+        late_duplicates = []
+        previous_bar = None
+        
+        with contextlib.ExitStack() as stack:
+            csv_out = stack.enter_context(open(output_csv, 'w', newline='')) if output_csv else None
+            writer = stack.enter_context(TrainingDataWriter(output_jsonl, compress=compress,
+                                                            max_shard_bytes=max_shard_bytes))
+            for raw_chunk in self.iter_csv_chunks(chunk_size):
+                duplicate_timestamps = self._duplicate_timestamps(raw_chunk)
+                chunk = self.clean_and_structure_data(raw_chunk, verbose=False)
+                
+                # Descartar velas já emitidas por blocos/arquivos anteriores
+                if last_timestamp is not None:
+                    repeated = chunk['timestamp'] <= last_timestamp
+                    late_duplicates.append(chunk.loc[repeated, 'timestamp'].to_numpy(dtype='datetime64[ns]'))
+                    dropped_rows += int(repeated.sum())
+                    chunk = chunk[~repeated]
+                if len(chunk) == 0:
+                    continue
+                
+                enhanced, state = self.add_technical_indicators_chunk(chunk, state)
+                
+                # Flags de qualidade do bloco, continuando a partir da última vela anterior
+                ohlcv = enhanced[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+                timestamps = enhanced['timestamp'].to_numpy()
+                quality_flags.append(build_quality_flags(timestamps, ohlcv, duplicate_timestamps,
+                                                         previous_bar=previous_bar, flag_returns=False))
+                previous_bar = (timestamps[-1].astype('datetime64[ns]').astype(np.int64), ohlcv[-1, :4])
+                
+                last_timestamp = enhanced['timestamp'].iloc[-1]
+                if first_timestamp is None:
+                    first_timestamp = enhanced['timestamp'].iloc[0]
+                
+                # Salvar o bloco processado de forma incremental
+                if total_rows == 0:
+                    store.write(enhanced)
+                else:
+                    store.append(enhanced)
+                if csv_out:
+                    enhanced.to_csv(csv_out, index=False, header=(total_rows == 0))
+                total_rows += len(enhanced)
+                
+                # Prompts: prefixar a janela de lookback do bloco anterior
+                if prompt_tail is not None:
+                    window = pd.concat([prompt_tail, enhanced], ignore_index=True)
+                else:
+                    window = enhanced
+                total_prompts += writer.write_many(
+                    self.iter_training_examples(self.iter_training_prompts(window, lookback_window))
+                )
+                prompt_tail = window.tail(lookback_window).reset_index(drop=True)
+                
+                print(f"Processados {total_rows} registros, {total_prompts} prompts")
+        
+        if output_csv:
+            print(f"Dados processados salvos em {output_csv}")
+        if dropped_rows:
+            print(f"Aviso: {dropped_rows} velas repetidas ou fora de ordem entre blocos/arquivos foram descartadas")
+        if total_rows:
+            quality = QualityIndex(store.column('timestamp'), np.concatenate(quality_flags))
+            # Retornos extremos com mediana/MAD da série inteira (a coluna close é lida do store
+            # por memory-map), para não depender de como os dados foram divididos em blocos
+            close = np.asarray(store.column('close'), dtype=np.float64)
+            previous_close = np.concatenate(([np.nan], close[:-1]))
+            quality.flags[return_outliers(close, previous_close)] |= OUTLIER
+            # Duplicatas entre blocos/arquivos: marcar a vela já gravada
+            if late_duplicates:
+                repeated = np.concatenate(late_duplicates).view(np.int64)
+                quality.flags[np.isin(quality.timestamps, repeated)] |= DUPLICATE
+            quality.save(quality_index_path(output_store))
+            if output_csv:
+                quality.save(quality_index_path(output_csv))
+        print(f"Dados processados salvos em {output_store}/")
+        print(f"Dados de treinamento salvos em {len(writer.shards)} arquivo(s) a partir de {output_jsonl}")
+        
+        return {
+            'total_rows': total_rows,
+            'total_prompts': total_prompts,
+            'dropped_rows': dropped_rows,
+            'start': first_timestamp,
+            'end': last_timestamp
+        }
+
 if __name__ == "__main__":
     processor = DataProcessor()
+    
+    if "--streaming" in sys.argv:
+        summary = processor.process_all_data_streaming()
+        print(f"\nResumo dos dados processados:")
+        print(f"Período: {summary['start']} a {summary['end']}")
+        print(f"Total de registros: {summary['total_rows']}")
+        sys.exit(0)
+    
     processed_data = processor.process_all_data()
     
     if processed_data is not None:
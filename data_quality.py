@@ -0,0 +1,193 @@
+import pandas as pd
+import numpy as np
+import os
+
+# Flags por vela (bitmask uint8)
+GAP_BEFORE = 1      # faltam velas entre a anterior e esta
+DUPLICATE = 2       # timestamp aparecia mais de uma vez nos dados brutos
+ZERO_VOLUME = 4     # volume zero
+OUTLIER = 8         # retorno extremo ou vela inconsistente (high < low, close fora do range)
+FROZEN = 16         # OHLC idêntico ao da vela anterior (preço congelado)
+
+FLAG_NAMES = {
+    GAP_BEFORE: 'gap',
+    DUPLICATE: 'duplicate',
+    ZERO_VOLUME: 'zero_volume',
+    OUTLIER: 'outlier',
+    FROZEN: 'frozen',
+}
+BASE_PERIOD = pd.Timedelta(minutes=1)
+
+
+def quality_index_path(data_path):
+    """Arquivo do índice de qualidade ao lado dos dados processados (store ou CSV)"""
+    if os.path.isdir(data_path):
+        return os.path.join(data_path, 'quality_index.npz')
+    return os.path.splitext(data_path)[0] + '_quality.npz'
+
+
+def return_outliers(close, previous_close, outlier_threshold=10.0):
+    """Velas com retorno extremo por z-score robusto (mediana/MAD dos log-retornos da série)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_returns = np.log(close / previous_close)
+    outliers = np.zeros(len(log_returns), dtype=bool)
+    finite = np.isfinite(log_returns)
+    if finite.sum() > 1:
+        median = np.median(log_returns[finite])
+        mad = np.median(np.abs(log_returns[finite] - median)) * 1.4826
+        if mad > 0:
+            with np.errstate(invalid='ignore'):
+                outliers = np.abs(log_returns - median) / mad > outlier_threshold
+    return outliers
+
+
+def build_quality_flags(timestamps, ohlcv, duplicate_timestamps=None, period=BASE_PERIOD,
+                        outlier_threshold=10.0, previous_bar=None, flag_returns=True):
+    """Calcula as flags de qualidade de todas as velas em uma passada vetorizada
+
+    previous_bar: (timestamp_ns, ohlc) da última vela do bloco anterior, no modo streaming.
+    flag_returns: marcar retornos extremos; o modo streaming desliga e chama return_outliers
+    uma vez sobre a série inteira, para usar a mesma mediana/MAD global do caminho em memória.
+    """
+    ts = np.asarray(timestamps, dtype='datetime64[ns]').view(np.int64)
+    ohlcv = np.asarray(ohlcv, dtype=np.float64)
+    flags = np.zeros(len(ts), dtype=np.uint8)
+    if len(ts) == 0:
+        return flags
+
+    open_, high, low, close, volume = ohlcv.T
+    prev_ts = np.empty_like(ts)
+    prev_ts[1:] = ts[:-1]
+    prev_ohlc = np.empty((len(ts), 4))
+    prev_ohlc[1:] = ohlcv[:-1, :4]
+    if previous_bar is not None:
+        prev_ts[0], prev_ohlc[0] = previous_bar[0], previous_bar[1]
+    else:
+        prev_ts[0], prev_ohlc[0] = ts[0] - period.value, np.nan
+
+    flags[(ts - prev_ts) > period.value] |= GAP_BEFORE
+    flags[volume == 0] |= ZERO_VOLUME
+    flags[np.all(ohlcv[:, :4] == prev_ohlc, axis=1)] |= FROZEN
+
+    # Retornos extremos por z-score robusto (mediana/MAD) e velas inconsistentes
+    if flag_returns:
+        flags[return_outliers(close, prev_ohlc[:, 3], outlier_threshold)] |= OUTLIER
+    invalid = (high < low) | (close > high) | (close < low) | (open_ > high) | (open_ < low) | (ohlcv <= 0)[:, :4].any(axis=1)
+    flags[invalid] |= OUTLIER
+
+    if duplicate_timestamps is not None and len(duplicate_timestamps) > 0:
+        duplicates = np.asarray(duplicate_timestamps, dtype='datetime64[ns]').view(np.int64)
+        flags[np.isin(ts, duplicates)] |= DUPLICATE
+
+    return flags
+
+
+def _runs(mask):
+    """Retorna (início, fim inclusivo) de cada sequência contígua de True"""
+    padded = np.concatenate([[False], mask, [False]]).astype(np.int8)
+    edges = np.diff(padded)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+class QualityIndex:
+    """Índice de qualidade da série de 1m: flags por vela e eventos (lacunas, sequências ruins)"""
+
+    def __init__(self, timestamps, flags, period=BASE_PERIOD):
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[ns]').view(np.int64)
+        self.flags = np.asarray(flags, dtype=np.uint8)
+        self.period = period
+
+    @classmethod
+    def build(cls, df, duplicate_timestamps=None, period=BASE_PERIOD, outlier_threshold=10.0):
+        """Constrói o índice a partir de um DataFrame OHLCV limpo e ordenado"""
+        flags = build_quality_flags(df['timestamp'].to_numpy(),
+                                    df[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64),
+                                    duplicate_timestamps, period, outlier_threshold)
+        return cls(df['timestamp'].to_numpy(), flags, period)
+
+    def events(self):
+        """Tabela de eventos: uma linha por lacuna ou sequência contínua de velas com a mesma flag"""
+        rows = []
+        ts = self.timestamps
+        for flag, name in FLAG_NAMES.items():
+            mask = (self.flags & flag) != 0
+            if flag == GAP_BEFORE:
+                # Cada lacuna é um evento: minutos ausentes entre a vela anterior e esta
+                positions = np.flatnonzero(mask)
+                starts, ends = positions, positions
+                missing = (ts[positions] - np.where(positions > 0, ts[positions - 1], ts[positions])) // self.period.value - 1
+            else:
+                starts, ends = _runs(mask)
+                missing = np.zeros(len(starts), dtype=np.int64)
+            for start, end, count in zip(starts, ends, missing):
+                rows.append({
+                    'kind': name,
+                    'start_row': int(start),
+                    'end_row': int(end),
+                    'start': pd.Timestamp(ts[start]),
+                    'end': pd.Timestamp(ts[end]),
+                    'bars': int(end - start + 1),
+                    'missing_bars': int(count)
+                })
+        events = pd.DataFrame(rows, columns=['kind', 'start_row', 'end_row', 'start', 'end', 'bars', 'missing_bars'])
+        return events.sort_values(['start_row', 'kind']).reset_index(drop=True)
+
+    def summary(self):
+        return {name: int(np.count_nonzero(self.flags & flag)) for flag, name in FLAG_NAMES.items()}
+
+    def flags_for(self, timestamps):
+        """Flags das velas com os timestamps pedidos (0 se não estiverem no índice)"""
+        query = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        positions = np.searchsorted(self.timestamps, query)
+        positions = np.clip(positions, 0, max(len(self.timestamps) - 1, 0))
+        found = (len(self.timestamps) > 0) & (self.timestamps[positions] == query)
+        return np.where(found, self.flags[positions], 0).astype(np.uint8)
+
+    def trade_mask(self, timestamps, bad_flags=GAP_BEFORE | ZERO_VOLUME | OUTLIER | FROZEN):
+        """True onde a operação vela i -> i+1 atravessa dados ruins (lacuna, preço congelado etc.)"""
+        flags = self.flags_for(timestamps)
+        bad = (flags & (bad_flags & ~GAP_BEFORE)) != 0
+        bad[:-1] |= (flags[1:] & bad_flags) != 0
+        return bad
+
+    def window_mask(self, lookback, bad_flags=0xFF):
+        """True para cada vela cuja janela das últimas `lookback` velas contém alguma flag"""
+        flagged = ((self.flags & bad_flags) != 0).astype(np.int64)
+        counts = np.concatenate([[0], np.cumsum(flagged)])
+        idx = np.arange(len(flagged))
+        return (counts[idx + 1] - counts[np.maximum(idx + 1 - lookback, 0)]) > 0
+
+    def save(self, path):
+        np.savez(path, timestamps=self.timestamps, flags=self.flags,
+                 period_ns=np.int64(self.period.value))
+        print(f"Índice de qualidade salvo em {path}: {self.summary()}")
+
+    @classmethod
+    def for_data(cls, data_path):
+        """Índice dos dados processados (store ou CSV); construído e salvo se ainda não existir
+
+        Sem os dados brutos, duplicatas removidas na limpeza não são marcadas nesse caso.
+        """
+        path = quality_index_path(data_path)
+        if os.path.exists(path):
+            return cls.load(path)
+        print(f"Índice de qualidade não encontrado em {path}; construindo a partir de {data_path}")
+        columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+        if os.path.isdir(data_path):
+            from columnar_store import ColumnarStore
+
+            store = ColumnarStore(data_path)
+            df = pd.DataFrame({column: store.column(column) for column in columns})
+        else:
+            df = pd.read_csv(data_path, usecols=columns)
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
+        index = cls.build(df)
+        index.save(path)
+        return index
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data['timestamps'], data['flags'], pd.Timedelta(int(data['period_ns']), unit='ns'))
@@ -0,0 +1,273 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import itertools
+import json
+import os
+import shutil
+
+from columnar_store import ColumnarStore
+from indicator_engine import FEATURE_COLUMNS
+
+FEATURE_CACHE = "feature_cache"
+DEFAULT_SPEC = {
+    'version': 1,
+    'columns': FEATURE_COLUMNS,
+    'label': 'next_close_up',  # 1 se o close da próxima vela > close atual
+    'horizon': 1,
+    'dtype': 'float32',
+}
+FINGERPRINT_BYTES = 1 << 20
+# Política única de NaN: as features são gravadas como estão e as linhas com indicadores
+# incompletos (aquecimento) ficam fora do treino; nada é imputado com 0 ou mediana
+
+
+def _valid_future(close, following_closes, horizon):
+    """Close `horizon` velas à frente e máscara das linhas com label definido"""
+    extended = np.concatenate([close, np.asarray(following_closes, dtype=np.float64)])
+    future = np.full(len(close), np.nan)
+    available = min(len(close), max(len(extended) - horizon, 0))
+    future[:available] = extended[horizon:horizon + available]
+    return future, ~np.isnan(close) & ~np.isnan(future)
+
+
+def extract_features_and_labels(df, next_close=None, columns=FEATURE_COLUMNS, horizon=1,
+                                following_closes=None, with_timestamps=False):
+    """Monta a matriz de features e o label (close futuro > close atual) de forma vetorizada
+
+    next_close / following_closes: closes das primeiras velas do bloco seguinte, para os labels
+    das últimas linhas do bloco.
+    """
+    if following_closes is None:
+        following_closes = [] if next_close is None else [next_close]
+    close = df['close'].to_numpy(dtype=np.float64)
+    future, valid = _valid_future(close, following_closes, horizon)
+    features = df[columns].to_numpy(dtype=np.float64)[valid]
+    labels = (future[valid] > close[valid]).astype(np.int64)
+    if not with_timestamps:
+        return features, labels
+    timestamps = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return features, labels, timestamps[valid]
+
+
+def iter_feature_chunks(chunks, columns=FEATURE_COLUMNS, horizon=1, with_timestamps=False):
+    """Extrai features/labels de uma sequência de chunks, usando o chunk seguinte para os últimos labels"""
+    previous = None
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        if previous is not None:
+            yield extract_features_and_labels(previous, columns=columns, horizon=horizon,
+                                              following_closes=chunk['close'].iloc[:horizon].tolist(),
+                                              with_timestamps=with_timestamps)
+        previous = chunk
+    if previous is not None:
+        yield extract_features_and_labels(previous, columns=columns, horizon=horizon,
+                                          with_timestamps=with_timestamps)
+
+
+def iter_source_chunks(source, columns=FEATURE_COLUMNS, chunk_size=500000, after=None):
+    """Chunks da origem (store colunar ou CSV) com timestamp, as colunas pedidas e close
+
+    Com `after`, só as velas a partir desse timestamp (inclusive).
+    """
+    columns = ['timestamp'] + [c for c in dict.fromkeys(list(columns) + ['close'])]
+    if ColumnarStore.exists(source):
+        store = ColumnarStore(source)
+        first = 0 if after is None else int(np.searchsorted(store.column('timestamp'), after, side='left'))
+        for start in range(first, len(store), chunk_size):
+            arrays = {c: store.column(c)[start:start + chunk_size] for c in columns}
+            arrays['timestamp'] = np.asarray(arrays['timestamp']).view('datetime64[ns]')
+            yield pd.DataFrame(arrays)
+    else:
+        for chunk in pd.read_csv(source, chunksize=chunk_size, usecols=columns):
+            if after is not None:
+                timestamps = pd.to_datetime(chunk['timestamp']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+                chunk = chunk[timestamps >= after]
+            yield chunk
+
+
+def _file_fingerprint(path):
+    """Hash barato de um arquivo: tamanho, mtime e o primeiro/último MB de conteúdo"""
+    digest = hashlib.sha256()
+    size = os.path.getsize(path)
+    digest.update(f"{os.path.basename(path)}:{size}:{os.path.getmtime(path)}".encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(size - FINGERPRINT_BYTES, FINGERPRINT_BYTES))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def source_fingerprint(source):
+    """Identifica os dados de origem (store colunar ou CSV) sem reler o conteúdo inteiro"""
+    if ColumnarStore.exists(source):
+        files = sorted(os.path.join(source, name) for name in os.listdir(source)
+                       if name.endswith('.bin') or name == 'meta.json')
+    else:
+        files = [source]
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(_file_fingerprint(path).encode())
+    return digest.hexdigest()
+
+
+def feature_key(source, spec=DEFAULT_SPEC):
+    """Chave do cache: hash da origem + hash da especificação das features"""
+    spec_hash = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+    return hashlib.sha256((source_fingerprint(source) + spec_hash).encode()).hexdigest()[:16]
+
+
+class FeatureSet:
+    """Matriz de features float32, labels e timestamps materializados (memory-mapped)"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        rows = self.meta['rows']
+        n_columns = len(self.meta['spec']['columns'])
+        if rows:
+            self.features = np.memmap(os.path.join(path, 'features.bin'), dtype=np.float32, mode='r', shape=(rows, n_columns))
+            self.labels = np.memmap(os.path.join(path, 'labels.bin'), dtype=np.int8, mode='r', shape=(rows,))
+            self.timestamps = np.memmap(os.path.join(path, 'timestamps.bin'), dtype=np.int64, mode='r', shape=(rows,))
+        else:
+            self.features = np.empty((0, n_columns), dtype=np.float32)
+            self.labels = np.empty(0, dtype=np.int8)
+            self.timestamps = np.empty(0, dtype=np.int64)
+
+    @property
+    def columns(self):
+        return list(self.meta['spec']['columns'])
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def complete_rows(self):
+        """Máscara das linhas sem NaN (exclui o aquecimento dos indicadores), calculada em blocos"""
+        mask = np.empty(len(self), dtype=bool)
+        for start in range(0, len(self), 1000000):
+            mask[start:start + 1000000] = ~np.isnan(self.features[start:start + 1000000]).any(axis=1)
+        return mask
+
+    def take(self, positions, drop_incomplete=True):
+        """Features (float32) e labels das posições pedidas"""
+        positions = np.asarray(positions)
+        features = np.asarray(self.features[positions])
+        labels = np.asarray(self.labels[positions]).astype(np.int64)
+        if drop_incomplete:
+            keep = ~np.isnan(features).any(axis=1)
+            features, labels = features[keep], labels[keep]
+        return features, labels
+
+    def sample(self, size, rng=None, drop_incomplete=True):
+        """Amostra uniforme de todo o histórico, em ordem temporal"""
+        rng = rng if rng is not None else np.random.default_rng(42)
+        candidates = np.flatnonzero(self.complete_rows()) if drop_incomplete else np.arange(len(self))
+        if len(candidates) > size:
+            candidates = np.sort(rng.choice(candidates, size=size, replace=False))
+        return self.take(candidates, drop_incomplete=False)
+
+
+class FeatureStore:
+    """Cache de features compartilhado pelos trainers e pelo backtester, chaveado por origem + spec"""
+
+    def __init__(self, cache_dir=FEATURE_CACHE, spec=None):
+        self.cache_dir = cache_dir
+        self.spec = dict(spec or DEFAULT_SPEC)
+
+    def get(self, source, chunk_size=500000):
+        """Retorna o FeatureSet da origem, materializando-o apenas se ainda não estiver em cache
+
+        Se a origem só ganhou velas novas desde a última materialização (atualização diária),
+        o conjunto anterior é estendido com as linhas posteriores ao seu último timestamp.
+        """
+        key = feature_key(source, self.spec)
+        path = os.path.join(self.cache_dir, key)
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            print(f"Features em cache: {path}")
+            return FeatureSet(path)
+        previous = self._previous_set(source)
+        if previous is not None:
+            feature_set = self._extend(previous, source, path, key, chunk_size)
+            if feature_set is not None:
+                return feature_set
+        return self._materialize(source, path, key, chunk_size)
+
+    def _previous_set(self, source):
+        """Último conjunto materializado da mesma origem com a mesma spec (None se não houver)"""
+        if not os.path.isdir(self.cache_dir):
+            return None
+        candidates = []
+        for name in os.listdir(self.cache_dir):
+            meta_file = os.path.join(self.cache_dir, name, 'meta.json')
+            if name.endswith('.tmp') or not os.path.exists(meta_file):
+                continue
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+            if meta['source'] == source and meta['spec'] == self.spec and meta['rows'] > 0:
+                candidates.append(FeatureSet(os.path.join(self.cache_dir, name)))
+        return max(candidates, key=lambda feature_set: feature_set.timestamps[-1], default=None)
+
+    def _iter_source_chunks(self, source, chunk_size, after=None):
+        """Chunks da origem com as colunas da spec; com `after`, só as velas a partir desse timestamp"""
+        return iter_source_chunks(source, self.spec['columns'], chunk_size, after)
+
+    def _write_rows(self, directory, chunks, mode='wb'):
+        """Grava features/labels/timestamps dos chunks nos arquivos do conjunto; retorna as linhas"""
+        rows = 0
+        with open(os.path.join(directory, 'features.bin'), mode) as f_features, \
+                open(os.path.join(directory, 'labels.bin'), mode) as f_labels, \
+                open(os.path.join(directory, 'timestamps.bin'), mode) as f_timestamps:
+            for features, labels, timestamps in iter_feature_chunks(
+                    chunks, self.spec['columns'], self.spec['horizon'], with_timestamps=True):
+                f_features.write(features.astype(np.float32).tobytes())
+                f_labels.write(labels.astype(np.int8).tobytes())
+                f_timestamps.write(timestamps.astype(np.int64).tobytes())
+                rows += len(labels)
+        return rows
+
+    def _publish(self, tmp_path, path, key, source, rows):
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'key': key, 'source': source, 'spec': self.spec, 'rows': rows}, f, indent=2)
+
+        # Publicar o diretório completo de uma vez
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        print(f"Features salvas em {path}: {rows} linhas")
+        return FeatureSet(path)
+
+    def _materialize(self, source, path, key, chunk_size):
+        print(f"Materializando features de {source}...")
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        rows = self._write_rows(tmp_path, self._iter_source_chunks(source, chunk_size))
+        return self._publish(tmp_path, path, key, source, rows)
+
+    def _extend(self, previous, source, path, key, chunk_size):
+        """Acrescenta ao conjunto anterior as linhas posteriores ao seu último timestamp
+
+        Retorna None (materialização completa) se a origem não contém mais a última linha do
+        conjunto anterior com os mesmos valores, ou seja, se não foi só acrescida.
+        """
+        end = int(previous.timestamps[-1])
+        chunks = self._iter_source_chunks(source, chunk_size, after=end)
+        first = next((chunk for chunk in chunks if len(chunk)), None)
+        if first is None:
+            return None
+        first_timestamp = pd.to_datetime(first['timestamp'].iloc[:1]).to_numpy(dtype='datetime64[ns]').view(np.int64)[0]
+        last_row = first[self.spec['columns']].iloc[0].to_numpy(dtype=np.float32)
+        if first_timestamp != end or not np.array_equal(last_row, previous.features[-1], equal_nan=True):
+            return None
+
+        print(f"Estendendo features de {source} a partir de {pd.Timestamp(end)}...")
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        # O conjunto anterior descreve uma versão antiga da origem: reaproveitar os arquivos
+        os.replace(previous.path, tmp_path)
+        # A primeira linha (já gravada) só serve de contexto; as demais ainda não têm features
+        new_chunks = itertools.chain([first.iloc[1:]], chunks)
+        rows = len(previous) + self._write_rows(tmp_path, new_chunks, mode='ab')
+        return self._publish(tmp_path, path, key, source, rows)
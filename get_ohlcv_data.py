@@ -1,27 +1,220 @@
 
-import ccxt
+
 import pandas as pd
 import datetime
+import json
+import os
+import sys
+import time
 
-exchange = ccxt.binance()
 symbol = 'BTC/USDT'
 timeframe = '1m'
-since = exchange.parse8601('2024-07-16T00:00:00Z') # 1 ano de histórico a partir de hoje
+default_since = '2024-07-16T00:00:00Z' # 1 ano de histórico a partir de hoje
+output_file = 'BTC_USDT_1m.csv'
+OHLCV_HEADER = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def timeframe_to_ms(timeframe):
+    """Converte um timeframe no formato ccxt ('1m', '4h', '1d') em milissegundos"""
+    units = {'s': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'w': 7 * 24 * 60 * 60 * 1000}
+    return int(timeframe[:-1]) * units[timeframe[-1]]
+
+
+def iso8601(timestamp_ms):
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse8601(text):
+    return int(pd.Timestamp(text).value // 10**6)
+
+
+class LocalExchange:
+    """Exchange local em memória com a mesma interface de fetch_ohlcv do ccxt (para testes offline)"""
+
+    def __init__(self, candles):
+        self.candles = sorted(candles, key=lambda candle: candle[0])
+        self.calls = 0
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        df = pd.read_csv(csv_file)
+        df['timestamp'] = pd.to_datetime(df['timestamp']).astype('datetime64[ms]').astype('int64')
+        return cls(df[OHLCV_HEADER].values.tolist())
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=500):
+        self.calls += 1
+        limit = limit or 500
+        since = since or 0
+        return [candle for candle in self.candles if candle[0] >= since][:limit]
+
+
+class SyncCheckpoint:
+    """Checkpoint da sincronização: último timestamp gravado e tamanho válido do arquivo"""
+
+    def __init__(self, data_file):
+        self.path = data_file + '.checkpoint'
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, last_timestamp, size):
+        # Gravar em arquivo temporário e trocar atomicamente
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_timestamp': int(last_timestamp), 'size': int(size)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def last_stored_timestamp(data_file, size=None):
+    """Lê apenas a última linha do CSV para descobrir o último timestamp gravado (em ms)
+
+    Com size, lê a linha que termina nesse byte (None se ele não for um fim de linha).
+    """
+    if not os.path.exists(data_file) or os.path.getsize(data_file) == 0:
+        return None
+
+    with open(data_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell() if size is None else min(size, f.tell())
+        if size is not None:
+            if position == 0:
+                return None
+            f.seek(position - 1)
+            if f.read(1) != b'\n':
+                return None
+        block = b''
+        while position > 0 and block.count(b'\n') < 3:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step) + block
+
+    lines = [line for line in block.decode().splitlines() if line.strip()]
+    if not lines or lines[-1].startswith('timestamp'):
+        return None
+    return int(pd.Timestamp(lines[-1].split(',')[0]).value // 10**6)
+
+
+def recover_data_file(data_file, checkpoint):
+    """Reconcilia o arquivo com o checkpoint após uma interrupção ou uma alteração externa
+
+    Uma página gravada pela metade é descartada. Se o arquivo sumiu, ficou menor que o tamanho
+    do checkpoint ou a linha que termina nesse tamanho não é a do último timestamp gravado, o
+    checkpoint não descreve mais o arquivo: ele é descartado (o arquivo é preservado como .stale)
+    e a sincronização recomeça do início.
+    """
+    state = checkpoint.load()
+    if state is None:
+        return
+    if not os.path.exists(data_file):
+        print(f"{data_file} não encontrado: descartando o checkpoint e sincronizando do início")
+        checkpoint.clear()
+        return
+    if os.path.getsize(data_file) < state['size']:
+        print(f"{data_file} é menor que o checkpoint: movido para {data_file}.stale, sincronizando do início")
+        os.replace(data_file, data_file + '.stale')
+        checkpoint.clear()
+        return
+    try:
+        stored_timestamp = last_stored_timestamp(data_file, state['size'])
+    except ValueError:
+        stored_timestamp = None
+    if stored_timestamp != state['last_timestamp']:
+        # Arquivo reescrito por fora: truncar no tamanho antigo cortaria dados que não são nossos
+        print(f"{data_file} não corresponde ao checkpoint: movido para {data_file}.stale, sincronizando do início")
+        os.replace(data_file, data_file + '.stale')
+        checkpoint.clear()
+        return
+    if os.path.getsize(data_file) > state['size']:
+        print(f"Recuperando {data_file}: descartando dados após o último checkpoint")
+        with open(data_file, 'r+b') as f:
+            f.truncate(state['size'])
+
+
+def append_page(data_file, page):
+    """Acrescenta uma página ao CSV em uma única escrita sincronizada e retorna o novo tamanho"""
+    df = pd.DataFrame(page, columns=OHLCV_HEADER)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    write_header = not os.path.exists(data_file) or os.path.getsize(data_file) == 0
+    text = df.to_csv(index=False, header=write_header)
+
+    with open(data_file, 'a', newline='') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def sync_ohlcv(exchange, symbol=symbol, timeframe=timeframe, data_file=output_file,
+               since=default_since, limit=1000, now_ms=None):
+    """Busca apenas as velas posteriores ao último timestamp gravado, com checkpoint por página"""
+    step = timeframe_to_ms(timeframe)
+    checkpoint = SyncCheckpoint(data_file)
+    recover_data_file(data_file, checkpoint)
+
+    state = checkpoint.load()
+    last_timestamp = state['last_timestamp'] if state else last_stored_timestamp(data_file)
+    if last_timestamp is not None:
+        since_ms = last_timestamp + step
+        print(f"Último candle gravado: {iso8601(last_timestamp)}")
+    else:
+        since_ms = parse8601(since)
+
+    total = 0
+    while True:
+        # Ignorar a vela ainda em formação
+        cutoff = (now_ms if now_ms is not None else int(time.time() * 1000)) - step
+        print(f'Fetching OHLCV for {symbol} from {iso8601(since_ms)}')
+        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since_ms, limit)
+        page = [candle for candle in ohlcv if since_ms <= candle[0] <= cutoff]
+        if len(page) == 0:
+            break
+
+        size = append_page(data_file, page)
+        checkpoint.save(page[-1][0], size)
+        total += len(page)
+        since_ms = page[-1][0] + step # Move to the next candle
+
+    print(f'Sincronização concluída: {total} novas velas gravadas em {data_file}')
+    return total
+
+
+def main():
+    if '--full' in sys.argv:
+        # Recomeçar do zero a partir de default_since
+        for path in (output_file, output_file + '.checkpoint'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    if '--backfill' in sys.argv:
+        # Histórico longo: janelas buscadas concorrentemente com rate limit compartilhado
+        import asyncio
+        import ccxt.async_support as ccxt_async
+        from ohlcv_backfill import backfill_to_csv
 
-all_ohlcv = []
+        async def run_backfill():
+            exchange = ccxt_async.binance()
+            try:
+                await backfill_to_csv(exchange, symbol, timeframe, output_file, default_since)
+            finally:
+                await exchange.close()
 
-while True:
-    print(f'Fetching OHLCV for {symbol} from {exchange.iso8601(since)}')
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since)
-    if len(ohlcv) == 0:
-        break
-    all_ohlcv.extend(ohlcv)
-    since = ohlcv[-1][0] + 60 * 1000 # Move to the next minute
+        asyncio.run(run_backfill())
+    else:
+        import ccxt
 
-df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-df.set_index('timestamp', inplace=True)
-df.to_csv('BTC_USDT_1m.csv')
-print('Data collection complete and saved to BTC_USDT_1m.csv')
+        sync_ohlcv(ccxt.binance())
+    print(f'Data collection complete and saved to {output_file}')
 
 
+if __name__ == '__main__':
+    main()
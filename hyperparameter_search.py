@@ -0,0 +1,278 @@
+import numpy as np
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, log_loss
+from sklearn.preprocessing import StandardScaler
+
+from feature_store import DEFAULT_SPEC, FeatureStore, FEATURE_CACHE
+from indicator_engine import FEATURE_COLUMNS
+from walk_forward import build_model, walk_forward_windows
+
+SEARCH_CACHE = "search_cache"
+SEARCH_LOG = "search_results.jsonl"
+
+# Espaço padrão: tipo de modelo + hiperparâmetros, subconjuntos de features e horizonte do label
+DEFAULT_SPACE = {
+    'models': {
+        'logistic': {'C': [0.01, 0.1, 1.0, 10.0]},
+        'random_forest': {'n_estimators': [50, 100], 'max_depth': [5, 10, None], 'min_samples_leaf': [1, 20]},
+    },
+    'features': {
+        'all': FEATURE_COLUMNS,
+        'momentum': ['rsi', 'macd', 'macd_signal', 'close', 'volume'],
+        'trend': ['sma_5', 'sma_10', 'sma_20', 'bb_upper', 'bb_middle', 'bb_lower', 'close'],
+    },
+    'horizons': [1],
+}
+
+
+def candidate_id(candidate):
+    return hashlib.sha256(json.dumps(candidate, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def grid_candidates(space=DEFAULT_SPACE):
+    """Todas as combinações do espaço de busca"""
+    candidates = []
+    for model_name, grid in space['models'].items():
+        names = sorted(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            for subset in space['features']:
+                for horizon in space['horizons']:
+                    candidates.append({'model': model_name, 'params': dict(zip(names, values)),
+                                       'features': subset, 'horizon': horizon})
+    return candidates
+
+
+def random_candidates(space=DEFAULT_SPACE, n_candidates=20, seed=42):
+    """Amostra sem reposição de combinações do grid"""
+    candidates = grid_candidates(space)
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(candidates), size=min(n_candidates, len(candidates)), replace=False)
+    return [candidates[i] for i in sorted(chosen)]
+
+
+class FoldCache:
+    """Folds walk-forward já imputados e normalizados, gravados uma vez e lidos por memory-map"""
+
+    def __init__(self, cache_dir=SEARCH_CACHE, feature_cache=FEATURE_CACHE):
+        self.cache_dir = cache_dir
+        self.feature_cache = feature_cache
+
+    def prepare(self, data_path, horizon, windows_config):
+        """Materializa os folds do horizonte pedido e retorna a lista de diretórios"""
+        spec = dict(DEFAULT_SPEC, horizon=horizon)
+        feature_set = FeatureStore(self.feature_cache, spec).get(data_path)
+        windows = walk_forward_windows(len(feature_set), gap=horizon, **windows_config)
+        complete = feature_set.complete_rows()
+
+        fold_dirs = []
+        for window in windows:
+            train_start, train_end, test_start, test_end = window
+            fold_dir = os.path.join(self.cache_dir, feature_set.meta['key'], f"{train_start}_{train_end}_{test_start}_{test_end}")
+            fold_dirs.append(fold_dir)
+            if os.path.exists(os.path.join(fold_dir, 'y_test.npy')):
+                continue
+
+            train = np.arange(train_start, train_end)[complete[train_start:train_end]]
+            test = np.arange(test_start, test_end)[complete[test_start:test_end]]
+            X_train, y_train = feature_set.take(train, drop_incomplete=False)
+            X_test, y_test = feature_set.take(test, drop_incomplete=False)
+
+            # Imputação e normalização ajustadas só no treino; coluna a coluna, então qualquer
+            # subconjunto de features pode ser recortado da matriz já normalizada
+            imputer = SimpleImputer(strategy='median')
+            scaler = StandardScaler()
+            X_train = scaler.fit_transform(imputer.fit_transform(X_train)).astype(np.float32)
+            X_test = scaler.transform(imputer.transform(X_test)).astype(np.float32)
+
+            tmp_dir = fold_dir + '.tmp'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for name, array in (('X_train', X_train), ('y_train', y_train), ('X_test', X_test), ('y_test', y_test)):
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+            # Um fold incompleto de uma execução interrompida impediria o rename
+            shutil.rmtree(fold_dir, ignore_errors=True)
+            os.replace(tmp_dir, fold_dir)
+        print(f"Horizonte {horizon}: {len(fold_dirs)} folds em cache")
+        return fold_dirs, feature_set.columns
+
+
+def run_trial(args):
+    """Treina e avalia um candidato em um fold (executado nos workers)"""
+    candidate, fold_dir, columns, feature_subsets = args
+    data = {name: np.load(os.path.join(fold_dir, f"{name}.npy"), mmap_mode='r')
+            for name in ('X_train', 'y_train', 'X_test', 'y_test')}
+    selected = [columns.index(c) for c in feature_subsets[candidate['features']]]
+    X_train, y_train = np.asarray(data['X_train'][:, selected]), np.asarray(data['y_train'])
+    X_test, y_test = np.asarray(data['X_test'][:, selected]), np.asarray(data['y_test'])
+
+    start = time.time()
+    if len(np.unique(y_train)) < 2 or len(y_test) == 0:
+        accuracy, loss = float('nan'), float('nan')
+    else:
+        # Os folds em cache já foram normalizados: sem um segundo StandardScaler
+        model = build_model(candidate['model'], candidate['params'], scale=False)
+        model.fit(X_train, y_train)
+        probability = model.predict_proba(X_test)[:, 1]
+        accuracy = accuracy_score(y_test, (probability > 0.5).astype(np.int64))
+        loss = log_loss(y_test, probability, labels=[0, 1])
+    return {
+        'candidate_id': candidate_id(candidate),
+        'candidate': candidate,
+        'fold': fold_dir,
+        'accuracy': float(accuracy),
+        'log_loss': float(loss),
+        'seconds': time.time() - start,
+    }
+
+
+class HyperparameterSearch:
+    """Busca de hiperparâmetros (grid, random ou successive halving) em paralelo e retomável"""
+
+    def __init__(self, space=None, strategy='grid', n_candidates=20, eta=3, min_folds=1,
+                 train_size=200000, test_size=20000, step=None, max_folds=None,
+                 max_workers=None, log_file=SEARCH_LOG, cache_dir=SEARCH_CACHE,
+                 feature_cache=FEATURE_CACHE, seed=42):
+        self.space = space or DEFAULT_SPACE
+        self.strategy = strategy
+        self.n_candidates = n_candidates
+        self.eta = eta
+        self.min_folds = min_folds
+        self.windows_config = {'train_size': train_size, 'test_size': test_size, 'step': step}
+        self.max_folds = max_folds
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.log_file = log_file
+        self.folds = FoldCache(cache_dir, feature_cache)
+        self.seed = seed
+
+    def _load_log(self):
+        """Resultados já gravados: (candidate_id, fold) -> resultado"""
+        done = {}
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r') as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # linha truncada por uma interrupção
+                    done[(result['candidate_id'], result['fold'])] = result
+        return done
+
+    def _run_trials(self, trials, done):
+        """Executa os pares (candidato, fold) ainda não registrados, gravando cada resultado no log"""
+        pending = [t for t in trials if (candidate_id(t[0]), t[1]) not in done]
+        print(f"Trials: {len(trials)} ({len(trials) - len(pending)} já no log)")
+        if not pending:
+            return
+        with open(self.log_file, 'a+b') as log:
+            # Uma interrupção pode ter deixado a última linha pela metade
+            if log.tell() > 0:
+                log.seek(-1, os.SEEK_END)
+                if log.read(1) != b'\n':
+                    log.write(b'\n')
+            if self.max_workers == 1:
+                for trial in pending:
+                    self._record(run_trial(trial), log, done)
+            else:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [executor.submit(run_trial, trial) for trial in pending]
+                    # Gravar na ordem de conclusão para perder o mínimo em uma interrupção
+                    for future in as_completed(futures):
+                        self._record(future.result(), log, done)
+
+    def _record(self, result, log, done):
+        log.write((json.dumps(result) + '\n').encode('utf-8'))
+        log.flush()
+        done[(result['candidate_id'], result['fold'])] = result
+
+    def _score(self, candidates, folds_by_horizon, n_folds, done):
+        """(acurácia média, folds avaliados) de cada candidato nos primeiros n_folds do seu horizonte"""
+        scores = []
+        for candidate in candidates:
+            folds = folds_by_horizon[candidate['horizon']][0][:n_folds]
+            values = [done[(candidate_id(candidate), fold)]['accuracy'] for fold in folds
+                      if (candidate_id(candidate), fold) in done]
+            values = [v for v in values if not np.isnan(v)]
+            scores.append((float(np.mean(values)) if values else float('nan'), len(values)))
+        return scores
+
+    def run(self, data_path):
+        """Executa a busca e retorna os candidatos ordenados pela acurácia média"""
+        if self.strategy == 'random':
+            candidates = random_candidates(self.space, self.n_candidates, self.seed)
+        else:
+            candidates = grid_candidates(self.space)
+
+        # Pré-processamento uma vez por (horizonte, fold), compartilhado por todos os candidatos
+        folds_by_horizon = {}
+        for horizon in sorted({c['horizon'] for c in candidates}):
+            fold_dirs, columns = self.folds.prepare(data_path, horizon, self.windows_config)
+            # Folds mais recentes primeiro: são os mais relevantes e os usados nas rodadas curtas
+            fold_dirs = fold_dirs[::-1][:self.max_folds]
+            folds_by_horizon[horizon] = (fold_dirs, columns)
+        n_folds = min(len(folds) for folds, _ in folds_by_horizon.values())
+        if n_folds == 0:
+            print("Dados insuficientes para um fold de treino/teste")
+            return []
+
+        done = self._load_log()
+        feature_subsets = self.space['features']
+        if self.strategy == 'halving':
+            # Successive halving: todos os candidatos em poucos folds, os melhores em cada vez mais folds
+            survivors = candidates
+            budget = self.min_folds
+            while True:
+                budget = min(budget, n_folds)
+                trials = [(c, fold, folds_by_horizon[c['horizon']][1], feature_subsets)
+                          for c in survivors for fold in folds_by_horizon[c['horizon']][0][:budget]]
+                self._run_trials(trials, done)
+                if budget >= n_folds or len(survivors) <= 1:
+                    break
+                scores = np.nan_to_num([s for s, _ in self._score(survivors, folds_by_horizon, budget, done)], nan=-1.0)
+                keep = max(1, len(survivors) // self.eta)
+                survivors = [survivors[i] for i in np.argsort(-scores, kind='stable')[:keep]]
+                budget *= self.eta
+                print(f"Rodada seguinte: {len(survivors)} candidatos com {min(budget, n_folds)} folds")
+        else:
+            trials = [(c, fold, folds_by_horizon[c['horizon']][1], feature_subsets)
+                      for c in candidates for fold in folds_by_horizon[c['horizon']][0][:n_folds]]
+            self._run_trials(trials, done)
+
+        # Candidatos avaliados em mais folds (sobreviventes do halving) vêm primeiro
+        scores = self._score(candidates, folds_by_horizon, n_folds, done)
+        leaderboard = [dict(candidate, candidate_id=candidate_id(candidate), accuracy=score, folds=count)
+                       for candidate, (score, count) in zip(candidates, scores)]
+        leaderboard.sort(key=lambda row: (-row['folds'], -np.nan_to_num(row['accuracy'], nan=-1.0)))
+        if leaderboard:
+            best = leaderboard[0]
+            print(f"Melhor: {best['model']} {best['params']} features={best['features']} "
+                  f"horizonte={best['horizon']} acurácia={best['accuracy']:.4f}")
+        return leaderboard
+
+
+def main():
+    import sys
+    from columnar_store import default_processed_path
+
+    print("=== Busca de Hiperparâmetros ===\n")
+    data_path = default_processed_path()
+    if not os.path.exists(data_path):
+        print(f"❌ Erro: Dados processados '{data_path}' não encontrados")
+        return None
+    strategy = 'halving' if '--halving' in sys.argv else 'random' if '--random' in sys.argv else 'grid'
+    leaderboard = HyperparameterSearch(strategy=strategy).run(data_path)
+    with open('search_leaderboard.json', 'w') as f:
+        json.dump(leaderboard, f, indent=2)
+    print("Ranking salvo em search_leaderboard.json")
+    return leaderboard
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import pandas as pd
+import numpy as np
+import math
+from collections import deque
+
+INDICATOR_COLUMNS = [
+    'sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
+    'bb_middle', 'bb_upper', 'bb_lower', 'volume_sma'
+]
+FEATURE_COLUMNS = [
+    'sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
+    'bb_upper', 'bb_middle', 'bb_lower', 'volume_sma', 'close', 'volume'
+]
+
+
+class RollingWindow:
+    """Janela móvel de tamanho fixo com soma, média e variância atualizadas em O(1)"""
+
+    def __init__(self, size, resync_every=4096):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nonzero = 0
+        self.resync_every = resync_every
+        self._updates = 0
+
+    def push(self, value):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.values.append(value)
+            old_mean = self.mean
+            self.total += value - old
+            self.mean = old_mean + (value - old) / self.size
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+            self.nonzero += (value != 0) - (old != 0)
+        else:
+            # Welford durante o preenchimento da janela
+            self.values.append(value)
+            n = len(self.values)
+            delta = value - self.mean
+            self.total += value
+            self.mean += delta / n
+            self.m2 += delta * (value - self.mean)
+            self.nonzero += value != 0
+
+        # Recalcular periodicamente para limitar o acúmulo de erro de arredondamento
+        self._updates += 1
+        if self._updates % self.resync_every == 0:
+            self._resync()
+
+    def _resync(self):
+        values = np.fromiter(self.values, dtype=np.float64)
+        self.total = math.fsum(values)
+        self.mean = self.total / len(values)
+        self.m2 = float(np.sum((values - self.mean) ** 2))
+        self.nonzero = int(np.count_nonzero(values))
+
+    @property
+    def full(self):
+        return len(self.values) == self.size
+
+    def average(self):
+        """Média da janela (NaN até a janela estar cheia, como rolling(size).mean())"""
+        if not self.full:
+            return math.nan
+        # Janela só de zeros: média exatamente zero, sem resíduo de arredondamento
+        if self.nonzero == 0:
+            return 0.0
+        return self.mean
+
+    def std(self):
+        """Desvio padrão amostral (ddof=1), como rolling(size).std()"""
+        if not self.full or self.size < 2:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.size - 1))
+
+
+class ExponentialMean:
+    """Equivalente incremental de ewm(span).mean() com adjust=True"""
+
+    def __init__(self, span, numerator=0.0, weight=0.0):
+        self.span = span
+        self.decay = 1 - 2 / (span + 1)
+        self.numerator = numerator
+        self.weight = weight
+
+    def push(self, value):
+        self.numerator = self.decay * self.numerator + value
+        self.weight = self.decay * self.weight + 1.0
+        return self.numerator / self.weight
+
+    def push_many(self, values):
+        """Versão vetorizada de push para um bloco inteiro (usada pelo processamento em blocos)"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values.copy()
+        chunk_mean = pd.Series(values).ewm(span=self.span).mean().to_numpy()
+        powers = self.decay ** np.arange(1, len(values) + 1)
+        chunk_weight = (1 - powers) / (1 - self.decay)
+        if self.weight == 0:
+            numerator, weight, result = chunk_mean * chunk_weight, chunk_weight, chunk_mean
+        else:
+            # Estado anterior decai pelas potências; o bloco entra com a própria média ponderada
+            numerator = powers * self.numerator + chunk_mean * chunk_weight
+            weight = powers * self.weight + chunk_weight
+            result = numerator / weight
+        self.numerator, self.weight = numerator[-1], weight[-1]
+        return result
+
+    @property
+    def value(self):
+        return self.numerator / self.weight if self.weight > 0 else math.nan
+
+
+class IncrementalIndicators:
+    """Calcula os indicadores de DataProcessor.add_technical_indicators em O(1) por vela"""
+
+    def __init__(self):
+        self.sma_5 = RollingWindow(5)
+        self.sma_10 = RollingWindow(10)
+        self.close_20 = RollingWindow(20)
+        self.volume_20 = RollingWindow(20)
+        self.gains = RollingWindow(14)
+        self.losses = RollingWindow(14)
+        self.exp1 = ExponentialMean(12)
+        self.exp2 = ExponentialMean(26)
+        self.signal = ExponentialMean(9)
+        self.last_close = None
+        self.last_bar = None
+        self.current = dict.fromkeys(INDICATOR_COLUMNS, math.nan)
+        self.bars = 0
+
+    def update(self, bar):
+        """Incorpora uma nova vela (dict/Series com close e volume) e retorna os indicadores"""
+        close = float(bar['close'])
+        volume = float(bar['volume'])
+
+        self.sma_5.push(close)
+        self.sma_10.push(close)
+        self.close_20.push(close)
+        self.volume_20.push(volume)
+
+        # RSI: a primeira variação (NaN no pandas) conta como ganho/perda zero
+        delta = 0.0 if self.last_close is None else close - self.last_close
+        self.gains.push(delta if delta > 0 else 0.0)
+        self.losses.push(-delta if delta < 0 else 0.0)
+        gain = self.gains.average()
+        loss = self.losses.average()
+        if math.isnan(gain) or math.isnan(loss):
+            rsi = math.nan
+        elif loss == 0:
+            rsi = math.nan if gain == 0 else 100.0
+        else:
+            rsi = 100 - (100 / (1 + gain / loss))
+
+        # MACD
+        macd = self.exp1.push(close) - self.exp2.push(close)
+        macd_signal = self.signal.push(macd)
+
+        # Bollinger Bands
+        bb_middle = self.close_20.average()
+        bb_std = self.close_20.std()
+
+        self.current = {
+            'sma_5': self.sma_5.average(),
+            'sma_10': self.sma_10.average(),
+            'sma_20': bb_middle,
+            'rsi': rsi,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'bb_middle': bb_middle,
+            'bb_upper': bb_middle + (bb_std * 2),
+            'bb_lower': bb_middle - (bb_std * 2),
+            'volume_sma': self.volume_20.average()
+        }
+        self.last_close = close
+        self.last_bar = bar
+        self.bars += 1
+        return self.current
+
+    def warm_up(self, df):
+        """Aquece o estado com um histórico (as EWMs convergem após algumas centenas de velas)"""
+        self.update_many(df)
+        return self
+
+    def update_many(self, df):
+        """Atualiza com várias velas e retorna um DataFrame com os indicadores de cada uma"""
+        rows = []
+        for close, volume in zip(df['close'].to_numpy(dtype=np.float64),
+                                 df['volume'].to_numpy(dtype=np.float64)):
+            rows.append(self.update({'close': close, 'volume': volume}))
+        if len(df) > 0:
+            self.last_bar = df.iloc[-1].to_dict()
+        return pd.DataFrame(rows, columns=INDICATOR_COLUMNS, index=df.index)
+
+    def features(self, bar=None):
+        """Monta o dict de features usado pelos modelos a partir da última vela"""
+        bar = bar if bar is not None else self.last_bar
+        if bar is None:
+            raise ValueError("Nenhuma vela processada ainda")
+        features = dict(self.current)
+        features['close'] = float(bar['close'])
+        features['volume'] = float(bar['volume'])
+        if 'timestamp' in bar:
+            features['timestamp'] = bar['timestamp']
+        return features
+
+    def feature_vector(self, bar=None):
+        """Vetor de features na ordem FEATURE_COLUMNS"""
+        features = self.features(bar)
+        return np.array([features[column] for column in FEATURE_COLUMNS], dtype=np.float64)
@@ -1,12 +1,82 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler
 import joblib
 import json
+import os
+import sys
+from columnar_store import default_processed_path
+from indicator_engine import FEATURE_COLUMNS
+from feature_store import FeatureStore, FEATURE_CACHE, iter_feature_chunks, iter_source_chunks
+from model_registry import ModelRegistry
+from trading_predictor import TradingPredictor
+
+# Índice 0 = classe BAIXA, 1 = classe ALTA
+DIRECTIONS = np.array(['BAIXA', 'ALTA'])
+# Checkpoint do treino incremental, separado do modelo usado pela API e pelo treino por amostra
+INCREMENTAL_CHECKPOINT = "lightweight_trading_model.ckpt.pkl"
+
+
+def training_range(start_ns, end_ns):
+    """Intervalo dos dados de treino para os metadados do modelo"""
+    return {'start': pd.Timestamp(int(start_ns)).isoformat(), 'end': pd.Timestamp(int(end_ns)).isoformat()}
+
+
+class ReservoirSampler:
+    """Reservoir sampling (algoritmo R) vetorizado por chunk: amostra uniforme em uma passada"""
+    
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.features = None
+        self.labels = None
+        self.positions = None
+        self.filled = 0
+    
+    def add(self, features, labels):
+        n = len(features)
+        if n == 0:
+            return
+        if self.features is None:
+            self.features = np.empty((self.size, features.shape[1]))
+            self.labels = np.empty(self.size, dtype=np.int64)
+            self.positions = np.empty(self.size, dtype=np.int64)
+        positions = np.arange(self.seen, self.seen + n)
+        
+        # Preencher o reservatório enquanto houver espaço
+        take = min(self.size - self.filled, n)
+        if take > 0:
+            self.features[self.filled:self.filled + take] = features[:take]
+            self.labels[self.filled:self.filled + take] = labels[:take]
+            self.positions[self.filled:self.filled + take] = positions[:take]
+            self.filled += take
+        
+        # Demais itens: o item t substitui um slot aleatório com probabilidade size / (t + 1)
+        if take < n:
+            rest = np.arange(take, n)
+            slots = self.rng.integers(0, positions[rest] + 1)
+            keep = np.flatnonzero(slots < self.size)
+            # Em colisões vence o último item, como na versão sequencial: a ordem de escrita de
+            # índices repetidos em atribuição avançada não é garantida, então deduplicar antes
+            unique_slots, last = np.unique(slots[keep][::-1], return_index=True)
+            chosen = rest[keep[len(keep) - 1 - last]]
+            self.features[unique_slots] = features[chosen]
+            self.labels[unique_slots] = labels[chosen]
+            self.positions[unique_slots] = positions[chosen]
+        self.seen += n
+    
+    def result(self):
+        """Amostra ordenada pela posição original (ordem temporal)"""
+        if self.features is None:
+            return np.empty((0, len(FEATURE_COLUMNS))), np.empty(0, dtype=np.int64)
+        order = np.argsort(self.positions[:self.filled])
+        return self.features[:self.filled][order], self.labels[:self.filled][order]
+
 
 class LightweightTradingModel:
     def __init__(self):
@@ -14,100 +84,81 @@ class LightweightTradingModel:
         self.imputer = None
         self.scaler = None
         self.feature_columns = []
+        self.training_state = None
+        self.data_range = None  # primeiro/último timestamp dos dados de treino (ISO 8601)
         
-    def prepare_sample_data(self, csv_file, sample_size=50000):
-        """Prepara uma amostra dos dados para treinamento mais rápido"""
+    def prepare_sample_data(self, csv_file, sample_size=50000, random_state=42, cache_dir=FEATURE_CACHE):
+        """Prepara uma amostra uniforme de todo o histórico para treinamento mais rápido
+
+        A amostra vem do feature store compartilhado (store colunar ou CSV): a extração só roda
+        na primeira vez para esta origem e as linhas sorteadas são lidas via memory-map.
+        Com cache_dir=None, nada é gravado em disco: uma passada em chunks com reservoir sampling.
+        """
         print(f"Carregando dados de {csv_file}...")
+        rng = np.random.default_rng(random_state)
+        if cache_dir is None:
+            features, labels = self._reservoir_sample(csv_file, sample_size, rng)
+        else:
+            feature_set = FeatureStore(cache_dir).get(csv_file)
+            features, labels = feature_set.sample(sample_size, rng)
+            if len(feature_set):
+                self.data_range = training_range(feature_set.timestamps[0], feature_set.timestamps[-1])
         
-        # Carregar apenas as colunas necessárias
-        columns_needed = ['timestamp', 'close', 'sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal', 'bb_upper', 'bb_middle', 'bb_lower', 'volume_sma', 'volume']
-        
-        # Ler o arquivo em chunks para economizar memória
-        chunk_size = 100000
-        chunks = []
-        
-        for chunk in pd.read_csv(csv_file, chunksize=chunk_size, usecols=columns_needed):
-            chunks.append(chunk)
-            if len(chunks) * chunk_size >= sample_size * 2:  # Pegar mais dados para ter margem
-                break
-        
-        df = pd.concat(chunks, ignore_index=True)
-        
-        # Pegar uma amostra aleatória
-        if len(df) > sample_size:
-            df = df.sample(n=sample_size, random_state=42).sort_values('timestamp')
-        
-        print(f"Dados carregados: {len(df)} registros")
+        print(f"Dados carregados: {len(features)} registros")
         
-        features = []
-        labels = []
+        self.feature_columns = list(FEATURE_COLUMNS)
         
-        for i in range(1, len(df) - 1):
-            current_row = df.iloc[i]
-            next_row = df.iloc[i + 1]
-            
-            # Verificar se há dados válidos para close
-            if pd.isna(current_row['close']) or pd.isna(next_row['close']):
-                continue
-            
-            # Features: indicadores técnicos atuais
-            feature_row = [
-                current_row['sma_5'],
-                current_row['sma_10'],
-                current_row['sma_20'],
-                current_row['rsi'],
-                current_row['macd'],
-                current_row['macd_signal'],
-                current_row['bb_upper'],
-                current_row['bb_middle'],
-                current_row['bb_lower'],
-                current_row['volume_sma'],
-                current_row['close'],
-                current_row['volume']
-            ]
-            
-            # Label: 1 se próximo close > close atual, 0 caso contrário
-            label = 1 if next_row['close'] > current_row['close'] else 0
-            
-            features.append(feature_row)
-            labels.append(label)
-        
-        self.feature_columns = [
-            'sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
-            'bb_upper', 'bb_middle', 'bb_lower', 'volume_sma', 'close', 'volume'
-        ]
-        
-        return np.array(features), np.array(labels)
+        return features, labels
     
-    def train_model(self, features, labels, test_size=0.2):
-        """Treina um modelo logístico (mais rápido que Random Forest)"""
+    def _reservoir_sample(self, source, sample_size, rng, chunk_size=100000):
+        """Amostra uniforme das linhas completas em uma passada, com memória fixa"""
+        reservoir = ReservoirSampler(sample_size, rng)
+        first = last = None
+        chunks = iter_source_chunks(source, FEATURE_COLUMNS, chunk_size)
+        for features, labels, timestamps in iter_feature_chunks(chunks, with_timestamps=True):
+            if len(timestamps):
+                first = timestamps[0] if first is None else first
+                last = timestamps[-1]
+            # Mesma política do feature store: linhas com indicadores incompletos ficam fora
+            complete = ~np.isnan(features).any(axis=1)
+            reservoir.add(features[complete], labels[complete])
+        if first is not None:
+            self.data_range = training_range(first, last)
+        return reservoir.result()
+    
+    def train_model(self, features, labels, test_size=0.2, model_params=None):
+        """Treina um modelo logístico (mais rápido que Random Forest)
+
+        model_params: hiperparâmetros da LogisticRegression (ex.: o melhor da busca)
+        """
         print(f"Preparando dados para treinamento...")
         print(f"Features shape: {features.shape}")
         print(f"Labels shape: {labels.shape}")
         print(f"Distribuição - BAIXA: {np.sum(labels == 0)}, ALTA: {np.sum(labels == 1)}")
         
-        # Tratar valores NaN com imputer
+        # Divisão cronológica: embaralhar a série temporal vazaria o futuro para o treino
+        X_train, X_test, y_train, y_test = train_test_split(
+            features, labels, test_size=test_size, shuffle=False
+        )
+        
+        # A amostra do feature store já exclui linhas com NaN; o imputer cobre a inferência
+        # ao vivo, quando os indicadores ainda estão aquecendo
         print("Tratando valores ausentes...")
         self.imputer = SimpleImputer(strategy='median')
-        features_imputed = self.imputer.fit_transform(features)
+        X_train = self.imputer.fit_transform(X_train)
+        X_test = self.imputer.transform(X_test)
         
-        # Normalizar features
+        # Normalizar features (estatísticas só do período de treino)
         print("Normalizando features...")
         self.scaler = StandardScaler()
-        features_scaled = self.scaler.fit_transform(features_imputed)
-        
-        # Dividir dados
-        X_train, X_test, y_train, y_test = train_test_split(
-            features_scaled, labels, test_size=test_size, random_state=42, stratify=labels
-        )
+        X_train = self.scaler.fit_transform(X_train)
+        X_test = self.scaler.transform(X_test)
         
         # Treinar modelo logístico
         print("Treinando modelo de Regressão Logística...")
-        self.model = LogisticRegression(
-            random_state=42,
-            max_iter=1000,
-            solver='liblinear'
-        )
+        params = {'max_iter': 1000, 'solver': 'liblinear'}
+        params.update(model_params or {})
+        self.model = LogisticRegression(random_state=42, **params)
         
         self.model.fit(X_train, y_train)
         
@@ -121,29 +172,110 @@ class LightweightTradingModel:
         
         return accuracy
     
+    def train_incremental(self, data_path, checkpoint_file=INCREMENTAL_CHECKPOINT,
+                          chunk_size=100000, cache_dir=FEATURE_CACHE, resume=True):
+        """Treina fora da memória sobre todo o histórico (scaler e modelo via partial_fit)
+
+        Com resume=True continua do checkpoint, processando apenas as velas posteriores
+        às já vistas (atualização diária). O scaler é ajustado uma única vez, no primeiro
+        treino, e depois fica congelado: os pesos do modelo foram aprendidos nessa escala.
+        Um arquivo sem estado incremental (modelo treinado por amostra) não é sobrescrito.
+        """
+        feature_set = FeatureStore(cache_dir).get(data_path)
+        if resume and os.path.exists(checkpoint_file):
+            self.load_model(checkpoint_file)
+            if self.training_state is None or not isinstance(self.model, SGDClassifier):
+                raise ValueError(f"{checkpoint_file} não é um checkpoint do treino incremental; "
+                                 f"use outro arquivo ou resume=False para recomeçar")
+        if self.training_state is None:
+            self.model = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+            self.scaler = StandardScaler()
+            self.imputer = None
+            self.training_state = {'scaled_until': None, 'trained_from': None, 'trained_until': None, 'rows_trained': 0,
+                                   'progressive_correct': 0, 'progressive_total': 0}
+        self.feature_columns = feature_set.columns
+        state = self.training_state
+        
+        # Imputer para a inferência ao vivo, ajustado uma vez em uma amostra de tamanho fixo
+        if self.imputer is None:
+            self.imputer = SimpleImputer(strategy='median')
+            self.imputer.fit(feature_set.sample(50000)[0])
+        
+        # 1ª passada (só no primeiro treino): estatísticas de normalização incrementais
+        if state['rows_trained'] == 0:
+            for positions in self._pending_chunks(feature_set, state['scaled_until'], chunk_size):
+                features, _ = feature_set.take(positions, drop_incomplete=False)
+                self.scaler.partial_fit(features)
+                state['scaled_until'] = int(feature_set.timestamps[positions[-1]])
+        else:
+            print(f"Scaler congelado (ajustado até {pd.Timestamp(state['scaled_until'])})")
+        
+        # 2ª passada: avalia cada chunk antes de treiná-lo (validação progressiva) e treina
+        for positions in self._pending_chunks(feature_set, state['trained_until'], chunk_size):
+            features, labels = feature_set.take(positions, drop_incomplete=False)
+            features = self.scaler.transform(features)
+            if state['rows_trained'] > 0:
+                state['progressive_correct'] += int(np.sum(self.model.predict(features) == labels))
+                state['progressive_total'] += len(labels)
+            self.model.partial_fit(features, labels, classes=np.array([0, 1]))
+            if state.get('trained_from') is None:
+                # Checkpoints antigos não têm o início: o treino começou na primeira vela do conjunto
+                state['trained_from'] = int(feature_set.timestamps[0] if state['rows_trained'] else feature_set.timestamps[positions[0]])
+            state['trained_until'] = int(feature_set.timestamps[positions[-1]])
+            self.data_range = training_range(state['trained_from'], state['trained_until'])
+            state['rows_trained'] += len(labels)
+            self.save_model(checkpoint_file, verbose=False)
+            print(f"Treinadas {state['rows_trained']} linhas (até {pd.Timestamp(state['trained_until'])})")
+        
+        self.save_model(checkpoint_file)
+        accuracy = state['progressive_correct'] / state['progressive_total'] if state['progressive_total'] else None
+        if accuracy is not None:
+            print(f"Acurácia progressiva (testar antes de treinar): {accuracy:.4f}")
+        return accuracy
+    
+    @staticmethod
+    def _pending_chunks(feature_set, after_timestamp, chunk_size):
+        """Posições completas posteriores a `after_timestamp`, em chunks de tamanho fixo
+
+        Só as linhas novas são lidas: a busca binária nos timestamps pula o que já foi visto.
+        """
+        start = 0 if after_timestamp is None else int(np.searchsorted(feature_set.timestamps, after_timestamp, side='right'))
+        for chunk_start in range(start, len(feature_set), chunk_size):
+            features = feature_set.features[chunk_start:chunk_start + chunk_size]
+            positions = chunk_start + np.flatnonzero(~np.isnan(features).any(axis=1))
+            if len(positions):
+                yield positions
+    
     def predict(self, features):
         """Faz predição para novas features"""
+        directions, confidences = self.predict_batch(features)
+        return directions[0], confidences[0]
+    
+    def predict_proba_batch(self, features, batch_size=100000):
+        """Probabilidade de ALTA para cada linha, em blocos (imputer + scaler + modelo por bloco)"""
         if self.model is None:
             raise ValueError("Modelo não foi treinado ainda")
         
         # Garantir que features é um array 2D
-        if len(features.shape) == 1:
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
             features = features.reshape(1, -1)
         
-        # Aplicar imputer e scaler
-        features_imputed = self.imputer.transform(features)
-        features_scaled = self.scaler.transform(features_imputed)
-        
-        prediction = self.model.predict(features_scaled)[0]
-        probability = self.model.predict_proba(features_scaled)[0]
-        
-        direction = "ALTA" if prediction == 1 else "BAIXA"
-        confidence = max(probability)
-        
-        return direction, confidence
+        up_column = list(self.model.classes_).index(1)
+        probabilities = np.empty(len(features))
+        for start in range(0, len(features), batch_size):
+            block = self.scaler.transform(self.imputer.transform(features[start:start + batch_size]))
+            probabilities[start:start + batch_size] = self.model.predict_proba(block)[:, up_column]
+        return probabilities
+    
+    def predict_batch(self, features, batch_size=100000):
+        """Direções ('ALTA'/'BAIXA') e confianças de todas as linhas em uma passada"""
+        up = self.predict_proba_batch(features, batch_size)
+        # Empate em 0.5 vai para BAIXA, como o argmax do predict do sklearn
+        return DIRECTIONS[(up > 0.5).astype(np.int64)], np.maximum(up, 1 - up)
     
-    def save_model(self, filename="lightweight_trading_model.pkl"):
-        """Salva o modelo treinado"""
+    def save_model(self, filename="lightweight_trading_model.pkl", verbose=True):
+        """Salva o modelo treinado (com o estado do treino incremental, se houver)"""
         if self.model is None:
             raise ValueError("Modelo não foi treinado ainda")
         
@@ -151,11 +283,16 @@ class LightweightTradingModel:
             'model': self.model,
             'imputer': self.imputer,
             'scaler': self.scaler,
-            'feature_columns': self.feature_columns
+            'feature_columns': self.feature_columns,
+            'training_state': self.training_state,
+            'data_range': self.data_range
         }
         
-        joblib.dump(model_data, filename)
-        print(f"Modelo salvo em {filename}")
+        # Gravar em arquivo temporário e substituir, para o checkpoint nunca ficar corrompido
+        joblib.dump(model_data, filename + '.tmp')
+        os.replace(filename + '.tmp', filename)
+        if verbose:
+            print(f"Modelo salvo em {filename}")
     
     def load_model(self, filename="lightweight_trading_model.pkl"):
         """Carrega um modelo salvo"""
@@ -164,60 +301,44 @@ class LightweightTradingModel:
         self.imputer = model_data['imputer']
         self.scaler = model_data['scaler']
         self.feature_columns = model_data['feature_columns']
+        self.training_state = model_data.get('training_state')
+        self.data_range = model_data.get('data_range')
         print(f"Modelo carregado de {filename}")
 
-class TradingPredictor:
-    """Classe para fazer predições em tempo real"""
-    
-    def __init__(self, model_file="lightweight_trading_model.pkl"):
-        self.model = LightweightTradingModel()
-        self.model.load_model(model_file)
-    
-    def predict_next_candle(self, current_data):
-        """
-        Prediz a direção da próxima vela
-        current_data deve ser um dict com as chaves:
-        ['sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
-         'bb_upper', 'bb_middle', 'bb_lower', 'volume_sma', 'close', 'volume']
-        """
-        features = np.array([
-            current_data.get('sma_5', np.nan),
-            current_data.get('sma_10', np.nan),
-            current_data.get('sma_20', np.nan),
-            current_data.get('rsi', np.nan),
-            current_data.get('macd', np.nan),
-            current_data.get('macd_signal', np.nan),
-            current_data.get('bb_upper', np.nan),
-            current_data.get('bb_middle', np.nan),
-            current_data.get('bb_lower', np.nan),
-            current_data.get('volume_sma', np.nan),
-            current_data['close'],
-            current_data['volume']
-        ])
-        
-        direction, confidence = self.model.predict(features)
-        
-        return {
-            'direction': direction,
-            'confidence': confidence,
-            'timestamp': current_data.get('timestamp', 'N/A')
-        }
-
 def main():
     print("=== Treinamento de Modelo Leve de Trading ===\n")
     
     model = LightweightTradingModel()
     
-    # Treinar com uma amostra menor dos dados
-    if pd.io.common.file_exists('processed_btc_data.csv'):
-        features, labels = model.prepare_sample_data('processed_btc_data.csv', sample_size=10000)
+    # Treinar com uma amostra menor dos dados (ou com todo o histórico em --incremental)
+    data_path = default_processed_path()
+    if os.path.exists(data_path):
+        if "--incremental" in sys.argv:
+            # Todo o histórico com memória fixa; reexecuções treinam apenas as velas novas.
+            # O checkpoint fica em arquivo próprio; o modelo da API é gravado à parte
+            accuracy = model.train_incremental(data_path)
+            trained = model.training_state['rows_trained'] > 0
+            if trained:
+                model.save_model()
+        else:
+            # --no-feature-cache: amostrar em uma passada, sem materializar o feature store em disco
+            cache_dir = None if "--no-feature-cache" in sys.argv else FEATURE_CACHE
+            features, labels = model.prepare_sample_data(data_path, sample_size=10000, cache_dir=cache_dir)
+            trained = len(features) > 0
+            if trained:
+                accuracy = model.train_model(features, labels)
+                model.save_model()
         
-        if len(features) > 0:
-            accuracy = model.train_model(features, labels)
-            model.save_model()
+        if trained:
+            # Publicar no registro: a API troca para a nova versão sem reiniciar
+            ModelRegistry().publish("lightweight_trading_model.pkl", {
+                'data_path': data_path,
+                'metrics': {'accuracy': accuracy}
+            })
             
             print(f"\n✅ Modelo treinado com sucesso!")
-            print(f"📊 Acurácia: {accuracy:.4f}")
+            if accuracy is not None:
+                print(f"📊 Acurácia: {accuracy:.4f}")
             print(f"💾 Modelo salvo como 'lightweight_trading_model.pkl'")
             
             # Teste de predição
@@ -245,7 +366,7 @@ def main():
         else:
             print("❌ Erro: Não foi possível preparar os dados para treinamento")
     else:
-        print("❌ Erro: Arquivo 'processed_btc_data.csv' não encontrado")
+        print(f"❌ Erro: Dados processados '{data_path}' não encontrados")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+from compiled_model import CompiledModel
+
+MODEL_REGISTRY = "model_registry"
+
+
+class ModelRegistry:
+    """Registro de versões de modelos compilados com metadados e ponteiro CURRENT atômico"""
+
+    def __init__(self, root=MODEL_REGISTRY):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+        self.current_file = os.path.join(root, 'CURRENT')
+
+    def list_versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(name for name in os.listdir(self.versions_dir) if not name.endswith('.tmp'))
+
+    def current_version(self):
+        """Versão publicada atualmente (None se o registro estiver vazio)"""
+        try:
+            with open(self.current_file, 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, version=None):
+        version = version or self.current_version()
+        if version is None:
+            return None
+        with open(os.path.join(self.versions_dir, version, 'metadata.json'), 'r') as f:
+            return json.load(f)
+
+    def load(self, version=None, mmap=True):
+        """Carrega o modelo compilado de uma versão (por padrão a atual), com memory-map"""
+        version = version or self.current_version()
+        if version is None:
+            return None
+        return CompiledModel.load_directory(os.path.join(self.versions_dir, version), mmap=mmap)
+
+    def publish(self, model, metadata=None, activate=True):
+        """Grava uma nova versão (CompiledModel ou .pkl de um trainer) e, opcionalmente, a ativa"""
+        metadata = dict(metadata or {})
+        if isinstance(model, str):
+            metadata.setdefault('source_file', model)
+            for key, value in _training_metadata(model).items():
+                metadata.setdefault(key, value)
+            model = CompiledModel.from_model_file(model)
+        if metadata.get('data_range') is None:
+            print("Aviso: versão publicada sem o intervalo dos dados de treino (data_range)")
+        metadata.setdefault('data_range', None)
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        existing = self.list_versions()
+        version = f"v{int(existing[-1][1:]) + 1:04d}" if existing else "v0001"
+        metadata.update({
+            'version': version,
+            'kind': model.kind,
+            'feature_columns': model.feature_columns,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        })
+
+        # Montar a versão em um diretório temporário e publicá-la com um rename
+        tmp_dir = os.path.join(self.versions_dir, version + '.tmp')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        model.save_directory(tmp_dir)
+        with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        os.replace(tmp_dir, os.path.join(self.versions_dir, version))
+        print(f"Modelo publicado no registro: {version}")
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Aponta CURRENT para a versão (escrita atômica; também serve para rollback)"""
+        if version not in self.list_versions():
+            raise ValueError(f"Versão {version} não existe no registro")
+        tmp_file = self.current_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.current_file)
+
+
+def _training_metadata(model_file):
+    """Intervalo dos dados de treino e estado do treino incremental gravados no .pkl do trainer"""
+    import joblib
+
+    data = joblib.load(model_file)
+    state = data.get('training_state')
+    return {
+        'data_range': data.get('data_range'),
+        'training_state': None if state is None else {k: v for k, v in state.items()
+                                                      if k in ('trained_from', 'trained_until', 'rows_trained')},
+    }
+
+
+class LiveModel:
+    """Modelo servido a partir do registro, com troca a quente quando uma nova versão é publicada
+
+    A nova versão é carregada em segundo plano; até terminar, a anterior continua respondendo.
+    """
+
+    def __init__(self, registry=None, check_interval=5.0):
+        self.registry = registry or ModelRegistry()
+        self.check_interval = check_interval
+        self._current = (None, None, None)  # (modelo, versão, metadados)
+        self._last_check = 0.0
+        self._loading = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self._current[0]
+
+    @property
+    def version(self):
+        return self._current[1]
+
+    @property
+    def metadata(self):
+        return self._current[2]
+
+    def current(self):
+        """(modelo, versão, metadados) de uma mesma versão, carregada sob demanda como em get()
+
+        Ler model e version separadamente pode misturar duas versões durante uma troca a quente.
+        """
+        if self.model is None:
+            # Primeira chamada: carregar de forma síncrona
+            self._check(block=True)
+        elif time.monotonic() - self._last_check >= self.check_interval:
+            self._check(block=False)
+        return self._current
+
+    def get(self):
+        """Modelo atual (carregado sob demanda); None se não houver versão publicada"""
+        return self.current()[0]
+
+    def _check(self, block):
+        with self._lock:
+            self._last_check = time.monotonic()
+            version = self.registry.current_version()
+            if version is None or version == self.version or self._loading == version:
+                return
+            self._loading = version
+        if block:
+            self._load(version)
+        else:
+            threading.Thread(target=self._load, args=(version,), daemon=True).start()
+
+    def _load(self, version):
+        try:
+            model = self.registry.load(version)
+            metadata = self.registry.metadata(version)
+        except Exception as e:
+            print(f"Falha ao carregar a versão {version}: {e}; mantendo {self.version}")
+            with self._lock:
+                self._loading = None
+            return
+        with self._lock:
+            # Uma única atribuição: as requisições veem o modelo antigo ou o novo, nunca um estado parcial
+            self._current = (model, version, metadata)
+            self._loading = None
+        print(f"Modelo {version} em serviço")
+
+
+def main():
+    import sys
+
+    registry = ModelRegistry()
+    if len(sys.argv) > 2 and sys.argv[1] == 'publish':
+        registry.publish(sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == 'activate':
+        registry.activate(sys.argv[2])
+    for version in registry.list_versions():
+        marker = '*' if version == registry.current_version() else ' '
+        print(f"{marker} {version} {registry.metadata(version).get('created_at')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import asyncio
+import inspect
+import random
+import time
+
+from get_ohlcv_data import (
+    LocalExchange, SyncCheckpoint, append_page, iso8601, last_stored_timestamp,
+    parse8601, recover_data_file, timeframe_to_ms
+)
+
+# Erros transitórios do ccxt (comparados pelo nome para não exigir o ccxt instalado)
+RETRYABLE_ERRORS = {
+    'RateLimitExceeded', 'DDoSProtection', 'NetworkError', 'RequestTimeout',
+    'ExchangeNotAvailable', 'TimeoutError', 'ConnectionError'
+}
+
+
+class RateLimitExceeded(Exception):
+    """Erro de limite de requisições da SimulatedExchange (mesmo nome do ccxt)"""
+
+
+def is_retryable(error):
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """Limitador token bucket compartilhado entre as tarefas assíncronas"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Reserva um token e retorna quantos segundos esperar até poder usá-lo
+
+        O saldo pode ficar negativo: cada chamada reserva a próxima vaga livre, então várias
+        tarefas esperam ao mesmo tempo em vez de fazer fila atrás de uma que está dormindo.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        # reserve() não cede o controle ao event loop, então não precisa de lock
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SimulatedExchange(LocalExchange):
+    """Exchange local assíncrona com latência e erros de rate limit simulados"""
+
+    def __init__(self, candles, latency=0.05, max_requests_per_second=20, error_rate=0.0, seed=42):
+        super().__init__(candles)
+        self.latency = latency
+        self.max_requests_per_second = max_requests_per_second
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.request_times = []
+        self.rate_limit_errors = 0
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=500):
+        now = time.monotonic()
+        self.request_times = [t for t in self.request_times if now - t < 1.0]
+        self.request_times.append(now)
+        if len(self.request_times) > self.max_requests_per_second or self.random.random() < self.error_rate:
+            self.rate_limit_errors += 1
+            raise RateLimitExceeded('429 Too Many Requests')
+        await asyncio.sleep(self.latency * (0.5 + self.random.random()))
+        return LocalExchange.fetch_ohlcv(self, symbol, timeframe, since, limit)
+
+
+async def _call_fetch(exchange, symbol, timeframe, since, limit):
+    if inspect.iscoroutinefunction(exchange.fetch_ohlcv):
+        return await exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+    # Cliente síncrono (ccxt comum): executar em uma thread
+    return await asyncio.to_thread(exchange.fetch_ohlcv, symbol, timeframe, since, limit)
+
+
+async def _fetch_window(exchange, symbol, timeframe, start_ms, end_ms, limit,
+                        bucket, semaphore, max_retries, backoff):
+    """Busca todas as velas de [start_ms, end_ms), paginando dentro da janela"""
+    step = timeframe_to_ms(timeframe)
+    candles = []
+    since = start_ms
+    async with semaphore:
+        while since < end_ms:
+            for attempt in range(max_retries + 1):
+                await bucket.acquire()
+                try:
+                    page = await _call_fetch(exchange, symbol, timeframe, since, limit)
+                    break
+                except Exception as e:
+                    if not is_retryable(e) or attempt == max_retries:
+                        raise
+                    # Backoff exponencial com jitter
+                    await asyncio.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            page = [candle for candle in page if since <= candle[0] < end_ms]
+            if not page:
+                break
+            candles.extend(page)
+            since = page[-1][0] + step
+    return candles
+
+
+async def backfill_ohlcv(exchange, symbol='BTC/USDT', timeframe='1m', start_ms=None, end_ms=None,
+                         limit=1000, concurrency=8, requests_per_second=10,
+                         max_retries=5, backoff=0.5):
+    """Divide [start_ms, end_ms) em janelas e as busca concorrentemente, retornando velas ordenadas e únicas"""
+    step = timeframe_to_ms(timeframe)
+    window = step * limit
+    bounds = [(start, min(start + window, end_ms)) for start in range(start_ms, end_ms, window)]
+    print(f"Backfill de {symbol}: {iso8601(start_ms)} a {iso8601(end_ms)} em {len(bounds)} janelas")
+
+    bucket = TokenBucket(requests_per_second)
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.ensure_future(_fetch_window(exchange, symbol, timeframe, start, end, limit,
+                                                 bucket, semaphore, max_retries, backoff))
+             for start, end in bounds]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # Uma janela falhou (ou o backfill foi cancelado): cancelar as demais antes de propagar
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    # Mesclar na ordem das janelas e remover timestamps duplicados
+    merged = {}
+    for candles in results:
+        for candle in candles:
+            merged.setdefault(candle[0], candle)
+    return [merged[timestamp] for timestamp in sorted(merged)]
+
+
+async def backfill_to_csv(exchange, symbol='BTC/USDT', timeframe='1m', data_file='BTC_USDT_1m.csv',
+                          since='2024-07-16T00:00:00Z', now_ms=None, windows_per_batch=64, **kwargs):
+    """Backfill concorrente gravando em lotes ordenados no CSV, com o mesmo checkpoint de sync_ohlcv"""
+    step = timeframe_to_ms(timeframe)
+    limit = kwargs.get('limit', 1000)
+    checkpoint = SyncCheckpoint(data_file)
+    recover_data_file(data_file, checkpoint)
+
+    state = checkpoint.load()
+    last_timestamp = state['last_timestamp'] if state else last_stored_timestamp(data_file)
+    start_ms = last_timestamp + step if last_timestamp is not None else parse8601(since)
+    # Ignorar a vela ainda em formação
+    end_ms = (now_ms if now_ms is not None else int(time.time() * 1000)) - step + 1
+
+    total = 0
+    batch_span = step * limit * windows_per_batch
+    for batch_start in range(start_ms, end_ms, batch_span):
+        batch_end = min(batch_start + batch_span, end_ms)
+        candles = await backfill_ohlcv(exchange, symbol, timeframe, batch_start, batch_end, **kwargs)
+        if candles:
+            size = append_page(data_file, candles)
+            checkpoint.save(candles[-1][0], size)
+            total += len(candles)
+
+    print(f'Backfill concluído: {total} novas velas gravadas em {data_file}')
+    return total
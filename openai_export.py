@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from training_data_writer import TrainingDataWriter, encode_json_line
+
+SYSTEM_PROMPT = "Você é um especialista em análise técnica de Bitcoin. Analise os dados fornecidos e preveja se a próxima vela será de ALTA ou BAIXA."
+CHARS_PER_TOKEN = 4  # estimativa grosseira: ~4 bytes do registro serializado por token
+DEFAULT_SHARD_BYTES = 100 * 1024 * 1024
+
+
+def to_openai_format(data):
+    """Converte um exemplo prompt/completion para o formato de chat do fine-tuning da OpenAI"""
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": data['prompt']},
+            {"role": "assistant", "content": data['completion']}
+        ]
+    }
+
+
+def input_files(jsonl_file):
+    """Arquivos de entrada: o JSONL, os shards listados no manifest ou uma lista de caminhos"""
+    if isinstance(jsonl_file, (list, tuple)):
+        return list(jsonl_file)
+    manifest = os.path.splitext(jsonl_file)[0] + '.manifest.json'
+    if not os.path.exists(jsonl_file) and os.path.exists(manifest):
+        with open(manifest, 'r') as f:
+            return [shard['path'] for shard in json.load(f)['shards']]
+    return [jsonl_file]
+
+
+def split_tasks(paths, chunk_bytes):
+    """Divide os arquivos em faixas de bytes (alinhadas a linhas no worker); .gz é lido inteiro"""
+    tasks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        if path.endswith('.gz'):
+            tasks.append((path, 0, None))
+            continue
+        for start in range(0, max(size, 1), chunk_bytes):
+            tasks.append((path, start, min(start + chunk_bytes, size)))
+    return tasks
+
+
+def _iter_range(path, start, end):
+    """Linhas cujo início está em [start, end); a linha que cruza o limite pertence à faixa anterior"""
+    if end is None:
+        with gzip.open(path, 'rb') as f:
+            yield from f
+        return
+    with open(path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            # Se o byte anterior não é \n, a linha atual começou na faixa anterior
+            if f.read(1) != b'\n':
+                f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line
+
+
+def convert_range(args):
+    """Converte uma faixa do arquivo em um arquivo parcial, deduplicando dentro da faixa
+
+    Retorna o caminho parcial e, para cada registro gravado, o hash do prompt e o tamanho.
+    """
+    path, start, end, part_file = args
+    digests = []
+    sizes = []
+    skipped = 0
+    seen = set()
+    with open(part_file, 'wb') as out:
+        for line in _iter_range(path, start, end):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            digest = hashlib.blake2b(data['prompt'].encode('utf-8'), digest_size=16).digest()
+            if digest in seen:
+                skipped += 1
+                continue
+            seen.add(digest)
+            encoded = encode_json_line(to_openai_format(data))
+            out.write(encoded)
+            digests.append(digest)
+            sizes.append(len(encoded))
+    return part_file, digests, sizes, skipped
+
+
+def export_openai_dataset(jsonl_file, output_file="openai_training_data.jsonl", max_shard_bytes=DEFAULT_SHARD_BYTES,
+                          compress=False, max_workers=None, chunk_bytes=32 * 1024 * 1024):
+    """Converte o dataset em paralelo, remove prompts duplicados e grava shards com limite de tamanho + manifest"""
+    tasks = split_tasks(input_files(jsonl_file), chunk_bytes)
+    max_workers = max_workers or os.cpu_count() or 1
+    tmp_dir = tempfile.mkdtemp(prefix='openai_export_', dir=os.path.dirname(os.path.abspath(output_file)))
+    stats = {'input_records': 0, 'duplicates': 0, 'estimated_tokens': 0, 'max_record_bytes': 0}
+    try:
+        jobs = [(path, start, end, os.path.join(tmp_dir, f"part-{i:05d}.jsonl"))
+                for i, (path, start, end) in enumerate(tasks)]
+        with TrainingDataWriter(output_file, compress=compress, max_shard_bytes=max_shard_bytes,
+                                manifest_extra=stats) as writer:
+            seen = set()
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                # map preserva a ordem das faixas: a primeira ocorrência de cada prompt é a mantida
+                for part_file, digests, sizes, skipped in executor.map(convert_range, jobs):
+                    stats['duplicates'] += skipped
+                    stats['input_records'] += skipped + len(digests)
+                    with open(part_file, 'rb') as part:
+                        for digest, size, line in zip(digests, sizes, part):
+                            if digest in seen:
+                                stats['duplicates'] += 1
+                                continue
+                            seen.add(digest)
+                            writer.write_line(line)
+                            stats['estimated_tokens'] += size // CHARS_PER_TOKEN
+                            stats['max_record_bytes'] = max(stats['max_record_bytes'], size)
+                    os.remove(part_file)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"{writer.records} exemplos exportados ({stats['duplicates']} prompts duplicados removidos, "
+          f"~{stats['estimated_tokens']} tokens) em {len(writer.shards)} arquivo(s)")
+    return writer.shards, stats
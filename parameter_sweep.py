@@ -0,0 +1,236 @@
+import pandas as pd
+import numpy as np
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from backtest_system import TradingBacktest, prediction_arrays, select_trades
+
+SWEEP_RESULTS = "sweep_results.csv"
+
+# Grade padrão dos parâmetros do TradingBacktest (8 x 4 x 5 x 3 = 480 combinações)
+DEFAULT_GRID = {
+    'min_confidence': [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85],
+    'trade_amount': [10, 25, 50, 100],
+    'win_payout': [0.7, 0.75, 0.8, 0.85, 0.9],
+    'loss_ratio': [0.5, 0.75, 1.0],
+}
+PARAMETERS = list(DEFAULT_GRID)
+
+_worker_shm = None
+_worker_arrays = None
+
+
+def grid_combinations(grid=DEFAULT_GRID):
+    """Todas as combinações da grade, como dicts de parâmetros"""
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(*(grid[name] for name in PARAMETERS))]
+
+
+def random_combinations(grid=DEFAULT_GRID, n_combinations=100, seed=42):
+    """Amostra sem reposição de combinações da grade"""
+    combinations = grid_combinations(grid)
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(combinations), size=min(n_combinations, len(combinations)), replace=False)
+    return [combinations[i] for i in sorted(chosen)]
+
+
+def candidate_trades(df, predictions, quality=None):
+    """Trades possíveis com qualquer confiança: (confiança, acertou?) na ordem do histórico
+
+    Basta filtrar pela confiança mínima para obter os trades de cada combinação.
+    """
+    close = df['close'].to_numpy(dtype=np.float64)
+    predicted_up, confidences = prediction_arrays(predictions)
+    bad_windows = quality.trade_mask(df['timestamp']) if quality is not None and 'timestamp' in df else None
+    positions, actual_up = select_trades(close, confidences, -np.inf, bad_windows)
+    return {'confidence': confidences[positions], 'correct': predicted_up[positions] == actual_up}
+
+
+def trade_hits(arrays, min_confidence):
+    """Acertos (em ordem) dos trades que atingem a confiança mínima"""
+    return arrays['correct'][~(arrays['confidence'] < min_confidence)]
+
+
+def sweep_metrics(hits, params, initial_balance=1000):
+    """Métricas de uma combinação, iguais às de TradingBacktest.calculate_metrics"""
+    amount, win, loss = params['trade_amount'], params['win_payout'], params['loss_ratio']
+    n = len(hits)
+    result = dict(params, total_trades=n)
+    if n == 0:
+        return dict(result, win_rate=np.nan, total_return=0.0, max_drawdown=0.0, sharpe_ratio=0.0,
+                    final_balance=float(initial_balance))
+
+    # Saldo a partir da contagem acumulada de acertos (o retorno por trade só assume dois valores)
+    wins = np.cumsum(hits, dtype=np.int64)
+    balance = initial_balance + amount * (win * wins - loss * (np.arange(1, n + 1) - wins))
+    peak = np.maximum.accumulate(np.maximum(balance, initial_balance))
+    total_wins = int(wins[-1])
+    mean = (total_wins * win - (n - total_wins) * loss) / n
+    std = np.sqrt((total_wins * (win - mean) ** 2 + (n - total_wins) * (loss + mean) ** 2) / n)
+    return dict(
+        result,
+        win_rate=total_wins / n,
+        total_return=float((balance[-1] - initial_balance) / initial_balance * 100),
+        max_drawdown=max(0.0, float(((peak - balance) / peak * 100).max())),
+        sharpe_ratio=float(mean / std) if n > 1 and std > 0 else 0.0,
+        final_balance=float(balance[-1]),
+    )
+
+
+class SharedArrays:
+    """Arrays publicados uma única vez em memória compartilhada; os workers recebem só o nome e o layout"""
+
+    def __init__(self, arrays):
+        self.layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            self.layout[name] = (np.dtype(array.dtype).str, array.shape, offset)
+            # Alinhar cada array em 64 bytes
+            offset += -(-array.nbytes // 64) * 64
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, array in arrays.items():
+            self.view(self.shm, self.layout[name])[...] = array
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @staticmethod
+    def view(shm, spec):
+        dtype, shape, offset = spec
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def attach(cls, name, layout, shared_tracker=False):
+        """Abre o bloco publicado por outro processo e devolve (bloco, arrays sem cópia)
+
+        Só o processo que criou o bloco é dono dele e o remove em close(). Os workers do pool
+        (shared_tracker=True) usam o resource_tracker do criador, onde registrar de novo o mesmo
+        nome não muda nada. Um processo independente tem o próprio tracker: lá o registro é
+        desfeito logo após a abertura, para a saída do processo não apagar o bloco nem gerar
+        avisos de "leaked shared_memory".
+        """
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            if not shared_tracker:
+                # No tracker do criador isto apagaria o registro dele (KeyError no unlink)
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm, {array_name: cls.view(shm, spec) for array_name, spec in layout.items()}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _init_worker(name, layout):
+    """Anexa o bloco compartilhado uma vez por processo"""
+    global _worker_shm, _worker_arrays
+    _worker_shm, _worker_arrays = SharedArrays.attach(name, layout, shared_tracker=True)
+
+
+def evaluate_combinations(arrays, combinations, initial_balance):
+    results = []
+    hits = {}
+    for params in combinations:
+        # Combinações vizinhas da grade compartilham a confiança mínima: filtrar uma vez só
+        if params['min_confidence'] not in hits:
+            hits = {params['min_confidence']: trade_hits(arrays, params['min_confidence'])}
+        results.append(sweep_metrics(hits[params['min_confidence']], params, initial_balance))
+    return results
+
+
+def _evaluate_in_worker(args):
+    combinations, initial_balance = args
+    return evaluate_combinations(_worker_arrays, combinations, initial_balance)
+
+
+def rank_results(results, min_trades=30):
+    """Ordena por Sharpe (maior primeiro) e drawdown (menor primeiro); poucas operações vão para o fim"""
+    results = results.copy()
+    eligible = results['total_trades'] >= min_trades
+    results['rank'] = np.nan
+    order = results[eligible].sort_values(['sharpe_ratio', 'max_drawdown'], ascending=[False, True], kind='stable')
+    results.loc[order.index, 'rank'] = np.arange(1, len(order) + 1)
+    return results.sort_values(['rank', 'total_trades'], ascending=[True, False], na_position='last',
+                               kind='stable').reset_index(drop=True)
+
+
+class ParameterSweep:
+    """Avalia combinações de parâmetros do backtest em paralelo sobre as mesmas predições"""
+
+    def __init__(self, grid=None, strategy='grid', n_combinations=100, initial_balance=1000,
+                 min_trades=30, max_workers=None, batch_size=50, seed=42):
+        self.grid = grid or DEFAULT_GRID
+        self.strategy = strategy
+        self.n_combinations = n_combinations
+        self.initial_balance = initial_balance
+        self.min_trades = min_trades
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.seed = seed
+
+    def combinations(self):
+        if self.strategy == 'random':
+            return random_combinations(self.grid, self.n_combinations, self.seed)
+        return grid_combinations(self.grid)
+
+    def run(self, df, predictions, quality=None):
+        """Executa a varredura e retorna a tabela de resultados ordenada"""
+        arrays = candidate_trades(df, predictions, quality)
+        combinations = self.combinations()
+        print(f"Varredura: {len(combinations)} combinações sobre {len(arrays['confidence'])} trades possíveis")
+
+        start = time.time()
+        batches = [(combinations[i:i + self.batch_size], self.initial_balance)
+                   for i in range(0, len(combinations), self.batch_size)]
+        results = []
+        if self.max_workers == 1 or len(batches) == 1:
+            for batch, initial_balance in batches:
+                results.extend(evaluate_combinations(arrays, batch, initial_balance))
+        else:
+            # Os arrays vão uma vez para a memória compartilhada; cada tarefa leva só os parâmetros
+            shared = SharedArrays(arrays)
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                         initargs=(shared.name, shared.layout)) as executor:
+                    for batch_results in executor.map(_evaluate_in_worker, batches):
+                        results.extend(batch_results)
+            finally:
+                shared.close()
+        print(f"Varredura concluída em {time.time() - start:.1f}s")
+
+        return rank_results(pd.DataFrame(results), self.min_trades)
+
+
+def main():
+    import sys
+    from columnar_store import default_processed_path
+    from data_quality import QualityIndex
+
+    print("=== Varredura de Parâmetros do Backtest ===\n")
+    data_path = default_processed_path()
+    if not os.path.exists(data_path):
+        print(f"❌ Erro: Dados processados '{data_path}' não encontrados")
+        return None
+
+    backtest = TradingBacktest()
+    # A varredura usa o histórico completo (só as métricas de cada combinação ficam em memória)
+    df = backtest.load_data(data_path, nrows=None)
+    quality = QualityIndex.for_data(data_path)
+    predictions = backtest.model_predictions(df) if '--model' in sys.argv else backtest.simulate_predictions(df)
+
+    strategy = 'random' if '--random' in sys.argv else 'grid'
+    results = ParameterSweep(strategy=strategy).run(df, predictions, quality)
+    results.to_csv(SWEEP_RESULTS, index=False)
+    print(results.head(10).to_string(index=False))
+    print(f"\nResultados salvos em {SWEEP_RESULTS}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
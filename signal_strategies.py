@@ -0,0 +1,90 @@
+import numpy as np
+
+# Camada de estratégias: cada função de sinal recebe o DataFrame de velas e um gerador
+# np.random.Generator explícito e devolve (direções, confianças) para todas as velas de uma vez
+DIRECTIONS = np.array(['BAIXA', 'ALTA'])
+DEFAULT_SIGNAL = 'sma_rsi'
+SIGNALS = {}
+
+
+def register_signal(name):
+    """Registra uma função de sinal: fn(df, rng, **params) -> (direções, confianças)"""
+    def decorator(fn):
+        SIGNALS[name] = fn
+        return fn
+    return decorator
+
+
+def _column(df, name, default=np.nan):
+    """Coluna como array float64 (preenchida com `default` se não existir)"""
+    if name in df:
+        return df[name].to_numpy(dtype=np.float64)
+    return np.full(len(df), default)
+
+
+def _random_fill(up, confidence, missing, rng, low=0.5, spread=0.3):
+    """Direção aleatória e confiança em [low, low + spread) onde o sinal não pode ser calculado"""
+    n_missing = int(missing.sum())
+    if n_missing:
+        draws = rng.random((2, n_missing))
+        up[missing] = draws[0] > 0.5
+        confidence[missing] = low + draws[1] * spread
+
+
+@register_signal('sma_rsi')
+def sma_rsi_signal(df, rng, fast='sma_5', slow='sma_20', weight=0.3):
+    """Cruzamento de médias móveis; o RSI aumenta a confiança a favor da tendência
+
+    Mesma regra do antigo simulate_predictions: ALTA se SMA5 > SMA20, confiança
+    0.6 ± (RSI - 50) / 100 * 0.3 limitada a [0.5, 0.9]; velas sem médias (aquecimento)
+    recebem direção/confiança aleatórias do gerador. Sem coluna rsi vale RSI 50; um RSI NaN
+    (trechos sem perdas, 0/0) dá confiança 0.9, como max(0.5, min(0.9, nan)) no laço antigo.
+    """
+    fast, slow = _column(df, fast), _column(df, slow)
+    rsi = _column(df, 'rsi', 50.0)
+    up = fast > slow
+    confidence = 0.6 + np.where(up, rsi - 50, 50 - rsi) / 100 * weight
+    _random_fill(up, confidence, np.isnan(fast) | np.isnan(slow), rng)
+    return DIRECTIONS[up.astype(np.int64)], np.where(np.isnan(confidence), 0.9, np.clip(confidence, 0.5, 0.9))
+
+
+@register_signal('rsi_reversion')
+def rsi_reversion_signal(df, rng, oversold=30, overbought=70):
+    """Reversão à média: ALTA com RSI baixo, BAIXA com RSI alto; confiança cresce com o extremo"""
+    rsi = _column(df, 'rsi')
+    up = rsi < 50
+    distance = np.abs(rsi - 50) / 50
+    extreme = (rsi <= oversold) | (rsi >= overbought)
+    confidence = np.where(extreme, 0.7 + distance * 0.2, 0.5 + distance * 0.2)
+    _random_fill(up, confidence, np.isnan(rsi), rng)
+    return DIRECTIONS[up.astype(np.int64)], np.clip(confidence, 0.5, 0.9)
+
+
+@register_signal('momentum')
+def momentum_signal(df, rng, lookback=5, scale=0.002):
+    """Segue o retorno das últimas `lookback` velas; confiança proporcional ao tamanho do movimento"""
+    close = _column(df, 'close')
+    change = np.full(len(close), np.nan)
+    if len(close) > lookback:
+        change[lookback:] = close[lookback:] / close[:-lookback] - 1
+    up = change > 0
+    confidence = 0.5 + np.minimum(np.abs(change) / scale, 1.0) * 0.4
+    _random_fill(up, confidence, np.isnan(change), rng)
+    return DIRECTIONS[up.astype(np.int64)], np.clip(confidence, 0.5, 0.9)
+
+
+@register_signal('random')
+def random_signal(df, rng):
+    """Referência: direção e confiança aleatórias para todas as velas"""
+    up = np.zeros(len(df), dtype=bool)
+    confidence = np.empty(len(df))
+    _random_fill(up, confidence, np.ones(len(df), dtype=bool), rng)
+    return DIRECTIONS[up.astype(np.int64)], confidence
+
+
+def generate_signals(df, name=DEFAULT_SIGNAL, seed=42, **params):
+    """Executa a função de sinal registrada com um gerador semeado (mesma seed, mesmo resultado)"""
+    if name not in SIGNALS:
+        raise ValueError(f"Sinal desconhecido: {name} (disponíveis: {', '.join(sorted(SIGNALS))})")
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    return SIGNALS[name](df, rng, **params)
@@ -6,6 +6,9 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
 import os
+from columnar_store import default_processed_path
+from feature_store import FeatureStore, FEATURE_CACHE
+from openai_export import export_openai_dataset, DEFAULT_SHARD_BYTES
 
 class SimpleTradingModel:
     def __init__(self):
@@ -40,60 +43,32 @@ class SimpleTradingModel:
         
         return np.array(features), np.array(labels)
     
-    def prepare_features_from_csv(self, csv_file, lookback_window=10):
-        """Prepara features a partir do CSV processado"""
-        df = pd.read_csv(csv_file)
+    def prepare_features_from_csv(self, csv_file, lookback_window=10, cache_dir=FEATURE_CACHE):
+        """Prepara features a partir do CSV processado (ou do store colunar) via feature store"""
+        feature_set = FeatureStore(cache_dir).get(csv_file)
         
-        features = []
-        labels = []
+        # Mesma política de NaN do modelo leve: linhas com indicadores incompletos ficam de fora
+        positions = np.arange(min(lookback_window, len(feature_set)), len(feature_set))
+        features, labels = feature_set.take(positions)
         
-        for i in range(lookback_window, len(df) - 1):
-            # Features: indicadores técnicos atuais
-            current_row = df.iloc[i]
-            next_row = df.iloc[i + 1]
-            
-            feature_row = [
-                current_row.get('sma_5', 0) or 0,
-                current_row.get('sma_10', 0) or 0,
-                current_row.get('sma_20', 0) or 0,
-                current_row.get('rsi', 50) or 50,
-                current_row.get('macd', 0) or 0,
-                current_row.get('macd_signal', 0) or 0,
-                current_row.get('bb_upper', 0) or 0,
-                current_row.get('bb_middle', 0) or 0,
-                current_row.get('bb_lower', 0) or 0,
-                current_row.get('volume_sma', 0) or 0,
-                current_row['close'],
-                current_row['volume']
-            ]
-            
-            # Label: 1 se próximo close > close atual, 0 caso contrário
-            label = 1 if next_row['close'] > current_row['close'] else 0
-            
-            features.append(feature_row)
-            labels.append(label)
+        self.feature_columns = feature_set.columns
         
-        self.feature_columns = [
-            'sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
-            'bb_upper', 'bb_middle', 'bb_lower', 'volume_sma', 'close', 'volume'
-        ]
-        
-        return np.array(features), np.array(labels)
+        return features, labels
     
-    def train_model(self, features, labels, test_size=0.2):
-        """Treina o modelo de classificação"""
-        # Dividir dados em treino e teste
+    def train_model(self, features, labels, test_size=0.2, model_params=None):
+        """Treina o modelo de classificação
+
+        model_params: hiperparâmetros do RandomForest (ex.: o melhor da busca)
+        """
+        # Dividir dados em treino e teste em ordem cronológica (sem embaralhar a série temporal)
         X_train, X_test, y_train, y_test = train_test_split(
-            features, labels, test_size=test_size, random_state=42, stratify=labels
+            features, labels, test_size=test_size, shuffle=False
         )
         
         # Treinar Random Forest (modelo simples mas eficaz)
-        self.model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            n_jobs=-1
-        )
+        params = {'n_estimators': 100, 'max_depth': 10, 'n_jobs': -1}
+        params.update(model_params or {})
+        self.model = RandomForestClassifier(random_state=42, **params)
         
         print("Treinando modelo...")
         self.model.fit(X_train, y_train)
@@ -162,37 +137,18 @@ class OpenAIFineTuner:
         if not self.api_key:
             print("OPENAI_API_KEY não encontrada. Fine-tuning OpenAI não disponível.")
     
-    def prepare_openai_format(self, jsonl_file, output_file="openai_training_data.jsonl"):
-        """Converte dados para formato OpenAI fine-tuning"""
-        if not self.api_key:
-            return None
-        
-        with open(jsonl_file, 'r') as infile, open(output_file, 'w') as outfile:
-            for line in infile:
-                data = json.loads(line)
-                
-                # Formato OpenAI para fine-tuning
-                openai_format = {
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "Você é um especialista em análise técnica de Bitcoin. Analise os dados fornecidos e preveja se a próxima vela será de ALTA ou BAIXA."
-                        },
-                        {
-                            "role": "user",
-                            "content": data['prompt']
-                        },
-                        {
-                            "role": "assistant",
-                            "content": data['completion']
-                        }
-                    ]
-                }
-                
-                outfile.write(json.dumps(openai_format) + '\n')
-        
-        print(f"Dados formatados para OpenAI salvos em {output_file}")
-        return output_file
+    def prepare_openai_format(self, jsonl_file, output_file="openai_training_data.jsonl",
+                              max_shard_bytes=DEFAULT_SHARD_BYTES, max_workers=None):
+        """Converte dados para formato OpenAI fine-tuning (local: não exige API key)
+
+        Conversão paralela, sem prompts duplicados, em shards de até max_shard_bytes;
+        retorna os caminhos dos shards.
+        """
+        shards, _ = export_openai_dataset(jsonl_file, output_file, max_shard_bytes=max_shard_bytes,
+                                          max_workers=max_workers)
+        paths = [shard['path'] for shard in shards]
+        print(f"Dados formatados para OpenAI salvos em {', '.join(paths[:3])}{' ...' if len(paths) > 3 else ''}")
+        return paths
     
     def create_fine_tuning_job(self, training_file):
         """Cria um job de fine-tuning na OpenAI (requer API key válida)"""
@@ -236,10 +192,11 @@ def main():
     print("1. Treinando modelo Random Forest...")
     simple_model = SimpleTradingModel()
     
-    # Usar dados do CSV processado
-    if os.path.exists('processed_btc_data.csv'):
-        print("Carregando dados do CSV processado...")
-        features, labels = simple_model.prepare_features_from_csv('processed_btc_data.csv')
+    # Usar dados processados (store colunar ou CSV)
+    data_path = default_processed_path()
+    if os.path.exists(data_path):
+        print(f"Carregando dados processados de {data_path}...")
+        features, labels = simple_model.prepare_features_from_csv(data_path)
         
         print(f"Features shape: {features.shape}")
         print(f"Labels shape: {labels.shape}")
@@ -257,12 +214,12 @@ def main():
     print("\n2. Preparando dados para OpenAI fine-tuning...")
     openai_tuner = OpenAIFineTuner()
     
-    if os.path.exists('training_data.jsonl'):
-        openai_file = openai_tuner.prepare_openai_format('training_data.jsonl')
-        if openai_file:
+    if os.path.exists('training_data.jsonl') or os.path.exists('training_data.manifest.json'):
+        openai_files = openai_tuner.prepare_openai_format('training_data.jsonl')
+        if openai_files:
             print("Dados preparados para OpenAI. Para fazer fine-tuning:")
             print("1. Configure sua OPENAI_API_KEY")
-            print("2. Execute openai_tuner.create_fine_tuning_job('openai_training_data.jsonl')")
+            print(f"2. Execute openai_tuner.create_fine_tuning_job('{openai_files[0]}') para cada shard")
     
     print("\n=== Treinamento Concluído ===")
 
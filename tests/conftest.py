@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicator_engine import FEATURE_COLUMNS
+
+
+def processed_frame(n, seed=3):
+    """Dados processados sintéticos: features aleatórias e close em passeio aleatório"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(n, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    df['close'] = 50000 + np.cumsum(rng.normal(size=n))
+    df.iloc[:20, :10] = np.nan  # aquecimento dos indicadores
+    df.insert(0, 'timestamp', pd.date_range('2024-01-01', periods=n, freq='1min'))
+    return df
+
+
+def ohlcv_frame(n, seed=0, start='2024-01-01', freq='1min'):
+    """Velas OHLCV sintéticas e consistentes (high >= open/close >= low)"""
+    rng = np.random.default_rng(seed)
+    close = 50000 + np.cumsum(rng.normal(scale=20, size=n))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = rng.uniform(0, 15, size=(2, n))
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=n, freq=freq),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread[0],
+        'low': np.minimum(open_, close) - spread[1],
+        'close': close,
+        'volume': rng.uniform(1, 100, size=n),
+    })
+
+
+def compiled_linear_model(n_features=len(FEATURE_COLUMNS), seed=0):
+    """Regressão logística ajustada em dados aleatórios: (CompiledModel, estimador, features)"""
+    from sklearn.linear_model import LogisticRegression
+    from compiled_model import CompiledModel
+    
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(500, n_features))
+    labels = (features[:, 0] + rng.normal(scale=0.5, size=500) > 0).astype(np.int64)
+    estimator = LogisticRegression().fit(features, labels)
+    return CompiledModel.from_linear(estimator, FEATURE_COLUMNS), estimator, features
+
+
+@pytest.fixture
+def make_processed():
+    return processed_frame
+
+
+@pytest.fixture
+def make_ohlcv():
+    return ohlcv_frame
+
+
+@pytest.fixture
+def linear_model():
+    return compiled_linear_model
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_system import RunningMetrics, TradingBacktest
+
+
+class BaselineBacktest:
+    """Laço vela a vela e métricas do backtest original, para comparação"""
+
+    def __init__(self, initial_balance=1000, trade_amount=50):
+        self.initial_balance = initial_balance
+        self.trade_amount = trade_amount
+        self.balance = initial_balance
+        self.trades = []
+        self.equity_curve = []
+
+    def run_backtest(self, df, predictions, min_confidence=0.7):
+        for i in range(len(df) - 1):
+            current_row = df.iloc[i]
+            next_row = df.iloc[i + 1]
+            prediction = predictions[i]
+            if prediction['confidence'] < min_confidence:
+                continue
+            if pd.isna(current_row['close']) or pd.isna(next_row['close']):
+                continue
+            actual_direction = 'ALTA' if next_row['close'] > current_row['close'] else 'BAIXA'
+            is_correct = prediction['direction'] == actual_direction
+            profit = self.trade_amount * 0.8 if is_correct else -self.trade_amount * 0.5
+            self.balance += profit
+            self.trades.append({
+                'timestamp': current_row.get('timestamp', i),
+                'entry_price': current_row['close'],
+                'exit_price': next_row['close'],
+                'direction': prediction['direction'],
+                'confidence': prediction['confidence'],
+                'actual_direction': actual_direction,
+                'result': 'WIN' if is_correct else 'LOSS',
+                'profit': profit,
+                'balance': self.balance
+            })
+            self.equity_curve.append({'index': i, 'balance': self.balance})
+
+    def calculate_metrics(self):
+        if not self.trades:
+            return {}
+        total_trades = len(self.trades)
+        winning_trades = sum(1 for trade in self.trades if trade['result'] == 'WIN')
+        total_profit = sum(trade['profit'] for trade in self.trades)
+        peak = self.initial_balance
+        max_drawdown = 0
+        for point in self.equity_curve:
+            if point['balance'] > peak:
+                peak = point['balance']
+            drawdown = (peak - point['balance']) / peak * 100
+            if drawdown > max_drawdown:
+                max_drawdown = drawdown
+        returns = [trade['profit'] / self.trade_amount for trade in self.trades]
+        if len(returns) > 1:
+            std_return = np.std(returns)
+            sharpe_ratio = np.mean(returns) / std_return if std_return > 0 else 0
+        else:
+            sharpe_ratio = 0
+        return {
+            'total_trades': total_trades,
+            'winning_trades': winning_trades,
+            'losing_trades': total_trades - winning_trades,
+            'win_rate': winning_trades / total_trades,
+            'total_profit': total_profit,
+            'total_return': (self.balance - self.initial_balance) / self.initial_balance * 100,
+            'avg_profit_per_trade': total_profit / total_trades,
+            'max_drawdown': max_drawdown,
+            'sharpe_ratio': sharpe_ratio,
+            'final_balance': self.balance
+        }
+
+
+def assert_metrics_equal(metrics, expected):
+    assert metrics.keys() == expected.keys()
+    for key, value in expected.items():
+        assert metrics[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+
+
+def make_market(n=1500, seed=2):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='1min'),
+        'close': 50000 + np.cumsum(rng.normal(size=n)),
+    })
+    df.loc[[10, 11, 500], 'close'] = np.nan
+    # Fechamentos repetidos: "não subiu" conta como BAIXA
+    df.loc[700:705, 'close'] = df.loc[700, 'close']
+    confidences = rng.uniform(0.5, 0.9, n)
+    confidences[[20, 21]] = np.nan
+    predictions = [{'direction': 'ALTA' if up else 'BAIXA', 'confidence': confidence}
+                   for up, confidence in zip(rng.random(n) > 0.5, confidences)]
+    return df, predictions
+
+
+@pytest.mark.parametrize('min_confidence', [0.5, 0.7, 0.95])
+def test_vectorized_backtest_matches_row_loop(min_confidence):
+    df, predictions = make_market()
+    baseline = BaselineBacktest()
+    baseline.run_backtest(df, predictions, min_confidence)
+    backtest = TradingBacktest()
+    backtest.run_backtest(df, predictions, min_confidence)
+
+    assert_metrics_equal(backtest.calculate_metrics(), baseline.calculate_metrics())
+    expected = pd.DataFrame(baseline.trades, columns=list(backtest.trades.columns))
+    assert len(backtest.trades) == len(expected)
+    if len(expected) == 0:
+        return
+    trades = backtest.trades.astype({column: str for column in ('direction', 'actual_direction', 'result')})
+    pd.testing.assert_frame_equal(trades, expected, check_dtype=False)
+    assert backtest.equity_curve['index'].tolist() == [point['index'] for point in baseline.equity_curve]
+
+
+def baseline_metrics(profits, initial_balance=1000, trade_amount=50):
+    """calculate_metrics original sobre uma sequência de lucros/prejuízos"""
+    baseline = BaselineBacktest(initial_balance, trade_amount)
+    for i, profit in enumerate(profits):
+        baseline.balance += profit
+        baseline.trades.append({'result': 'WIN' if profit > 0 else 'LOSS', 'profit': profit})
+        baseline.equity_curve.append({'index': i, 'balance': baseline.balance})
+    return baseline.calculate_metrics()
+
+
+@pytest.mark.parametrize('split', ['push', 'batch', 'mixed'])
+def test_running_metrics_match_calculate_metrics(split):
+    rng = np.random.default_rng(9)
+    # Sequência que sobe, cai abaixo do saldo inicial e recupera: vários picos e drawdowns
+    won = np.concatenate([rng.random(300) < 0.7, rng.random(400) < 0.3, rng.random(300) < 0.65])
+    profits = np.where(won, 50 * 0.8, -50 * 0.5)
+    metrics = RunningMetrics(1000, 50)
+    if split == 'push':
+        balances = [metrics.push(profit, win) for profit, win in zip(profits, won)]
+    elif split == 'batch':
+        balances = list(metrics.push_batch(profits, won))
+    else:
+        balances = []
+        for a, b in zip([0, 1, 1, 250, 600], [1, 1, 250, 600, 1000]):
+            if b - a == 1:
+                balances.append(metrics.push(profits[a], won[a]))
+            else:
+                balances.extend(metrics.push_batch(profits[a:b], won[a:b]))
+
+    np.testing.assert_allclose(balances, 1000 + np.cumsum(profits))
+    assert_metrics_equal(metrics.summary(), baseline_metrics(profits))
+    assert metrics.summary()['max_drawdown'] > 0
+
+
+def test_running_metrics_edge_cases():
+    assert RunningMetrics().summary() == baseline_metrics([]) == {}
+    metrics = RunningMetrics()
+    metrics.push_batch([], [])
+    metrics.push(40.0, True)
+    assert_metrics_equal(metrics.summary(), baseline_metrics([40.0]))
+    # Retornos todos iguais (0.5 é exato em binário): desvio zero, Sharpe 0 como no original
+    metrics = RunningMetrics()
+    metrics.push(25.0, True)
+    metrics.push_batch([25.0, 25.0], [True, True])
+    assert_metrics_equal(metrics.summary(), baseline_metrics([25.0] * 3))
+    assert metrics.sharpe_ratio == 0
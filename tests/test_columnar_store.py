@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_store import ColumnarStore, load_processed_data
+
+
+@pytest.mark.parametrize('source', ['store', 'csv'])
+def test_load_processed_data_filters_time_range(tmp_path, make_processed, source):
+    df = make_processed(1000)
+    path = str(tmp_path / 'processed')
+    if source == 'store':
+        ColumnarStore(path).write(df)
+    else:
+        path += '.csv'
+        df.to_csv(path, index=False)
+
+    loaded = load_processed_data(path, columns=['close'], start='2024-01-01 02:00', end='2024-01-01 05:00')
+    expected = df[(df['timestamp'] >= '2024-01-01 02:00') & (df['timestamp'] < '2024-01-01 05:00')]
+    assert list(loaded.columns) == ['close']
+    np.testing.assert_allclose(loaded['close'], expected['close'])
+
+    # nrows conta a partir do início do intervalo
+    head = load_processed_data(path, start='2024-01-01 02:00', nrows=10)
+    assert pd.to_datetime(head['timestamp']).tolist() == expected['timestamp'].iloc[:10].tolist()
+    assert len(load_processed_data(path, end='2024-01-01')) == 0
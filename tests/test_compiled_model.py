@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import warnings
+
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+
+from compiled_model import CompiledModel
+from indicator_engine import FEATURE_COLUMNS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def test_linear_matches_sklearn_without_overflow(linear_model):
+    compiled, estimator, features = linear_model()
+    np.testing.assert_allclose(compiled.predict_proba_batch(features), estimator.predict_proba(features)[:, 1])
+
+    # Entradas extremas: z na casa de ±1e4 não pode gerar aviso de overflow
+    extreme = np.vstack([features[:2] * 1e4, -features[:2] * 1e4])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        probabilities = compiled.predict_proba_batch(extreme)
+    z = extreme @ compiled.arrays['weights'] + compiled.arrays['bias'][0]
+    np.testing.assert_allclose(probabilities, expit(z))
+
+
+def test_forest_matches_sklearn(tmp_path):
+    rng = np.random.default_rng(4)
+    features = rng.normal(size=(800, len(FEATURE_COLUMNS)))
+    labels = (features[:, 0] - features[:, 3] + rng.normal(scale=0.7, size=800) > 0).astype(np.int64)
+    # Indicadores em aquecimento: o NaN é preenchido pelo imputer compilado junto
+    features[:50, :4] = np.nan
+    imputer = SimpleImputer(strategy='median').fit(features)
+    forest = RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0)
+    forest.fit(imputer.transform(features), labels)
+
+    compiled = CompiledModel.from_forest(forest, FEATURE_COLUMNS, imputer)
+    expected = forest.predict_proba(imputer.transform(features))[:, 1]
+    # Lotes e sub-blocos pequenos: a travessia é feita em partes
+    np.testing.assert_allclose(compiled.predict_proba_batch(features, batch_size=64), expected, atol=1e-12)
+    np.testing.assert_allclose(compiled._forest(imputer.transform(features), max_cells=100), expected, atol=1e-12)
+
+    model_file = str(tmp_path / 'forest.npz')
+    compiled.save(model_file)
+    np.testing.assert_allclose(CompiledModel.load(model_file).predict_proba_batch(features), expected, atol=1e-12)
+
+
+def test_compiled_inference_does_not_import_sklearn(linear_model, tmp_path):
+    compiled, _, _ = linear_model()
+    model_file = str(tmp_path / 'model.npz')
+    compiled.save(model_file)
+    script = (
+        "import sys\n"
+        "from trading_predictor import TradingPredictor\n"
+        "import model_registry\n"
+        f"predictor = TradingPredictor({model_file!r})\n"
+        f"print(predictor.predict_next_candle(dict.fromkeys({FEATURE_COLUMNS!r}, 1.0))['direction'])\n"
+        "print(sorted(m for m in sys.modules if m.split('.')[0] in ('sklearn', 'joblib')))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == '[]'
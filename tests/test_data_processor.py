@@ -0,0 +1,102 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_store import ColumnarStore
+from data_processor import DataProcessor, INDICATOR_OUTPUT_COLUMNS
+
+
+def baseline_prompts(df, lookback_window=60):
+    """Construtor de prompts original, com iloc vela a vela"""
+    prompts = []
+    for i in range(lookback_window, len(df)):
+        historical_data = df.iloc[i-lookback_window:i]
+        next_candle = df.iloc[i]
+        current_close = historical_data.iloc[-1]['close']
+        next_close = next_candle['close']
+        prompt_data = {
+            "timestamp": next_candle['timestamp'].isoformat(),
+            "historical_candles": [],
+            "indicators": {},
+            "target_direction": "ALTA" if next_close > current_close else "BAIXA",
+            "price_change": float(next_close - current_close),
+            "price_change_percent": float((next_close - current_close) / current_close * 100)
+        }
+        for j in range(-10, 0):
+            candle = historical_data.iloc[j]
+            prompt_data["historical_candles"].append({
+                "timestamp": candle['timestamp'].isoformat(),
+                "open": float(candle['open']),
+                "high": float(candle['high']),
+                "low": float(candle['low']),
+                "close": float(candle['close']),
+                "volume": float(candle['volume'])
+            })
+        last_candle = historical_data.iloc[-1]
+        prompt_data["indicators"] = {
+            key: float(last_candle[key]) if not pd.isna(last_candle[key]) else None
+            for key in ['sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
+                        'bb_upper', 'bb_middle', 'bb_lower']
+        }
+        prompts.append(prompt_data)
+    return prompts
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return DataProcessor(str(tmp_path))
+
+
+@pytest.mark.parametrize('lookback_window', [10, 25])
+def test_prompts_match_baseline_builder(processor, make_ohlcv, lookback_window):
+    df = processor.add_technical_indicators(make_ohlcv(150))
+    expected = baseline_prompts(df, lookback_window)
+    # Lotes pequenos: os limites entre lotes também são comparados
+    prompts = list(processor.iter_training_prompts(df, lookback_window, batch_size=37))
+    assert len(prompts) == len(expected) == 150 - lookback_window
+    assert prompts == expected
+    # O aquecimento (indicadores NaN) vira None, como no construtor original
+    assert (prompts[0]['indicators']['sma_20'] is None) == (lookback_window < 20)
+    assert [processor.create_text_prompt(p) for p in prompts] == [processor.create_text_prompt(p) for p in expected]
+
+
+def test_short_frame_has_no_prompts(processor, make_ohlcv):
+    df = processor.add_technical_indicators(make_ohlcv(60))
+    assert list(processor.iter_training_prompts(df, 60)) == baseline_prompts(df, 60) == []
+    with pytest.raises(ValueError):
+        list(processor.iter_training_prompts(processor.add_technical_indicators(make_ohlcv(30)), 5))
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize('chunk_size', [7, 50, 333])
+def test_streaming_matches_in_memory(tmp_path, monkeypatch, make_ohlcv, chunk_size):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    df = make_ohlcv(900)
+    df.iloc[:400].to_csv('data/a.csv', index=False)
+    df.iloc[400:].to_csv('data/b.csv', index=False)
+    processor = DataProcessor('data')
+    in_memory = processor.process_all_data()
+
+    summary = processor.process_all_data_streaming(chunk_size=chunk_size, output_store='stream_store',
+                                                   output_jsonl='stream.jsonl')
+    assert summary['total_rows'] == len(in_memory) and summary['dropped_rows'] == 0
+    streamed = ColumnarStore('stream_store').load()
+    assert list(streamed.columns) == INDICATOR_OUTPUT_COLUMNS
+    np.testing.assert_array_equal(streamed['timestamp'].to_numpy(dtype='datetime64[ns]'),
+                                  in_memory['timestamp'].to_numpy(dtype='datetime64[ns]'))
+    # As EWMs contínuas entre blocos diferem do pandas só por arredondamento
+    np.testing.assert_allclose(streamed[INDICATOR_OUTPUT_COLUMNS[1:]].to_numpy(dtype=np.float64),
+                               in_memory[INDICATOR_OUTPUT_COLUMNS[1:]].to_numpy(dtype=np.float64),
+                               rtol=1e-9, atol=1e-9)
+
+    # Cada bloco reaproveita a janela de lookback do anterior: mesmos prompts, na mesma ordem
+    assert summary['total_prompts'] == len(in_memory) - 60
+    assert read_jsonl('stream.jsonl') == read_jsonl('training_data.jsonl')
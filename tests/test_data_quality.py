@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+from data_quality import OUTLIER, QualityIndex, quality_index_path
+
+N_CANDLES = 12000
+OUTLIER_ROWS = [2500, 7000, 11500]
+
+
+def make_candles(n=N_CANDLES):
+    rng = np.random.default_rng(1)
+    close = 50000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    close[OUTLIER_ROWS] *= 1.2
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='1min'),
+        'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+        'volume': rng.random(n) + 1
+    })
+    # Uma lacuna de 5 minutos
+    return df.drop(index=range(4000, 4005)).reset_index(drop=True)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    df = make_candles()
+    df.iloc[:6000].to_csv('data/a.csv', index=False)
+    df.iloc[6000:].to_csv('data/b.csv', index=False)
+    return 'data'
+
+
+def test_streaming_index_matches_in_memory(data_dir):
+    processor = DataProcessor(data_dir)
+    processor.process_all_data(save_csv=True)
+    in_memory = QualityIndex.load(quality_index_path('processed_btc_data'))
+    assert in_memory.summary()['gap'] == 1
+    assert in_memory.summary()['outlier'] > 0
+
+    # Blocos pequenos: a mediana/MAD de cada bloco seria diferente da global
+    processor.process_all_data_streaming(chunk_size=1500, output_store='stream_store',
+                                         output_jsonl='stream.jsonl', output_csv='stream.csv')
+    for path in ('stream_store', 'stream.csv', 'processed_btc_data.csv'):
+        index = QualityIndex.load(quality_index_path(path))
+        assert index is not None, path
+        np.testing.assert_array_equal(index.flags, in_memory.flags)
+
+
+def test_for_data_builds_missing_index(data_dir):
+    DataProcessor(data_dir).process_all_data_streaming(output_store='stream_store', output_jsonl='stream.jsonl')
+    expected = QualityIndex.load(quality_index_path('stream_store')).flags.copy()
+    os.remove(quality_index_path('stream_store'))
+
+    index = QualityIndex.for_data('stream_store')
+    np.testing.assert_array_equal(index.flags, expected)
+    assert os.path.exists(quality_index_path('stream_store'))
+    assert np.count_nonzero(index.flags & OUTLIER) > 0
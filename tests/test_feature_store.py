@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from columnar_store import ColumnarStore
+from feature_store import FeatureStore
+from lightweight_model import LightweightTradingModel
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'processed')
+
+
+def test_get_extends_previous_set_after_append(make_processed, store_path, tmp_path, capsys):
+    df = make_processed(5000)
+    ColumnarStore(store_path).write(df.iloc[:4000])
+    cache = str(tmp_path / 'cache')
+    first = FeatureStore(cache).get(store_path)
+    assert len(first) == 3999  # a última vela ainda não tem label
+
+    ColumnarStore(store_path).append(df.iloc[4000:])
+    capsys.readouterr()
+    extended = FeatureStore(cache).get(store_path)
+    assert 'Estendendo' in capsys.readouterr().out
+    assert len(os.listdir(cache)) == 1
+
+    full = FeatureStore(str(tmp_path / 'fresh')).get(store_path)
+    assert len(extended) == len(full) == 4999
+    np.testing.assert_array_equal(extended.features, full.features)
+    np.testing.assert_array_equal(extended.labels, full.labels)
+    np.testing.assert_array_equal(extended.timestamps, full.timestamps)
+
+
+def test_get_rematerializes_when_history_changed(make_processed, store_path, tmp_path, capsys):
+    df = make_processed(3000)
+    ColumnarStore(store_path).write(df.iloc[:2000])
+    cache = str(tmp_path / 'cache')
+    FeatureStore(cache).get(store_path)
+
+    changed = df.copy()
+    changed.loc[1998, 'close'] += 1  # última linha do conjunto já materializado
+    ColumnarStore(store_path).write(changed)
+    capsys.readouterr()
+    feature_set = FeatureStore(cache).get(store_path)
+    assert 'Materializando' in capsys.readouterr().out
+    assert len(feature_set) == 2999
+
+
+def test_resume_keeps_scaler_frozen(make_processed, store_path, tmp_path):
+    df = make_processed(6000)
+    ColumnarStore(store_path).write(df.iloc[:4000])
+    cache, checkpoint = str(tmp_path / 'cache'), str(tmp_path / 'model.pkl')
+    model = LightweightTradingModel()
+    model.train_incremental(store_path, checkpoint, chunk_size=1000, cache_dir=cache)
+    mean, scale = model.scaler.mean_.copy(), model.scaler.scale_.copy()
+    rows = model.training_state['rows_trained']
+
+    ColumnarStore(store_path).append(df.iloc[4000:])
+    resumed = LightweightTradingModel()
+    resumed.train_incremental(store_path, checkpoint, chunk_size=1000, cache_dir=cache)
+    np.testing.assert_array_equal(resumed.scaler.mean_, mean)
+    np.testing.assert_array_equal(resumed.scaler.scale_, scale)
+    assert resumed.training_state['rows_trained'] == rows + 2000
@@ -0,0 +1,134 @@
+import os
+
+import pandas as pd
+import pytest
+
+from get_ohlcv_data import LocalExchange, SyncCheckpoint, parse8601, sync_ohlcv, timeframe_to_ms
+
+START = '2024-07-16T00:00:00Z'
+STEP = timeframe_to_ms('1m')
+N_CANDLES = 250
+
+
+def make_candles(n=N_CANDLES):
+    start = parse8601(START)
+    return [[start + i * STEP, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 1.0 + i] for i in range(n)]
+
+
+def now_after(candles):
+    # A vela em formação é ignorada: "agora" fica duas velas depois da última
+    return candles[-1][0] + 2 * STEP
+
+
+class FailingExchange(LocalExchange):
+    """Interrompe a sincronização depois de algumas páginas"""
+
+    def __init__(self, candles, fail_after):
+        super().__init__(candles)
+        self.fail_after = fail_after
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=500):
+        if self.calls >= self.fail_after:
+            raise ConnectionError("conexão perdida")
+        return super().fetch_ohlcv(symbol, timeframe, since, limit)
+
+
+def read_timestamps(data_file):
+    return pd.to_datetime(pd.read_csv(data_file)['timestamp']).astype('datetime64[ms]').astype('int64').tolist()
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / 'BTC_USDT_1m.csv')
+
+
+def test_full_sync_writes_every_closed_candle(data_file):
+    candles = make_candles()
+    total = sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=100,
+                       now_ms=now_after(candles))
+    assert total == N_CANDLES
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+
+
+def test_second_sync_fetches_only_new_candles(data_file):
+    candles = make_candles()
+    sync_ohlcv(LocalExchange(candles[:100]), data_file=data_file, since=START, limit=40,
+               now_ms=now_after(candles[:100]))
+    exchange = LocalExchange(candles)
+    total = sync_ohlcv(exchange, data_file=data_file, since=START, limit=40, now_ms=now_after(candles))
+    assert total == N_CANDLES - 100
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+
+
+def test_resume_after_interrupted_sync(data_file):
+    candles = make_candles()
+    with pytest.raises(ConnectionError):
+        sync_ohlcv(FailingExchange(candles, fail_after=2), data_file=data_file, since=START, limit=60,
+                   now_ms=now_after(candles))
+    assert SyncCheckpoint(data_file).load()['last_timestamp'] == candles[119][0]
+
+    sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=60, now_ms=now_after(candles))
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+
+
+def test_partial_page_after_checkpoint_is_discarded(data_file):
+    candles = make_candles()
+    sync_ohlcv(LocalExchange(candles[:100]), data_file=data_file, since=START, limit=50,
+               now_ms=now_after(candles[:100]))
+    # Crash no meio da escrita da próxima página: uma linha pela metade depois do checkpoint
+    with open(data_file, 'a') as f:
+        f.write('2024-07-16 01:40:00,200.0,20')
+
+    sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=50, now_ms=now_after(candles))
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+
+
+def test_missing_file_with_stale_checkpoint_does_full_sync(data_file):
+    candles = make_candles()
+    sync_ohlcv(LocalExchange(candles[:100]), data_file=data_file, since=START, limit=50,
+               now_ms=now_after(candles[:100]))
+    os.remove(data_file)
+
+    total = sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=50,
+                       now_ms=now_after(candles))
+    assert total == N_CANDLES
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+
+
+def test_file_smaller_than_checkpoint_is_set_aside(data_file):
+    candles = make_candles()
+    sync_ohlcv(LocalExchange(candles[:100]), data_file=data_file, since=START, limit=50,
+               now_ms=now_after(candles[:100]))
+    # Arquivo substituído por uma versão mais curta
+    pd.read_csv(data_file).head(10).to_csv(data_file, index=False)
+
+    total = sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=50,
+                       now_ms=now_after(candles))
+    assert total == N_CANDLES
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+    assert os.path.exists(data_file + '.stale')
+
+
+def test_larger_rewritten_file_is_set_aside(data_file):
+    candles = make_candles()
+    sync_ohlcv(LocalExchange(candles[:100]), data_file=data_file, since=START, limit=50,
+               now_ms=now_after(candles[:100]))
+    # Arquivo substituído por outro maior: a linha no tamanho do checkpoint não é a última gravada
+    replacement = pd.read_csv(data_file).iloc[3:].assign(volume=123.456)
+    pd.concat([replacement, replacement.tail(60)]).to_csv(data_file, index=False)
+    size = SyncCheckpoint(data_file).load()['size']
+    assert os.path.getsize(data_file) > size
+
+    total = sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=50,
+                       now_ms=now_after(candles))
+    assert total == N_CANDLES
+    assert read_timestamps(data_file) == [c[0] for c in candles]
+    # O arquivo alheio é preservado inteiro, não truncado
+    assert len(pd.read_csv(data_file + '.stale')) == len(replacement) + 60
+
+
+def test_local_exchange_from_csv_round_trip(data_file):
+    candles = make_candles(30)
+    sync_ohlcv(LocalExchange(candles), data_file=data_file, since=START, limit=50, now_ms=now_after(candles))
+    exchange = LocalExchange.from_csv(data_file)
+    assert exchange.fetch_ohlcv('BTC/USDT', '1m', since=candles[10][0], limit=5) == candles[10:15]
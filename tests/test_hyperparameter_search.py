@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from columnar_store import ColumnarStore
+from hyperparameter_search import DEFAULT_SPACE, FoldCache, run_trial
+from walk_forward import build_model
+
+WINDOWS = {'train_size': 1500, 'test_size': 500}
+
+
+def test_build_model_without_scaler():
+    assert isinstance(build_model('logistic'), Pipeline)
+    assert isinstance(build_model('logistic', {'C': 0.1}, scale=False), LogisticRegression)
+
+
+def test_fold_cache_replaces_partial_fold(make_processed, tmp_path):
+    store_path = str(tmp_path / 'processed')
+    ColumnarStore(store_path).write(make_processed(4000))
+    cache = FoldCache(str(tmp_path / 'search'), str(tmp_path / 'features'))
+    fold_dirs, columns = cache.prepare(store_path, 1, WINDOWS)
+
+    # Execução interrompida: o fold ficou sem y_test.npy
+    os.remove(os.path.join(fold_dirs[0], 'y_test.npy'))
+    assert cache.prepare(store_path, 1, WINDOWS)[0] == fold_dirs
+    assert os.path.exists(os.path.join(fold_dirs[0], 'y_test.npy'))
+
+    candidate = {'model': 'logistic', 'params': {'C': 1.0}, 'features': 'all', 'horizon': 1}
+    result = run_trial((candidate, fold_dirs[0], columns, DEFAULT_SPACE['features']))
+    assert 0 <= result['accuracy'] <= 1
+    assert np.isfinite(result['log_loss'])
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+from indicator_engine import FEATURE_COLUMNS, INDICATOR_COLUMNS, ExponentialMean, IncrementalIndicators
+
+
+@pytest.fixture
+def candles(make_ohlcv):
+    df = make_ohlcv(600, seed=5)
+    # Trecho sem variação: ganho e perda médios zero (RSI NaN no pandas), depois só altas (RSI 100)
+    df.loc[200:230, 'close'] = df.loc[200, 'close']
+    df.loc[231:250, 'close'] = df.loc[200, 'close'] + np.arange(1, 21)
+    return df
+
+
+def assert_matches_pandas(result, expected):
+    for column in INDICATOR_COLUMNS:
+        values, reference = result[column].to_numpy(), expected[column].to_numpy()
+        # Mesmo padrão de NaN (aquecimento e RSI 0/0) e mesmos valores a menos de arredondamento
+        np.testing.assert_array_equal(np.isnan(values), np.isnan(reference), err_msg=column)
+        np.testing.assert_allclose(values, reference, rtol=1e-8, atol=1e-6, err_msg=column)
+
+
+def test_incremental_matches_batch_indicators(candles):
+    expected = DataProcessor().add_technical_indicators(candles)
+    assert_matches_pandas(IncrementalIndicators().update_many(candles), expected)
+    assert np.isnan(expected['sma_20'].iloc[:19]).all() and not np.isnan(expected['sma_20'].iloc[19])
+    assert np.isnan(expected['rsi'].iloc[230])
+    assert expected['rsi'].iloc[250] == 100
+
+
+def test_warm_up_then_update_continues_state(candles):
+    expected = DataProcessor().add_technical_indicators(candles)
+    engine = IncrementalIndicators().warm_up(candles.iloc[:350])
+    rows = [engine.update(bar) for _, bar in candles.iloc[350:].iterrows()]
+    assert_matches_pandas(pd.DataFrame(rows, columns=INDICATOR_COLUMNS), expected.iloc[350:])
+
+    vector = engine.feature_vector()
+    assert len(vector) == len(FEATURE_COLUMNS)
+    np.testing.assert_allclose(vector, expected[FEATURE_COLUMNS].iloc[-1].to_numpy(dtype=np.float64),
+                               rtol=1e-9)
+
+
+@pytest.mark.parametrize('span', [9, 12, 26])
+def test_push_many_carries_ewm_state(span):
+    values = np.random.default_rng(span).normal(size=500).cumsum()
+    expected = pd.Series(values).ewm(span=span).mean().to_numpy()
+
+    # Blocos de tamanhos variados, inclusive vazio e de uma só vela
+    mean = ExponentialMean(span)
+    bounds = [0, 1, 1, 40, 41, 300, 500]
+    result = np.concatenate([mean.push_many(values[a:b]) for a, b in zip(bounds, bounds[1:])])
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+    # O estado (numerador, peso) permite continuar vela a vela, ou recriar a média
+    single = ExponentialMean(span)
+    stepwise = [single.push(value) for value in values]
+    np.testing.assert_allclose(stepwise, expected, rtol=1e-12)
+    restored = ExponentialMean(span, mean.numerator, mean.weight)
+    assert restored.push(1.0) == pytest.approx(single.push(1.0), rel=1e-12)
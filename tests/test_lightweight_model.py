@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from columnar_store import ColumnarStore
+from lightweight_model import LightweightTradingModel, ReservoirSampler
+
+
+def sequential_reservoir(n, size, chunk, seed):
+    """Algoritmo R item a item, consumindo o gerador na mesma ordem que ReservoirSampler"""
+    rng = np.random.default_rng(seed)
+    reservoir = []
+    for start in range(0, n, chunk):
+        positions = np.arange(start, min(start + chunk, n))
+        take = max(0, min(size - len(reservoir), len(positions)))
+        reservoir.extend(positions[:take].tolist())
+        if take < len(positions):
+            slots = rng.integers(0, positions[take:] + 1)
+            for position, slot in zip(positions[take:], slots):
+                if slot < size:
+                    reservoir[slot] = int(position)
+    return reservoir
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_reservoir_matches_sequential_algorithm(seed):
+    # Reservatório pequeno e chunks grandes: muitos slots repetidos no mesmo chunk
+    n, size, chunk = 5000, 20, 1000
+    features = np.arange(n, dtype=np.float64)[:, None].repeat(3, axis=1)
+    labels = np.arange(n)
+    sampler = ReservoirSampler(size, np.random.default_rng(seed))
+    for start in range(0, n, chunk):
+        sampler.add(features[start:start + chunk], labels[start:start + chunk])
+
+    expected = sequential_reservoir(n, size, chunk, seed)
+    np.testing.assert_array_equal(sampler.positions, expected)
+    sample, sample_labels = sampler.result()
+    np.testing.assert_array_equal(sample_labels, sorted(expected))
+    np.testing.assert_array_equal(sample[:, 0], sorted(expected))
+
+
+@pytest.mark.parametrize('source', ['store', 'csv'])
+def test_sampling_without_cache_matches_feature_store(tmp_path, monkeypatch, make_processed, source):
+    monkeypatch.chdir(tmp_path)
+    df = make_processed(3000)
+    path = 'processed'
+    if source == 'store':
+        ColumnarStore(path).write(df)
+    else:
+        path += '.csv'
+        df.to_csv(path, index=False)
+
+    cached = LightweightTradingModel()
+    expected, expected_labels = cached.prepare_sample_data(path, sample_size=5000, cache_dir='cache')
+    model = LightweightTradingModel()
+    features, labels = model.prepare_sample_data(path, sample_size=5000, cache_dir=None)
+    # Amostra maior que o histórico: as mesmas linhas completas, sem nada gravado em disco
+    np.testing.assert_allclose(features, expected, rtol=1e-6)
+    np.testing.assert_array_equal(labels, expected_labels)
+    assert model.data_range == cached.data_range
+    assert sorted(os.listdir()) == sorted(['cache', path])
+
+    features, _ = model.prepare_sample_data(path, sample_size=500, cache_dir=None)
+    assert features.shape == (500, expected.shape[1]) and not np.isnan(features).any()
+
+
+def test_incremental_checkpoint_does_not_replace_sampled_model(tmp_path, monkeypatch, make_processed):
+    monkeypatch.chdir(tmp_path)
+    ColumnarStore('processed').write(make_processed(3000))
+    sampled = LightweightTradingModel()
+    sampled.train_model(*sampled.prepare_sample_data('processed', sample_size=2000, cache_dir='cache'))
+    sampled.save_model()
+    with open('lightweight_trading_model.pkl', 'rb') as f:
+        saved = f.read()
+
+    # O treino incremental usa o próprio checkpoint e recusa continuar um modelo por amostra
+    with pytest.raises(ValueError):
+        LightweightTradingModel().train_incremental('processed', 'lightweight_trading_model.pkl', cache_dir='cache')
+    LightweightTradingModel().train_incremental('processed', chunk_size=1000, cache_dir='cache')
+    assert os.path.exists('lightweight_trading_model.ckpt.pkl')
+    with open('lightweight_trading_model.pkl', 'rb') as f:
+        assert f.read() == saved
+
+    resumed = LightweightTradingModel()
+    resumed.train_incremental('processed', chunk_size=1000, cache_dir='cache')
+    assert resumed.training_state['rows_trained'] == 2979
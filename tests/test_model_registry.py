@@ -0,0 +1,123 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from columnar_store import ColumnarStore
+from lightweight_model import LightweightTradingModel
+from model_registry import LiveModel, ModelRegistry
+
+DATA_RANGE = {'start': '2024-01-01T00:00:00', 'end': '2024-01-02T00:00:00'}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+
+def test_publish_trainer_file_records_data_range(make_processed, registry, tmp_path):
+    store_path = str(tmp_path / 'processed')
+    ColumnarStore(store_path).write(make_processed(3000))
+    model = LightweightTradingModel()
+    features, labels = model.prepare_sample_data(store_path, sample_size=2000, cache_dir=str(tmp_path / 'cache'))
+    model.train_model(features, labels)
+    model_file = str(tmp_path / 'model.pkl')
+    model.save_model(model_file)
+
+    version = registry.publish(model_file)
+    assert version == 'v0001' and registry.current_version() == 'v0001'
+    metadata = registry.metadata()
+    assert metadata['data_range'] == {'start': '2024-01-01T00:00:00', 'end': '2024-01-03T01:58:00'}
+    assert metadata['source_file'] == model_file
+    probabilities = registry.load().predict_proba_batch(features[:10])
+    np.testing.assert_allclose(probabilities, model.predict_proba_batch(features[:10]))
+
+
+def test_incremental_publish_records_data_range(make_processed, registry, tmp_path):
+    store_path = str(tmp_path / 'processed')
+    ColumnarStore(store_path).write(make_processed(3000))
+    model = LightweightTradingModel()
+    model_file = str(tmp_path / 'model.pkl')
+    model.train_incremental(store_path, model_file, chunk_size=1000, cache_dir=str(tmp_path / 'cache'))
+
+    registry.publish(model_file)
+    metadata = registry.metadata()
+    # As 20 primeiras velas (aquecimento) ficam fora do treino
+    assert metadata['data_range'] == {'start': '2024-01-01T00:20:00', 'end': '2024-01-03T01:58:00'}
+    assert metadata['training_state']['rows_trained'] == 2979
+
+
+def test_activate_rolls_back(linear_model, registry):
+    first, _, features = linear_model(seed=0)
+    second, _, _ = linear_model(seed=1)
+    registry.publish(first, {'data_range': DATA_RANGE})
+    registry.publish(second, {'data_range': DATA_RANGE})
+    assert registry.list_versions() == ['v0001', 'v0002']
+    assert registry.current_version() == 'v0002'
+
+    registry.activate('v0001')
+    assert registry.current_version() == 'v0001'
+    np.testing.assert_allclose(registry.load().predict_proba_batch(features), first.predict_proba_batch(features))
+    with pytest.raises(ValueError):
+        registry.activate('v0009')
+    assert registry.current_version() == 'v0001'
+
+
+def test_current_pointer_is_replaced_atomically(linear_model, registry, monkeypatch):
+    compiled, _, _ = linear_model()
+    registry.publish(compiled, {'data_range': DATA_RANGE})
+    registry.publish(compiled, {'data_range': DATA_RANGE}, activate=False)
+
+    # Falha antes do rename: o CURRENT antigo continua íntegro
+    def failing_replace(src, dst):
+        raise OSError("disco cheio")
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        registry.activate('v0002')
+    monkeypatch.undo()
+    with open(registry.current_file) as f:
+        assert f.read() == 'v0001'
+
+    registry.activate('v0002')
+    assert registry.current_version() == 'v0002'
+    assert not os.path.exists(registry.current_file + '.tmp')
+
+
+def test_live_model_hot_reload(linear_model, registry):
+    first, _, features = linear_model(seed=0)
+    second, _, _ = linear_model(seed=1)
+    live = LiveModel(registry, check_interval=0.0)
+    assert live.get() is None
+
+    registry.publish(first, {'data_range': DATA_RANGE})
+    assert live.get() is not None and live.version == 'v0001'
+
+    registry.publish(second, {'data_range': DATA_RANGE})
+    deadline = time.monotonic() + 5
+    while live.version != 'v0002' and time.monotonic() < deadline:
+        # Até a nova versão terminar de carregar, a anterior continua respondendo
+        assert live.get() is not None
+        time.sleep(0.01)
+    assert live.version == 'v0002'
+    model, version, metadata = live.current()
+    assert version == metadata['version'] == 'v0002' and model is live.get()
+    np.testing.assert_allclose(live.get().predict_proba_batch(features), second.predict_proba_batch(features))
+
+
+def test_live_model_current_is_one_version(linear_model, registry, monkeypatch):
+    first, _, features = linear_model(seed=0)
+    second, _, _ = linear_model(seed=1)
+    live = LiveModel(registry, check_interval=0.0)
+    assert live.current() == (None, None, None)
+    registry.publish(first, {'data_range': DATA_RANGE})
+    registry.publish(second, {'data_range': DATA_RANGE})
+
+    # Troca a quente entre a leitura do modelo e a da versão: o snapshot não mistura as duas
+    snapshot = live.current()
+    monkeypatch.setattr(live, '_check', lambda block: None)
+    live._load('v0001')
+    assert snapshot[1] == snapshot[2]['version'] == 'v0002'
+    model, version, metadata = live.current()
+    assert version == metadata['version'] == 'v0001'
+    np.testing.assert_allclose(model.predict_proba_batch(features), first.predict_proba_batch(features))
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from get_ohlcv_data import LocalExchange, parse8601, timeframe_to_ms
+from ohlcv_backfill import SimulatedExchange, TokenBucket, backfill_ohlcv, backfill_to_csv
+
+START = parse8601('2024-07-16T00:00:00Z')
+STEP = timeframe_to_ms('1m')
+
+
+def make_candles(n):
+    return [[START + i * STEP, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 1.0] for i in range(n)]
+
+
+class FailingWindowExchange(SimulatedExchange):
+    """Falha com um erro não transitório em uma das janelas"""
+
+    def __init__(self, candles, fail_since, **kwargs):
+        super().__init__(candles, **kwargs)
+        self.fail_since = fail_since
+        self.completed = 0
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=500):
+        if since == self.fail_since:
+            raise ValueError("símbolo inválido")
+        page = await super().fetch_ohlcv(symbol, timeframe, since, limit)
+        self.completed += 1
+        return page
+
+
+def test_windows_cover_range_without_gaps_or_duplicates():
+    candles = make_candles(1050)
+    # Velas repetidas na exchange aparecem só uma vez no resultado
+    exchange = LocalExchange(candles + candles[500:520])
+    result = asyncio.run(backfill_ohlcv(exchange, start_ms=START, end_ms=START + 1050 * STEP, limit=100,
+                                        concurrency=4, requests_per_second=1000))
+    assert [c[0] for c in result] == [c[0] for c in candles]
+    # 11 janelas de até 100 velas, com páginas extras onde as repetidas empurram o limite
+    assert exchange.calls >= 11
+
+
+def test_retryable_errors_are_retried_with_backoff():
+    candles = make_candles(600)
+    exchange = SimulatedExchange(candles, latency=0.0, max_requests_per_second=1000, error_rate=0.3, seed=1)
+    result = asyncio.run(backfill_ohlcv(exchange, start_ms=START, end_ms=START + 600 * STEP, limit=50,
+                                        concurrency=4, requests_per_second=1000, max_retries=10,
+                                        backoff=0.001))
+    assert exchange.rate_limit_errors > 0
+    assert result == candles
+
+
+def test_non_retryable_error_cancels_other_windows():
+    candles = make_candles(2000)
+    exchange = FailingWindowExchange(candles, fail_since=START, latency=0.05, max_requests_per_second=1000)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await backfill_ohlcv(exchange, start_ms=START, end_ms=START + 2000 * STEP, limit=100,
+                                 concurrency=20, requests_per_second=1000)
+        completed = exchange.completed
+        await asyncio.sleep(0.2)
+        # Nenhuma janela continua rodando depois da falha
+        assert exchange.completed == completed
+        assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task()] == []
+
+    asyncio.run(run())
+
+
+def test_token_bucket_spaces_requests_without_serializing_waiters():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        await asyncio.gather(*[bucket.acquire() for _ in range(20)])
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    # 1 token imediato + 19 a 50/s ≈ 0.38s; sem acumular esperas de quem já dormiu
+    assert 0.3 <= elapsed < 0.6
+
+
+def test_rate_limit_keeps_exchange_below_its_limit():
+    candles = make_candles(2000)
+    exchange = SimulatedExchange(candles, latency=0.001, max_requests_per_second=20)
+    # Rajada inicial (capacidade 8) + 8/s: no máximo 16 requisições em qualquer segundo
+    result = asyncio.run(backfill_ohlcv(exchange, start_ms=START, end_ms=START + 2000 * STEP, limit=100,
+                                        concurrency=8, requests_per_second=8, max_retries=0))
+    assert exchange.rate_limit_errors == 0
+    assert result == candles
+
+
+def test_backfill_to_csv_resumes_from_checkpoint(tmp_path):
+    data_file = str(tmp_path / 'BTC_USDT_1m.csv')
+    candles = make_candles(500)
+    now_ms = candles[-1][0] + 2 * STEP
+    kwargs = dict(since='2024-07-16T00:00:00Z', limit=50, windows_per_batch=2, requests_per_second=1000)
+
+    asyncio.run(backfill_to_csv(LocalExchange(candles[:200]), data_file=data_file,
+                                now_ms=candles[199][0] + 2 * STEP, **kwargs))
+    total = asyncio.run(backfill_to_csv(LocalExchange(candles), data_file=data_file, now_ms=now_ms, **kwargs))
+    assert total == 300
+    with open(data_file) as f:
+        assert len(f.read().splitlines()) == 501
@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+from openai_export import export_openai_dataset, input_files
+
+
+@pytest.fixture
+def training_jsonl(tmp_path):
+    path = str(tmp_path / 'training_data.jsonl')
+    with open(path, 'w') as f:
+        for i in range(50):
+            # Um prompt repetido a cada 10 exemplos
+            prompt = f"Vela {i % 10 if i % 10 == 0 else i}: análise"
+            f.write(json.dumps({'prompt': prompt, 'completion': 'ALTA' if i % 2 else 'BAIXA'}) + '\n')
+    return path
+
+
+def read_records(paths):
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+
+def test_single_shard_keeps_plain_name(training_jsonl, tmp_path):
+    output_file = str(tmp_path / 'openai_training_data.jsonl')
+    shards, stats = export_openai_dataset(training_jsonl, output_file, max_workers=1)
+    assert [shard['path'] for shard in shards] == [output_file]
+    assert not os.path.exists(str(tmp_path / 'openai_training_data-00000.jsonl'))
+    assert stats['duplicates'] == 4
+    assert len(read_records([output_file])) == 46
+    with open(str(tmp_path / 'openai_training_data.manifest.json')) as f:
+        assert json.load(f)['shards'][0]['path'] == output_file
+
+
+def test_multiple_shards_replace_previous_single_file(training_jsonl, tmp_path):
+    output_file = str(tmp_path / 'openai_training_data.jsonl')
+    export_openai_dataset(training_jsonl, output_file, max_workers=1)
+
+    shards, _ = export_openai_dataset(training_jsonl, output_file, max_shard_bytes=2000, max_workers=2,
+                                      chunk_bytes=500)
+    paths = [shard['path'] for shard in shards]
+    assert len(paths) > 1
+    assert paths[0] == str(tmp_path / 'openai_training_data-00000.jsonl')
+    # Sem o arquivo simples antigo, a leitura segue o manifest
+    assert not os.path.exists(output_file)
+    assert input_files(output_file) == paths
+    assert len(read_records(paths)) == 46
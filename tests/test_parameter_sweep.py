@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_system import TradingBacktest
+from parameter_sweep import ParameterSweep, SharedArrays, candidate_trades
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GRID = {'min_confidence': [0.6, 0.7], 'trade_amount': [50], 'win_payout': [0.8], 'loss_ratio': [0.5, 1.0]}
+
+
+def make_inputs(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'close': 50000 + np.cumsum(rng.normal(size=n))})
+    predictions = (np.where(rng.random(n) > 0.5, 'ALTA', 'BAIXA'), rng.uniform(0.5, 0.9, n))
+    return df, predictions
+
+
+def test_attach_from_another_process_does_not_take_ownership():
+    arrays = {'confidence': np.linspace(0, 1, 1000), 'correct': np.arange(1000) % 3 == 0}
+    shared = SharedArrays(arrays)
+    try:
+        # Processo independente, com o próprio resource_tracker: ao sair não pode remover o bloco
+        script = (
+            "from parameter_sweep import SharedArrays\n"
+            f"shm, attached = SharedArrays.attach({shared.name!r}, {shared.layout!r})\n"
+            "print(int(attached['correct'].sum()))\n"
+            "shm.close()\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == '334'
+        assert 'leaked' not in result.stderr
+
+        shm, attached = SharedArrays.attach(shared.name, shared.layout, shared_tracker=True)
+        np.testing.assert_array_equal(attached['confidence'], arrays['confidence'])
+        del attached
+        shm.close()
+    finally:
+        shared.close()
+
+
+@pytest.mark.parametrize('method', ['fork', 'spawn', 'forkserver'])
+def test_pool_workers_leave_creator_registration(method):
+    # Workers do pool dividem o resource_tracker do criador: o unlink no close() não pode falhar nele
+    script = (
+        "from concurrent.futures import ProcessPoolExecutor\n"
+        "from multiprocessing import get_context\n"
+        "import numpy as np\n"
+        "from parameter_sweep import SharedArrays, _evaluate_in_worker, _init_worker\n"
+        "if __name__ == '__main__':\n"
+        "    arrays = {'confidence': np.linspace(0.5, 0.9, 1000), 'correct': np.arange(1000) % 3 == 0}\n"
+        "    shared = SharedArrays(arrays)\n"
+        "    params = [{'min_confidence': 0.6, 'trade_amount': 50, 'win_payout': 0.8, 'loss_ratio': 0.5}]\n"
+        f"    with ProcessPoolExecutor(2, mp_context=get_context({method!r}), initializer=_init_worker,\n"
+        "                             initargs=(shared.name, shared.layout)) as executor:\n"
+        "        print(list(executor.map(_evaluate_in_worker, [(params, 1000)] * 4))[0][0]['total_trades'])\n"
+        "    shared.close()\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '750'
+    assert 'Traceback' not in result.stderr and 'leaked' not in result.stderr
+
+
+def test_parallel_sweep_matches_backtest():
+    df, predictions = make_inputs()
+    results = ParameterSweep(GRID, max_workers=2, batch_size=1, min_trades=1).run(df, predictions)
+    assert len(results) == 4
+
+    for row in results.itertuples():
+        backtest = TradingBacktest(1000, row.trade_amount, row.win_payout, row.loss_ratio, keep_trades=False)
+        backtest.run_backtest(df, predictions, row.min_confidence)
+        metrics = backtest.calculate_metrics()
+        assert row.total_trades == metrics['total_trades']
+        assert np.isclose(row.final_balance, metrics['final_balance'])
+        assert np.isclose(row.sharpe_ratio, metrics['sharpe_ratio'])
+    assert len(candidate_trades(df, predictions)['confidence']) == len(df) - 1
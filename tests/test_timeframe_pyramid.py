@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor, INDICATOR_OUTPUT_COLUMNS, OHLCV_COLUMNS
+from timeframe_pyramid import PYRAMID_LEVELS, BarPyramid
+
+AGGREGATIONS = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+
+@pytest.fixture
+def candles(make_ohlcv):
+    # Três dias de 1m, com uma lacuna de 2 horas (buckets vazios não viram velas)
+    df = make_ohlcv(3 * 1440 + 17, seed=11)
+    return df.drop(index=range(2000, 2120)).reset_index(drop=True)
+
+
+def assert_bars_equal(bars, expected):
+    np.testing.assert_array_equal(bars['timestamp'].to_numpy(dtype='datetime64[ns]'),
+                                  expected['timestamp'].to_numpy(dtype='datetime64[ns]'))
+    values, reference = (frame[INDICATOR_OUTPUT_COLUMNS[1:]].to_numpy(dtype=np.float64)
+                         for frame in (bars, expected))
+    np.testing.assert_array_equal(np.isnan(values), np.isnan(reference))
+    np.testing.assert_allclose(values, reference, rtol=1e-9, atol=1e-6)
+
+
+def test_build_matches_resample(candles):
+    pyramid = BarPyramid().build(candles)
+    processor = DataProcessor()
+    for level, period in PYRAMID_LEVELS.items():
+        resampled = (candles.set_index('timestamp')[OHLCV_COLUMNS].resample(period).agg(AGGREGATIONS)
+                     .dropna().reset_index())
+        expected = processor.add_technical_indicators(resampled)[INDICATOR_OUTPUT_COLUMNS]
+        assert_bars_equal(pyramid.bars[level], expected)
+    assert len(pyramid.bars['1d']) == 4
+
+
+def test_update_after_reload_matches_full_build(candles, tmp_path):
+    cache_dir = str(tmp_path / 'pyramid')
+    # Cortes no meio dos buckets de todos os níveis
+    first, second = 1500 + 7, 3100 + 33
+    BarPyramid().build(candles.iloc[:first]).save(cache_dir)
+
+    pyramid = BarPyramid.load(cache_dir)
+    pyramid.update(candles.iloc[first:second])
+    pyramid.save(cache_dir)
+    pyramid = BarPyramid.load(cache_dir)
+    # Velas já incorporadas são ignoradas
+    pyramid.update(candles.iloc[second - 50:])
+
+    full = BarPyramid().build(candles)
+    for level in PYRAMID_LEVELS:
+        assert_bars_equal(pyramid.bars[level], full.bars[level])
+    assert pyramid.source_rows == full.source_rows == len(candles)
+    assert pyramid.source_end == full.source_end
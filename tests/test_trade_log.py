@@ -0,0 +1,61 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_system import TradingBacktest
+from trade_log import TradeLog
+
+
+def run_backtest(keep_trades=True, timestamps='datetime', n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='1min'),
+        'close': 50000 + np.cumsum(rng.normal(size=n)),
+    })
+    if timestamps == 'text':
+        df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    predictions = (np.where(rng.random(n) > 0.5, 'ALTA', 'BAIXA'), rng.uniform(0.5, 0.9, n))
+    backtest = TradingBacktest(keep_trades=keep_trades)
+    backtest.run_backtest(df, predictions)
+    return backtest
+
+
+@pytest.mark.parametrize('timestamps', ['datetime', 'text'])
+def test_round_trip_keeps_timestamps(tmp_path, timestamps):
+    backtest = run_backtest(timestamps=timestamps)
+    log = backtest.save_results(str(tmp_path / 'results'))
+    assert len(log) == len(backtest.trades) > 0
+
+    trades = log.read()
+    expected = pd.to_datetime(backtest.trades['timestamp']).to_numpy(dtype='datetime64[ns]')
+    np.testing.assert_array_equal(trades['timestamp'].to_numpy(), expected)
+    np.testing.assert_array_equal(trades['balance'], backtest.trades['balance'])
+    assert (trades['result'].astype(str) == backtest.trades['result'].astype(str)).all()
+    np.testing.assert_array_equal(log.equity_curve()['timestamp'].to_numpy(), expected)
+
+
+def test_metrics_only_run_is_marked(tmp_path):
+    backtest = run_backtest(keep_trades=False)
+    log = backtest.save_results(str(tmp_path / 'results'), export_json=str(tmp_path / 'results.json'))
+    assert len(log) == 0
+    assert log.trades_kept is False
+    assert log.metrics['total_trades'] == backtest.metrics.trades > 0
+    with open(str(tmp_path / 'results.json')) as f:
+        exported = json.load(f)
+    assert exported['trades_kept'] is False and exported['trades'] == []
+
+
+def test_write_replaces_previous_results(tmp_path):
+    path = str(tmp_path / 'results')
+    first = run_backtest(seed=0).save_results(path)
+    # Resto de uma publicação interrompida
+    os.makedirs(path + '.old')
+
+    second_backtest = run_backtest(seed=1)
+    second = second_backtest.save_results(path)
+    assert len(TradeLog(path)) == len(second_backtest.trades)
+    assert second.metrics != first.metrics
+    assert sorted(os.listdir(tmp_path)) == ['results']
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+import training_data_writer
+from training_data_writer import TrainingDataWriter, encode_json_line
+
+
+@pytest.mark.parametrize('use_orjson', [False, True])
+def test_encode_json_line_writes_valid_json(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(training_data_writer, 'orjson', None)
+    record = {'prompt': 'Análise', 'values': [1e-05, 1e16, 0.1, -2.5], 'macd': float('nan'),
+              'nested': {'rsi': float('inf'), 'sma_5': None}}
+    line = encode_json_line(record)
+    assert line.endswith(b'\n') and b'\n' not in line[:-1]
+    assert 'Análise'.encode('utf-8') in line
+    # NaN/inf viram null nos dois caminhos; os demais valores voltam iguais
+    assert json.loads(line) == {'prompt': 'Análise', 'values': [1e-05, 1e16, 0.1, -2.5], 'macd': None,
+                                'nested': {'rsi': None, 'sma_5': None}}
+    assert b'NaN' not in line and b'Infinity' not in line
+
+
+def examples(n, fail_at=None):
+    for i in range(n):
+        if i == fail_at:
+            raise RuntimeError("falha na geração dos prompts")
+        yield {'prompt': f'Vela {i}', 'completion': 'ALTA' if i % 2 else 'BAIXA'}
+
+
+@pytest.mark.parametrize('max_shard_bytes', [None, 200])
+def test_exception_discards_partial_shards(tmp_path, max_shard_bytes):
+    output_file = str(tmp_path / 'training_data.jsonl')
+    with TrainingDataWriter(output_file, max_shard_bytes=max_shard_bytes, batch_size=5) as writer:
+        writer.write_many(examples(30))
+    before = sorted(os.listdir(tmp_path))
+    contents = {name: (tmp_path / name).read_bytes() for name in before}
+
+    with pytest.raises(RuntimeError):
+        with TrainingDataWriter(output_file, max_shard_bytes=max_shard_bytes, batch_size=5) as writer:
+            writer.write_many(examples(100, fail_at=60))
+    # Sem .tmp, sem manifest novo e sem renomeação: a saída anterior continua íntegra
+    assert writer.shards == []
+    assert sorted(os.listdir(tmp_path)) == before
+    assert {name: (tmp_path / name).read_bytes() for name in before} == contents
@@ -0,0 +1,179 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+
+from columnar_store import ColumnarStore
+from data_processor import DataProcessor, OHLCV_COLUMNS, INDICATOR_OUTPUT_COLUMNS
+
+# Níveis da pirâmide, do mais fino ao mais grosso (cada um é múltiplo do anterior)
+PYRAMID_LEVELS = {
+    '5m': pd.Timedelta(minutes=5),
+    '15m': pd.Timedelta(minutes=15),
+    '1h': pd.Timedelta(hours=1),
+    '4h': pd.Timedelta(hours=4),
+    '1d': pd.Timedelta(days=1),
+}
+PYRAMID_CACHE = "processed_btc_data_pyramid"
+BASE_PERIOD = pd.Timedelta(minutes=1)
+
+
+def aggregate_bars(timestamps, ohlcv, period):
+    """Agrega velas ordenadas em buckets de `period` (sem buckets vazios) com reduceat"""
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]').view(np.int64)
+    if len(timestamps) == 0:
+        return pd.DataFrame(columns=['timestamp'] + OHLCV_COLUMNS)
+
+    period_ns = period.value
+    buckets = timestamps // period_ns * period_ns
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    ends = np.concatenate([starts[1:], [len(buckets)]]) - 1
+
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(buckets[starts]),
+        'open': ohlcv[starts, 0],
+        'high': np.maximum.reduceat(ohlcv[:, 1], starts),
+        'low': np.minimum.reduceat(ohlcv[:, 2], starts),
+        'close': ohlcv[ends, 3],
+        'volume': np.add.reduceat(ohlcv[:, 4], starts),
+    })
+
+
+def _state_to_json(state):
+    tail = state['tail']
+    return {
+        'tail': {
+            'timestamp': tail['timestamp'].astype('int64').tolist(),
+            **{column: tail[column].tolist() for column in OHLCV_COLUMNS}
+        },
+        'ewm': {name: None if value is None else list(value) for name, value in state['ewm'].items()}
+    }
+
+
+def _state_from_json(data):
+    tail = pd.DataFrame(data['tail'])
+    tail['timestamp'] = pd.to_datetime(tail['timestamp'])
+    return {'tail': tail[['timestamp'] + OHLCV_COLUMNS], 'ewm': {k: None if v is None else tuple(v) for k, v in data['ewm'].items()}}
+
+
+class BarPyramid:
+    """Pirâmide de velas multi-timeframe (5m a 1d) com indicadores, cache e atualização incremental"""
+
+    def __init__(self, levels=None):
+        self.levels = levels or dict(PYRAMID_LEVELS)
+        self.processor = DataProcessor()
+        self.bars = {}       # nível -> DataFrame com OHLCV + indicadores (a última vela pode estar aberta)
+        self.states = {}     # nível -> estado dos indicadores até a última vela fechada
+        self.source_end = None
+        self.source_rows = 0
+
+    def _indicators(self, level, rows, state):
+        """Calcula indicadores das novas velas; o estado salvo exclui a última (possivelmente aberta)"""
+        closed, current = rows.iloc[:-1], rows.iloc[-1:]
+        closed_ind, state = self.processor.add_technical_indicators_chunk(closed.reset_index(drop=True), state)
+        current_ind, _ = self.processor.add_technical_indicators_chunk(current.reset_index(drop=True), state)
+        self.states[level] = state
+        return pd.concat([closed_ind, current_ind], ignore_index=True)
+
+    def build(self, df):
+        """Constrói todos os níveis a partir das velas de 1 minuto"""
+        previous = df[['timestamp'] + OHLCV_COLUMNS]
+        for level, period in self.levels.items():
+            # Cada nível é agregado a partir do anterior, que já é bem menor que o de 1m
+            rows = aggregate_bars(previous['timestamp'].to_numpy(),
+                                  previous[OHLCV_COLUMNS].to_numpy(dtype=np.float64), period)
+            self.bars[level] = self._indicators(level, rows, None) if len(rows) else rows
+            previous = rows
+        self.source_end = df['timestamp'].iloc[-1] if len(df) else None
+        self.source_rows = len(df)
+        print(f"Pirâmide construída: " + ", ".join(f"{lvl}={len(b)}" for lvl, b in self.bars.items()))
+        return self
+
+    def update(self, new_bars):
+        """Incorpora novas velas de 1m, reabrindo apenas a última vela de cada nível"""
+        if self.source_end is not None:
+            new_bars = new_bars[new_bars['timestamp'] > self.source_end]
+        if len(new_bars) == 0:
+            return self
+
+        for level, period in self.levels.items():
+            fresh = aggregate_bars(new_bars['timestamp'].to_numpy(),
+                                   new_bars[OHLCV_COLUMNS].to_numpy(dtype=np.float64), period)
+            bars = self.bars.get(level)
+            if bars is not None and len(bars) > 0:
+                last = bars.iloc[-1]
+                bars = bars.iloc[:-1]
+                # Mesclar a vela aberta com o primeiro bucket novo, se for o mesmo período
+                if fresh['timestamp'].iloc[0] == last['timestamp']:
+                    fresh.loc[0, 'open'] = last['open']
+                    fresh.loc[0, 'high'] = max(last['high'], fresh.loc[0, 'high'])
+                    fresh.loc[0, 'low'] = min(last['low'], fresh.loc[0, 'low'])
+                    fresh.loc[0, 'volume'] = last['volume'] + fresh.loc[0, 'volume']
+                else:
+                    fresh = pd.concat([last[['timestamp'] + OHLCV_COLUMNS].to_frame().T, fresh], ignore_index=True)
+                    fresh[OHLCV_COLUMNS] = fresh[OHLCV_COLUMNS].astype(np.float64)
+                    fresh['timestamp'] = pd.to_datetime(fresh['timestamp'])
+            else:
+                bars = None
+            rows = self._indicators(level, fresh, self.states.get(level))
+            self.bars[level] = rows if bars is None else pd.concat([bars, rows], ignore_index=True)
+
+        self.source_end = new_bars['timestamp'].iloc[-1]
+        self.source_rows += len(new_bars)
+        return self
+
+    def align(self, timestamps, include_partial=False):
+        """Retorna, para cada timestamp de 1m, as features da última vela fechada de cada nível"""
+        query = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        # A vela de 1m em t fecha em t + 1m; um nível pode ser usado se já fechou até esse instante
+        decision_time = query + BASE_PERIOD.value
+        frames = []
+        for level, period in self.levels.items():
+            bars = self.bars[level]
+            starts = bars['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            if include_partial:
+                # Vela que contém t, mesmo que ainda não tenha fechado
+                positions = np.searchsorted(starts, query, side='right') - 1
+            else:
+                positions = np.searchsorted(starts + period.value, decision_time, side='right') - 1
+            values = bars.drop(columns=['timestamp']).to_numpy(dtype=np.float64)
+            aligned = np.full((len(query), values.shape[1]), np.nan)
+            valid = positions >= 0
+            aligned[valid] = values[positions[valid]]
+            frames.append(pd.DataFrame(aligned, columns=[f"{level}_{c}" for c in bars.columns[1:]]))
+        result = pd.concat(frames, axis=1)
+        result.insert(0, 'timestamp', pd.to_datetime(query))
+        return result
+
+    def features_at(self, timestamp, include_partial=False):
+        """Features multi-timeframe para um único timestamp"""
+        return self.align([timestamp], include_partial).iloc[0].to_dict()
+
+    def save(self, cache_dir=PYRAMID_CACHE):
+        """Grava cada nível em um store colunar e o estado incremental em JSON"""
+        for level, bars in self.bars.items():
+            ColumnarStore(os.path.join(cache_dir, level)).write(bars)
+        with open(os.path.join(cache_dir, 'pyramid.json'), 'w') as f:
+            json.dump({
+                'levels': {level: str(period) for level, period in self.levels.items()},
+                'source_end': None if self.source_end is None else pd.Timestamp(self.source_end).isoformat(),
+                'source_rows': self.source_rows,
+                'states': {level: _state_to_json(state) for level, state in self.states.items()}
+            }, f)
+        print(f"Pirâmide salva em {cache_dir}/")
+
+    @classmethod
+    def load(cls, cache_dir=PYRAMID_CACHE):
+        """Carrega a pirâmide do cache (retorna None se não existir)"""
+        meta_file = os.path.join(cache_dir, 'pyramid.json')
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+        pyramid = cls({level: pd.Timedelta(period) for level, period in meta['levels'].items()})
+        for level in pyramid.levels:
+            pyramid.bars[level] = ColumnarStore(os.path.join(cache_dir, level)).load()[INDICATOR_OUTPUT_COLUMNS]
+        pyramid.states = {level: _state_from_json(state) for level, state in meta['states'].items()}
+        pyramid.source_end = pd.Timestamp(meta['source_end']) if meta['source_end'] else None
+        pyramid.source_rows = meta['source_rows']
+        return pyramid
@@ -0,0 +1,152 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+
+BACKTEST_RESULTS = "backtest_results"
+DIRECTIONS = ['BAIXA', 'ALTA']
+
+# Uma linha por trade, colunas tipadas (59 bytes por trade); lida por memory-map
+TRADE_DTYPE = np.dtype([
+    ('bar', np.int64),                  # posição da vela de entrada
+    ('timestamp', 'datetime64[ns]'),    # NaT se os dados não tinham timestamp
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('confidence', np.float64),
+    ('profit', np.float64),
+    ('balance', np.float64),
+    ('direction', np.int8),             # 0 = BAIXA, 1 = ALTA
+    ('actual_direction', np.int8),
+    ('won', np.bool_),
+])
+
+
+def _codes(column):
+    """Códigos 0/1 de uma coluna de direções (categórica ou texto)"""
+    if isinstance(column.dtype, pd.CategoricalDtype) and list(column.cat.categories) == DIRECTIONS:
+        return column.cat.codes.to_numpy()
+    return (column.to_numpy() == 'ALTA').astype(np.int8)
+
+
+def trades_to_records(trades, equity_curve):
+    """Converte o DataFrame de trades do TradingBacktest no array estruturado do log"""
+    records = np.empty(len(trades), dtype=TRADE_DTYPE)
+    if len(trades) == 0:
+        return records
+    records['bar'] = equity_curve['index'].to_numpy()
+    timestamps = trades['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps) and not pd.api.types.is_numeric_dtype(timestamps):
+        # Timestamps em texto (ex.: lidos de CSV): converter em vez de descartar
+        timestamps = pd.to_datetime(timestamps, format='mixed', errors='coerce')
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        records['timestamp'] = timestamps.to_numpy(dtype='datetime64[ns]')
+    else:
+        records['timestamp'] = np.datetime64('NaT')
+    for name in ('entry_price', 'exit_price', 'confidence', 'profit', 'balance'):
+        records[name] = trades[name].to_numpy()
+    records['direction'] = _codes(trades['direction'])
+    records['actual_direction'] = _codes(trades['actual_direction'])
+    records['won'] = (trades['result'] == 'WIN').to_numpy()
+    return records
+
+
+class TradeLog:
+    """Resultado do backtest em disco: trades.npy (colunar, tipado) + summary.json (métricas e parâmetros)
+
+    Os trades são abertos sob demanda com memory-map, então ler um intervalo não carrega o resto;
+    o JSON detalhado só é gerado quando pedido (to_json).
+    """
+
+    def __init__(self, path=BACKTEST_RESULTS):
+        self.path = path
+        with open(os.path.join(path, 'summary.json'), 'r') as f:
+            self.summary = json.load(f)
+        self._records = None
+
+    @classmethod
+    def write(cls, path, records, metrics, parameters, trades_kept=True):
+        """Grava o log em um diretório temporário e o publica com um rename
+
+        trades_kept=False: o backtest só manteve as métricas (keep_trades=False); o log fica sem
+        trades e o summary registra isso, em vez de parecer um backtest sem operações.
+        """
+        path = path.rstrip(os.sep)
+        tmp_dir = path + '.tmp'
+        old_dir = path + '.old'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, 'trades.npy'), records)
+        summary = {
+            'metrics': metrics,
+            'parameters': parameters,
+            'trades': len(records),
+            'trades_kept': trades_kept,
+            'has_timestamps': bool(len(records) and not np.isnat(records['timestamp']).all()),
+        }
+        with open(os.path.join(tmp_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2, default=float)
+
+        # Tirar a versão anterior do caminho com um rename e publicar a nova com outro: o intervalo
+        # sem resultados se reduz a dois renames, e o log anterior só é apagado depois da troca
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_dir)
+        os.replace(tmp_dir, path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return cls(path)
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = np.load(os.path.join(self.path, 'trades.npy'), mmap_mode='r')
+        return self._records
+
+    @property
+    def metrics(self):
+        return self.summary['metrics']
+
+    @property
+    def trades_kept(self):
+        return self.summary.get('trades_kept', True)
+
+    def __len__(self):
+        return self.summary['trades']
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def read(self, start=0, stop=None):
+        """Trades [start, stop) como DataFrame, nas mesmas colunas de TradingBacktest.trades"""
+        records = np.asarray(self.records[start:stop])
+        timestamps = records['timestamp'] if self.summary['has_timestamps'] else records['bar']
+        return pd.DataFrame({
+            'timestamp': timestamps,
+            'entry_price': records['entry_price'],
+            'exit_price': records['exit_price'],
+            'direction': pd.Categorical.from_codes(records['direction'], DIRECTIONS),
+            'confidence': records['confidence'],
+            'actual_direction': pd.Categorical.from_codes(records['actual_direction'], DIRECTIONS),
+            'result': pd.Categorical.from_codes(records['won'].astype(np.int8), ['LOSS', 'WIN']),
+            'profit': records['profit'],
+            'balance': records['balance']
+        })
+
+    def equity_curve(self, start=0, stop=None):
+        """Saldo após cada trade [start, stop), como TradingBacktest.equity_curve"""
+        records = np.asarray(self.records[start:stop])
+        timestamps = records['timestamp'] if self.summary['has_timestamps'] else records['bar']
+        return pd.DataFrame({'index': records['bar'], 'balance': records['balance'], 'timestamp': timestamps})
+
+    def to_json(self, filename, start=0, stop=None):
+        """Exporta no formato JSON detalhado (métricas, trades, curva de equity, parâmetros)"""
+        results = {
+            'metrics': self.metrics,
+            'trades_kept': self.trades_kept,
+            'trades': self.read(start, stop).to_dict('records'),
+            'equity_curve': self.equity_curve(start, stop).to_dict('records'),
+            'parameters': self.summary['parameters']
+        }
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"Resultados exportados em: {filename}")
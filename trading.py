@@ -1,18 +1,16 @@
 from flask import Blueprint, jsonify, request
 import pandas as pd
 import numpy as np
-import joblib
 from datetime import datetime
 import random
 import time
+from model_registry import LiveModel, ModelRegistry
 
 trading_bp = Blueprint('trading', __name__)
 
-# Carregar o modelo treinado (você precisa ter este arquivo)
-try:
-    model = joblib.load('lightweight_trading_model.pkl')
-except:
-    model = None
+# Modelo servido pelo registro: carregado na primeira predição e trocado a quente
+# quando uma nova versão é publicada (publique com `python model_registry.py publish <modelo.pkl>`)
+live_model = LiveModel(ModelRegistry())
 
 # Variáveis globais para simular estado
 is_trading_active = False
@@ -37,6 +35,17 @@ def get_status():
 
 @trading_bp.route('/prediction', methods=['GET'])
 def get_prediction():
+    model, version, _ = live_model.current()
+    if model is not None and 'close' in request.args and 'volume' in request.args:
+        # Features da vela atual via query string; indicadores ausentes são imputados
+        features = np.array([request.args.get(column, np.nan, type=float) for column in model.feature_columns])
+        direction, confidence = model.predict(features)
+        return jsonify({
+            'direction': str(direction),
+            'confidence': float(confidence),
+            'model_version': version
+        })
+    
     # Simular predição da IA
     directions = ['ALTA', 'BAIXA']
     direction = random.choice(directions)
@@ -47,6 +56,13 @@ def get_prediction():
         'confidence': confidence
     })
 
+@trading_bp.route('/model', methods=['GET'])
+def get_model():
+    model, _, metadata = live_model.current()
+    if model is None:
+        return jsonify({'loaded': False})
+    return jsonify({'loaded': True, 'metadata': metadata})
+
 @trading_bp.route('/price-history', methods=['GET'])
 def get_price_history():
     # Simular histórico de preços
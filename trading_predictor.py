@@ -0,0 +1,86 @@
+import pandas as pd
+import numpy as np
+from compiled_model import CompiledModel
+from indicator_engine import IncrementalIndicators, FEATURE_COLUMNS
+
+# Inferência em tempo real: com um modelo compilado (.npz) nada do scikit-learn é importado
+
+
+class TradingPredictor:
+    """Classe para fazer predições em tempo real"""
+    
+    def __init__(self, model_file="lightweight_trading_model.pkl"):
+        if model_file.endswith('.npz'):
+            # Artefato compilado (só NumPy): mesma interface predict/predict_batch
+            self.model = CompiledModel.load(model_file)
+            print(f"Modelo compilado carregado de {model_file}")
+        else:
+            # .pkl do trainer: só este caminho precisa do scikit-learn/joblib
+            from lightweight_model import LightweightTradingModel
+
+            self.model = LightweightTradingModel()
+            self.model.load_model(model_file)
+        self.indicators = IncrementalIndicators()
+    
+    def warm_up(self, history):
+        """Aquece os indicadores incrementais com as velas OHLCV mais recentes"""
+        self.indicators.warm_up(history)
+        print(f"Indicadores aquecidos com {len(history)} velas")
+    
+    def predict_on_bar(self, bar):
+        """Atualiza os indicadores com uma nova vela (O(1)) e prediz a próxima"""
+        self.indicators.update(bar)
+        return self.predict_next_candle(self.indicators.features(bar))
+    
+    def predict_next_candle(self, current_data):
+        """
+        Prediz a direção da próxima vela
+        current_data deve ser um dict com as chaves:
+        ['sma_5', 'sma_10', 'sma_20', 'rsi', 'macd', 'macd_signal',
+         'bb_upper', 'bb_middle', 'bb_lower', 'volume_sma', 'close', 'volume']
+        """
+        features = np.array([current_data[column] if column in ('close', 'volume') else current_data.get(column, np.nan)
+                             for column in FEATURE_COLUMNS])
+        
+        direction, confidence = self.model.predict(features)
+        
+        return {
+            'direction': direction,
+            'confidence': confidence,
+            'timestamp': current_data.get('timestamp', 'N/A')
+        }
+    
+    def predict_batch(self, data, batch_size=100000):
+        """Prediz todas as linhas de um DataFrame (colunas FEATURE_COLUMNS) ou ndarray
+
+        Retorna (direções, confianças) como arrays.
+        """
+        if isinstance(data, pd.DataFrame):
+            # Indicadores ausentes viram NaN e são tratados pelo imputer
+            data = data.reindex(columns=FEATURE_COLUMNS).to_numpy(dtype=np.float64)
+        return self.model.predict_batch(data, batch_size)
+    
+    def predict_stream(self, bars, batch_size=1):
+        """Consome um iterador de velas OHLCV e gera uma predição por vela
+
+        batch_size > 1 agrupa as velas antes de chamar o modelo (mais vazão, mais latência).
+        """
+        buffer, vectors = [], []
+        for bar in bars:
+            self.indicators.update(bar)
+            buffer.append(bar)
+            vectors.append(self.indicators.feature_vector(bar))
+            if len(buffer) >= batch_size:
+                yield from self._score_buffer(buffer, vectors)
+                buffer, vectors = [], []
+        if buffer:
+            yield from self._score_buffer(buffer, vectors)
+    
+    def _score_buffer(self, bars, vectors):
+        directions, confidences = self.model.predict_batch(np.vstack(vectors))
+        for bar, direction, confidence in zip(bars, directions, confidences):
+            yield {
+                'direction': str(direction),
+                'confidence': float(confidence),
+                'timestamp': bar.get('timestamp', 'N/A')
+            }
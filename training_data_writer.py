@@ -0,0 +1,198 @@
+import gzip
+import json
+import math
+import os
+import queue
+import threading
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; json da stdlib como fallback
+    orjson = None
+
+
+def encode_json_line(obj):
+    """Serializa um objeto como uma linha JSONL em bytes, usando orjson quando disponível
+
+    Os dois caminhos gravam UTF-8 sem escapes nem espaços, e NaN/inf viram null (JSON válido).
+    A notação de alguns floats difere (o orjson grava 1e16 e 0.00001, a stdlib 1e+16 e 1e-05):
+    as linhas são lidas com os mesmos valores, mas os bytes dependem de o orjson estar instalado.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj) + b'\n'
+    try:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    except ValueError:
+        # NaN/inf não existem em JSON: gravar null, como o orjson
+        text = json.dumps(_finite(obj), ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    return (text + '\n').encode('utf-8')
+
+
+def _finite(obj):
+    """Copia o objeto trocando floats não finitos por None"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+class TrainingDataWriter:
+    """Grava exemplos JSONL em streaming, em uma thread separada, com compressão e shards opcionais
+
+    Os shards são gravados como .tmp e só recebem o nome final em close(); se o bloco with
+    terminar com exceção, eles são removidos e as saídas anteriores ficam intactas.
+    """
+
+    def __init__(self, output_file, compress=False, max_shard_bytes=None, batch_size=1000, queue_size=8,
+                 manifest_extra=None):
+        self.output_file = output_file
+        self.manifest_extra = manifest_extra or {}
+        self.compress = compress
+        self.max_shard_bytes = max_shard_bytes
+        self.batch_size = batch_size
+        self.shards = []
+        self.records = 0
+        self._batch = []
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _shard_path(self, index):
+        suffix = '.gz' if self.compress else ''
+        if self.max_shard_bytes is None:
+            return self.output_file + suffix
+        base, ext = os.path.splitext(self.output_file)
+        return f"{base}-{index:05d}{ext or '.jsonl'}{suffix}"
+
+    def _open(self, path):
+        if self.compress:
+            return gzip.open(path, 'wb', compresslevel=6)
+        return open(path, 'wb')
+
+    def _write_loop(self):
+        """Consome lotes da fila e grava, abrindo um novo shard ao atingir o limite de bytes"""
+        f = None
+        shard = None
+        try:
+            while True:
+                lines = self._queue.get()
+                if lines is None:
+                    break
+                for line in lines:
+                    # O limite é medido em bytes não comprimidos
+                    if f is None or (self.max_shard_bytes is not None and shard['bytes'] > 0
+                                     and shard['bytes'] + len(line) > self.max_shard_bytes):
+                        if f is not None:
+                            f.close()
+                        shard = {'path': self._shard_path(len(self.shards)), 'records': 0, 'bytes': 0}
+                        self.shards.append(shard)
+                        f = self._open(shard['path'] + '.tmp')
+                    f.write(line)
+                    shard['records'] += 1
+                    shard['bytes'] += len(line)
+        except Exception as e:
+            self._error = e
+            # Esvaziar a fila para não bloquear o produtor
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if f is not None:
+                f.close()
+
+    def write(self, example):
+        """Enfileira um exemplo (dict) para gravação"""
+        self.write_line(encode_json_line(example))
+    
+    def write_line(self, line):
+        """Enfileira uma linha JSONL já serializada (bytes terminados em \\n)"""
+        self._batch.append(line)
+        self.records += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+
+    def write_many(self, examples):
+        """Consome um iterável de exemplos e retorna quantos foram gravados"""
+        count = 0
+        for example in examples:
+            self.write(example)
+            count += 1
+        return count
+
+    def _flush_batch(self):
+        if self._error is not None:
+            raise self._error
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def _stop(self):
+        """Envia o fim da fila e espera a thread de gravação terminar"""
+        self._queue.put(None)
+        self._thread.join()
+        self._closed = True
+
+    def _discard(self):
+        """Remove os arquivos temporários dos shards"""
+        for shard in self.shards:
+            if os.path.exists(shard['path'] + '.tmp'):
+                os.remove(shard['path'] + '.tmp')
+        self.shards = []
+
+    def close(self):
+        """Finaliza a gravação e retorna os shards escritos"""
+        if self._closed:
+            return self.shards
+        if self._batch and self._error is None:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._stop()
+        if self._error is not None:
+            self._discard()
+            raise self._error
+
+        # Nenhum exemplo: ainda assim criar o arquivo vazio
+        if not self.shards:
+            path = self._shard_path(0)
+            self._open(path + '.tmp').close()
+            self.shards.append({'path': path, 'records': 0, 'bytes': 0})
+
+        if self.max_shard_bytes is not None:
+            single_path = self.output_file + ('.gz' if self.compress else '')
+            if len(self.shards) == 1:
+                # Coube em um shard só: manter o nome simples que os chamadores esperam
+                os.replace(self.shards[0]['path'] + '.tmp', single_path)
+                self.shards[0]['path'] = single_path
+            else:
+                for shard in self.shards:
+                    os.replace(shard['path'] + '.tmp', shard['path'])
+                if os.path.exists(single_path):
+                    # Arquivo único de uma execução anterior teria precedência sobre o manifest
+                    os.remove(single_path)
+            with open(os.path.splitext(self.output_file)[0] + '.manifest.json', 'w') as f:
+                json.dump(dict({'records': self.records, 'compressed': self.compress, 'shards': self.shards},
+                               **self.manifest_extra), f, indent=2)
+        else:
+            os.replace(self.shards[0]['path'] + '.tmp', self.shards[0]['path'])
+        return self.shards
+
+    def abort(self):
+        """Interrompe a gravação descartando os shards, sem renomear nada nem gravar o manifest"""
+        if self._closed:
+            return
+        self._batch = []
+        self._stop()
+        self._discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
@@ -0,0 +1,187 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, log_loss
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from feature_store import FeatureSet, FeatureStore, FEATURE_CACHE
+
+_worker_features = None
+
+
+def build_model(name, params=None, scale=True):
+    """Cria um modelo novo pelo nome (precisa ser serializável para os workers)
+
+    scale=False: os dados já chegam normalizados (folds em cache), sem StandardScaler no pipeline.
+    """
+    params = dict(params or {})
+    if name == 'logistic':
+        params.setdefault('max_iter', 1000)
+        params.setdefault('solver', 'liblinear')
+        model = LogisticRegression(random_state=42, **params)
+        return make_pipeline(StandardScaler(), model) if scale else model
+    if name == 'random_forest':
+        params.setdefault('n_estimators', 100)
+        params.setdefault('max_depth', 10)
+        # Um processo por janela: sem paralelismo interno para não sobrecarregar os núcleos
+        params.setdefault('n_jobs', 1)
+        return RandomForestClassifier(random_state=42, **params)
+    raise ValueError(f"Modelo desconhecido: {name}")
+
+
+def walk_forward_windows(n_rows, train_size, test_size, step=None, gap=1, expanding=False):
+    """Janelas (train_start, train_end, test_start, test_end) em ordem temporal, sem sobreposição treino/teste
+
+    gap: linhas descartadas entre treino e teste; com horizonte 1 o label da última linha de
+    treino usa o close da primeira de teste.
+    """
+    step = step or test_size
+    windows = []
+    start = 0
+    while True:
+        train_start = 0 if expanding else start
+        train_end = start + train_size
+        test_start = train_end + gap
+        test_end = test_start + test_size
+        if test_end > n_rows:
+            break
+        windows.append((train_start, train_end, test_start, test_end))
+        start += step
+    return windows
+
+
+def _init_worker(feature_path):
+    """Abre o feature set (memory-mapped) uma vez por processo; as páginas são compartilhadas pelo SO"""
+    global _worker_features
+    _worker_features = FeatureSet(feature_path)
+
+
+def _rows(feature_set, start, end):
+    features = np.asarray(feature_set.features[start:end])
+    labels = np.asarray(feature_set.labels[start:end]).astype(np.int64)
+    keep = ~np.isnan(features).any(axis=1)
+    return features[keep], labels[keep]
+
+
+def evaluate_window(feature_set, window, model_name, model_params=None):
+    """Treina e avalia uma janela, retornando as métricas"""
+    train_start, train_end, test_start, test_end = window
+    X_train, y_train = _rows(feature_set, train_start, train_end)
+    X_test, y_test = _rows(feature_set, test_start, test_end)
+    metrics = {
+        'train_start': pd.Timestamp(int(feature_set.timestamps[train_start])),
+        'test_start': pd.Timestamp(int(feature_set.timestamps[test_start])),
+        'test_end': pd.Timestamp(int(feature_set.timestamps[test_end - 1])),
+        'train_rows': len(y_train),
+        'test_rows': len(y_test),
+    }
+    if len(y_test) == 0 or len(np.unique(y_train)) < 2:
+        return dict(metrics, accuracy=np.nan, baseline=np.nan, log_loss=np.nan, up_rate=np.nan)
+
+    model = build_model(model_name, model_params)
+    model.fit(X_train, y_train)
+    probability = model.predict_proba(X_test)[:, 1]
+    predicted = (probability > 0.5).astype(np.int64)
+
+    # Baseline: sempre prever a classe majoritária do treino
+    majority = int(y_train.mean() >= 0.5)
+    return dict(
+        metrics,
+        accuracy=accuracy_score(y_test, predicted),
+        baseline=float(np.mean(y_test == majority)),
+        log_loss=log_loss(y_test, probability, labels=[0, 1]),
+        up_rate=float(predicted.mean()),
+    )
+
+
+def _evaluate_in_worker(args):
+    window, model_name, model_params = args
+    return evaluate_window(_worker_features, window, model_name, model_params)
+
+
+def summarize(results):
+    """Resumo das janelas: médias, dispersão e vantagem sobre o baseline"""
+    valid = results.dropna(subset=['accuracy'])
+    if len(valid) == 0:
+        return {'windows': 0}
+    edge = valid['accuracy'] - valid['baseline']
+    return {
+        'windows': int(len(valid)),
+        'test_rows': int(valid['test_rows'].sum()),
+        'accuracy_mean': float(valid['accuracy'].mean()),
+        'accuracy_std': float(valid['accuracy'].std(ddof=0)),
+        'accuracy_weighted': float(np.average(valid['accuracy'], weights=valid['test_rows'])),
+        'baseline_mean': float(valid['baseline'].mean()),
+        'edge_mean': float(edge.mean()),
+        'windows_beating_baseline': float((edge > 0).mean()),
+        'log_loss_mean': float(valid['log_loss'].mean()),
+    }
+
+
+class WalkForwardEngine:
+    """Treino/avaliação walk-forward em várias janelas, em paralelo sobre o feature store"""
+
+    def __init__(self, train_size=200000, test_size=20000, step=None, gap=1, expanding=False,
+                 model_name='logistic', model_params=None, max_workers=None, cache_dir=FEATURE_CACHE):
+        self.train_size = train_size
+        self.test_size = test_size
+        self.step = step
+        self.gap = gap
+        self.expanding = expanding
+        self.model_name = model_name
+        self.model_params = model_params
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.results = None
+
+    def run(self, data_path):
+        """Executa todas as janelas e retorna (DataFrame por janela, resumo)"""
+        feature_set = FeatureStore(self.cache_dir).get(data_path)
+        windows = walk_forward_windows(len(feature_set), self.train_size, self.test_size,
+                                       self.step, self.gap, self.expanding)
+        print(f"Walk-forward: {len(windows)} janelas, {self.max_workers} processos, modelo {self.model_name}")
+        if not windows:
+            self.results = pd.DataFrame()
+            return self.results, {'windows': 0}
+
+        start_time = time.time()
+        tasks = [(window, self.model_name, self.model_params) for window in windows]
+        if self.max_workers == 1:
+            rows = [evaluate_window(feature_set, *task) for task in tasks]
+        else:
+            # Os workers recebem só o caminho do feature set e os índices de cada janela
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(feature_set.path,)) as executor:
+                rows = list(executor.map(_evaluate_in_worker, tasks))
+
+        self.results = pd.DataFrame(rows)
+        summary = summarize(self.results)
+        summary['elapsed_seconds'] = time.time() - start_time
+        print(f"Acurácia média: {summary.get('accuracy_mean', float('nan')):.4f} "
+              f"(baseline {summary.get('baseline_mean', float('nan')):.4f}) em {summary['elapsed_seconds']:.1f}s")
+        return self.results, summary
+
+
+def main():
+    from columnar_store import default_processed_path
+
+    print("=== Walk-forward ===\n")
+    data_path = default_processed_path()
+    if not os.path.exists(data_path):
+        print(f"❌ Erro: Dados processados '{data_path}' não encontrados")
+        return None
+    engine = WalkForwardEngine()
+    results, summary = engine.run(data_path)
+    results.to_csv('walk_forward_results.csv', index=False)
+    print(pd.Series(summary).to_string())
+    return summary
+
+
+if __name__ == "__main__":
+    main()